@@ -0,0 +1 @@
+# Shared components for the ASH generation and evaluation scripts.
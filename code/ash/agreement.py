@@ -0,0 +1,209 @@
+# Agreement between LLM evaluators and the human annotations in
+# data/evaluation/human. Evaluator scores are joined to every annotator (H1-H5
+# and human_total) on `index`, and MSE, MAE, Pearson, Spearman, Kendall tau-b
+# and Krippendorff's alpha are computed for every
+# (annotator, source, prompt_index, evaluator_model, criterion) group at once.
+#
+#   python code/ash/agreement.py v0_recipes_eval_5_*.csv evaluated_recipes.csv --reference human_total
+
+import argparse
+import glob
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+HUMAN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'evaluation', 'human')
+HUMAN_PATTERN = re.compile(r'v0_human_annotation_final_cleaned_(.+)\.csv$')
+CRITERIA = ['authenticity', 'sensitivity', 'harmony']
+GROUP_COLUMNS = ['annotator', 'source', 'prompt_index', 'evaluator_model', 'criterion']
+METRIC_COLUMNS = ['n', 'mse', 'mae', 'pearson', 'spearman', 'kendall', 'alpha']
+# Cells per chunk of the Kendall contingency tables
+KENDALL_CHUNK = 4_000_000
+
+
+def load_human(directory=HUMAN_DIR):
+    # Long frame: index, annotator, criterion, human_score. The annotation
+    # files carry blank spacer rows and a trailing count row without an index,
+    # and H3's index column has no header, so the first column is the index.
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.csv'))):
+        match = HUMAN_PATTERN.search(os.path.basename(path))
+        if not match:
+            continue
+        raw = pd.read_csv(path, encoding='utf-8-sig')
+        frame = pd.DataFrame({'index': pd.to_numeric(raw.iloc[:, 0], errors='coerce')})
+        for criterion in CRITERIA:
+            frame[criterion] = pd.to_numeric(raw[criterion.upper()], errors='coerce')
+        frame = frame.dropna(subset=['index'])
+        frame['index'] = frame['index'].astype('int64')
+        frame = frame.melt(id_vars='index', value_vars=CRITERIA, var_name='criterion', value_name='human_score')
+        frame['annotator'] = match.group(1)
+        frames.append(frame.dropna(subset=['human_score']))
+    if not frames:
+        raise FileNotFoundError(f"No human annotation files found in {directory}")
+    return pd.concat(frames, ignore_index=True)
+
+
+def _read_scores(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    wanted = {'index', 'evaluator_model', 'iteration', 'prompt_index'} | {f'{criterion}_score' for criterion in CRITERIA}
+    return pd.read_csv(path, usecols=lambda column: column in wanted, dtype=str, keep_default_na=False)
+
+
+def load_evaluations(paths):
+    # Long frame: index, source, prompt_index, evaluator_model, iteration,
+    # criterion, score. `source` is the file stem, so the same evaluator model
+    # from two different scripts stays apart. Files without a prompt_index get
+    # 0 (the prompt-check prompts are numbered from 1), and files without an
+    # evaluator_model use their stem.
+    frames = []
+    for path in paths:
+        source = os.path.basename(path).split('.')[0]
+        raw = _read_scores(path)
+        frame = pd.DataFrame({'index': pd.to_numeric(raw['index'], errors='coerce')})
+        frame['source'] = source
+        frame['prompt_index'] = pd.to_numeric(raw['prompt_index'], errors='coerce') if 'prompt_index' in raw else 0
+        frame['evaluator_model'] = raw['evaluator_model'].astype(str) if 'evaluator_model' in raw else source
+        frame['iteration'] = pd.to_numeric(raw['iteration'], errors='coerce') if 'iteration' in raw else 1
+        for criterion in CRITERIA:
+            frame[criterion] = pd.to_numeric(raw[f'{criterion}_score'], errors='coerce')
+        frames.append(frame)
+    frame = pd.concat(frames, ignore_index=True).dropna(subset=['index'])
+    frame['index'] = frame['index'].astype('int64')
+    frame['prompt_index'] = frame['prompt_index'].fillna(0).astype('int64')
+    frame['iteration'] = frame['iteration'].fillna(1).astype('int64')
+    frame = frame.melt(id_vars=['index', 'source', 'prompt_index', 'evaluator_model', 'iteration'],
+                       value_vars=CRITERIA, var_name='criterion', value_name='score')
+    # Scores outside the 1-5 scale are parse failures, not ratings
+    return frame[frame['score'].between(1, 5)]
+
+
+def join_scores(evaluations, human, per_call=False, overall=True):
+    # One row per (group, index): the evaluator's score next to the
+    # annotator's. Iterations are averaged into one score per recipe unless
+    # `per_call`, and `overall` adds criterion 'overall' pooling all three.
+    if not per_call:
+        evaluations = (evaluations.groupby(['index', 'source', 'prompt_index', 'evaluator_model', 'criterion'],
+                                           sort=False, observed=True)['score'].mean().reset_index())
+    joined = evaluations.merge(human, on=['index', 'criterion'], how='inner')
+    if overall:
+        joined = pd.concat([joined, joined.assign(criterion='overall')], ignore_index=True)
+    return joined
+
+
+def _group_sums(codes, num_groups, values):
+    return np.bincount(codes, weights=values, minlength=num_groups)
+
+
+def _pearson(codes, num_groups, counts, x, y):
+    dx = x - (_group_sums(codes, num_groups, x) / counts)[codes]
+    dy = y - (_group_sums(codes, num_groups, y) / counts)[codes]
+    sxy = _group_sums(codes, num_groups, dx * dy)
+    sxx = _group_sums(codes, num_groups, dx * dx)
+    syy = _group_sums(codes, num_groups, dy * dy)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sxy / np.sqrt(sxx * syy)
+
+
+def _kendall(codes, num_groups, x, y):
+    # tau-b from a (groups x x-values x y-values) contingency table: scores
+    # take only a few distinct values, so counting concordant and discordant
+    # pairs through 2-D cumulative sums avoids the n^2 pairwise comparison
+    x_values, x_codes = np.unique(x, return_inverse=True)
+    y_values, y_codes = np.unique(y, return_inverse=True)
+    shape = (len(x_values), len(y_values))
+    tau = np.full(num_groups, np.nan)
+    step = max(1, KENDALL_CHUNK // (shape[0] * shape[1]))
+    for start in range(0, num_groups, step):
+        stop = min(start + step, num_groups)
+        selected = (codes >= start) & (codes < stop)
+        cells = ((codes[selected] - start) * shape[0] + x_codes[selected]) * shape[1] + y_codes[selected]
+        table = np.bincount(cells, minlength=(stop - start) * shape[0] * shape[1]).reshape(-1, *shape).astype(float)
+        # above[g, i, j]: pairs with a larger x and a larger y; below: larger x, smaller y
+        larger_x = np.cumsum(table[:, ::-1], axis=1)[:, ::-1]
+        larger_x = np.pad(larger_x[:, 1:], ((0, 0), (0, 1), (0, 0)))
+        above = np.pad(np.cumsum(larger_x[:, :, ::-1], axis=2)[:, :, ::-1][:, :, 1:], ((0, 0), (0, 0), (0, 1)))
+        below = np.pad(np.cumsum(larger_x, axis=2)[:, :, :-1], ((0, 0), (0, 0), (1, 0)))
+        score = (table * (above - below)).sum(axis=(1, 2))
+        n = table.sum(axis=(1, 2))
+        pairs = n * (n - 1) / 2
+        x_ties = (table.sum(axis=2) * (table.sum(axis=2) - 1) / 2).sum(axis=1)
+        y_ties = (table.sum(axis=1) * (table.sum(axis=1) - 1) / 2).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            tau[start:stop] = score / np.sqrt((pairs - x_ties) * (pairs - y_ties))
+    return tau
+
+
+def agreement_metrics(joined, group_columns=GROUP_COLUMNS):
+    # Metrics for every group in one pass over flat arrays; groups with
+    # constant scores get NaN correlations, and alpha compares the squared
+    # disagreement with the spread of both raters' scores pooled
+    # (interval metric, two raters, no missing values)
+    groups = joined.groupby(group_columns, sort=True, observed=True)
+    codes = groups.ngroup().to_numpy()
+    keys = groups.size().reset_index()[group_columns]
+    num_groups = len(keys)
+    counts = np.bincount(codes, minlength=num_groups).astype(float)
+    x = joined['score'].to_numpy(dtype=float)
+    y = joined['human_score'].to_numpy(dtype=float)
+
+    error = x - y
+    metrics = keys.copy()
+    metrics['n'] = counts.astype(np.int64)
+    metrics['mse'] = _group_sums(codes, num_groups, error * error) / counts
+    metrics['mae'] = _group_sums(codes, num_groups, np.abs(error)) / counts
+    metrics['pearson'] = _pearson(codes, num_groups, counts, x, y)
+    rank_x = joined['score'].groupby(codes).rank(method='average').to_numpy()
+    rank_y = joined['human_score'].groupby(codes).rank(method='average').to_numpy()
+    metrics['spearman'] = _pearson(codes, num_groups, counts, rank_x, rank_y)
+    metrics['kendall'] = _kendall(codes, num_groups, x, y)
+
+    pooled_mean = (_group_sums(codes, num_groups, x) + _group_sums(codes, num_groups, y)) / (2 * counts)
+    pooled_ss = (_group_sums(codes, num_groups, (x - pooled_mean[codes]) ** 2)
+                 + _group_sums(codes, num_groups, (y - pooled_mean[codes]) ** 2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        expected = 2 * pooled_ss / (2 * counts - 1)
+        metrics['alpha'] = 1 - metrics['mse'].to_numpy() / expected
+    return metrics
+
+
+def compute_agreement(evaluation_paths, human_dir=HUMAN_DIR, reference=None, per_call=False):
+    human = load_human(human_dir)
+    if reference:
+        human = human[human['annotator'].isin(reference)]
+    evaluations = load_evaluations(evaluation_paths)
+    start_time = time.time()
+    metrics = agreement_metrics(join_scores(evaluations, human, per_call))
+    logger.info(f"Computed agreement for {len(metrics)} groups in {time.time() - start_time:.3f} seconds")
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agreement between LLM evaluators and the human annotations")
+    parser.add_argument("evaluation_files", nargs='+',
+                        help="Evaluation CSVs (or .evaluations.parquet files) written by the evaluators or prompt check")
+    parser.add_argument("--human-dir", default=HUMAN_DIR, help="Directory with the human annotation CSVs")
+    parser.add_argument("--reference", action='append',
+                        help="Only compare against this annotator (e.g. human_total, H1_USA); can be repeated")
+    parser.add_argument("--per-call", action='store_true',
+                        help="Compare every iteration's score instead of the per-recipe mean over iterations")
+    parser.add_argument("--sort", default='mse', choices=METRIC_COLUMNS, help="Metric to rank groups by")
+    parser.add_argument("--output", help="Also write the metrics table to this CSV")
+    args = parser.parse_args()
+
+    metrics = compute_agreement(args.evaluation_files, args.human_dir, args.reference, args.per_call)
+    metrics = metrics.sort_values(args.sort, ascending=args.sort in ('mse', 'mae'))
+    if args.output:
+        metrics.to_csv(args.output, index=False)
+        logger.info(f"Metrics saved to {args.output}")
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(metrics.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import json
+import os
+import time
+
+import requests
+from loguru import logger
+
+# OpenAI Batch API (files + batches endpoints). openai<1.0 has no client for
+# it, so the four calls needed are made directly with requests.
+MAX_REQUESTS_PER_BATCH = 50000
+MAX_BYTES_PER_BATCH = 190 * 1024 * 1024  # The API accepts input files up to 200 MB
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class BatchError(Exception):
+    pass
+
+
+def make_custom_id(index, model, iterations):
+    # "<index>|<evaluator model>|<iteration>[,<iteration>...]"; several
+    # iterations share one request with n > 1. The id names the call rather
+    # than its output position, so a batch resumed with a different
+    # --start/--stop/--filter still maps each result onto its own row.
+    return f"{index}|{model}|{','.join('' if iteration is None else str(iteration) for iteration in iterations)}"
+
+
+def parse_custom_id(custom_id):
+    # [(index, model, iteration), ...] in the order of the response choices,
+    # as strings matching checkpoint.make_key
+    index, model, iterations = custom_id.rsplit('|', 2)
+    return [(index, model, iteration) for iteration in iterations.split(',')]
+
+
+def chat_request(custom_id, model, prompt, n=1):
+    body = {'model': model, 'messages': [{'role': 'user', 'content': prompt}]}
+    if n > 1:
+        body['n'] = n
+    return {'custom_id': custom_id, 'method': 'POST', 'url': '/v1/chat/completions', 'body': body}
+
+
+def write_batch_files(batch_requests, prefix):
+    # Serialize requests into JSONL files that each fit the per-batch limits
+    paths = []
+    file = None
+    count = size = 0
+    for request in batch_requests:
+        line = json.dumps(request, ensure_ascii=False) + '\n'
+        line_size = len(line.encode('utf-8'))
+        if file is None or count >= MAX_REQUESTS_PER_BATCH or size + line_size > MAX_BYTES_PER_BATCH:
+            if file:
+                file.close()
+            paths.append(f"{prefix}-{len(paths) + 1}.jsonl")
+            file = open(paths[-1], 'w', encoding='utf-8')
+            count = size = 0
+        file.write(line)
+        count += 1
+        size += line_size
+    if file:
+        file.close()
+    return paths
+
+
+class BatchClient:
+    def __init__(self, api_key, api_base='https://api.openai.com/v1', timeout=600):
+        self.api_base = api_base.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f"Bearer {api_key}"
+
+    def _check(self, response):
+        if response.status_code >= 400:
+            raise BatchError(f"{response.request.method} {response.url} failed with {response.status_code}: {response.text[:500]}")
+        return response
+
+    def upload(self, path):
+        with open(path, 'rb') as file:
+            response = self.session.post(f"{self.api_base}/files", data={'purpose': 'batch'},
+                                         files={'file': (os.path.basename(path), file, 'application/jsonl')},
+                                         timeout=self.timeout)
+        return self._check(response).json()['id']
+
+    def create(self, input_file_id, description=None):
+        payload = {'input_file_id': input_file_id, 'endpoint': '/v1/chat/completions', 'completion_window': '24h'}
+        if description:
+            payload['metadata'] = {'description': description}
+        response = self.session.post(f"{self.api_base}/batches", json=payload, timeout=self.timeout)
+        return self._check(response).json()
+
+    def retrieve(self, batch_id):
+        response = self.session.get(f"{self.api_base}/batches/{batch_id}", timeout=self.timeout)
+        return self._check(response).json()
+
+    def content(self, file_id):
+        response = self.session.get(f"{self.api_base}/files/{file_id}/content", timeout=self.timeout)
+        return self._check(response).text
+
+
+def load_state(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_state(path, state):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(state, file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def submit(client, paths, state_path, description=None):
+    state = {'batches': []}
+    for path in paths:
+        file_id = client.upload(path)
+        batch = client.create(file_id, description)
+        state['batches'].append({'id': batch['id'], 'input_file': path, 'input_file_id': file_id})
+        # Saved after every batch so an interrupted run never submits one twice
+        save_state(state_path, state)
+        logger.info(f"Submitted {path} as batch {batch['id']}")
+    return state
+
+
+def wait(client, state, poll_interval=60):
+    pending = {entry['id'] for entry in state['batches']}
+    batches = {}
+    while pending:
+        for batch_id in sorted(pending):
+            batch = client.retrieve(batch_id)
+            counts = batch.get('request_counts') or {}
+            logger.info(f"Batch {batch_id}: {batch['status']} "
+                        f"({counts.get('completed', 0)}/{counts.get('total', 0)} done, {counts.get('failed', 0)} failed)")
+            if batch['status'] in TERMINAL_STATUSES:
+                batches[batch_id] = batch
+                pending.discard(batch_id)
+        if pending:
+            time.sleep(poll_interval)
+    return [batches[entry['id']] for entry in state['batches']]
+
+
+def _error_message(record):
+    error = record.get('error') or (record.get('response') or {}).get('body', {}).get('error') or {}
+    if isinstance(error, dict):
+        error = error.get('message') or error.get('code') or json.dumps(error)
+    status = (record.get('response') or {}).get('status_code')
+    return f"Error in evaluation: {error or f'status {status}'}"
+
+
+def collect(client, batches):
+    # {(index, model, iteration): response text or "Error in evaluation: ..."}
+    # across the output and error files. Expired and cancelled batches still have an
+    # output file with the requests that finished in time.
+    results = {}
+    for batch in batches:
+        if batch['status'] != 'completed':
+            logger.warning(f"Batch {batch['id']} ended as {batch['status']}: {batch.get('errors')}")
+        for file_id in (batch.get('output_file_id'), batch.get('error_file_id')):
+            if not file_id:
+                continue
+            for line in client.content(file_id).splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                calls = parse_custom_id(record['custom_id'])
+                response = record.get('response') or {}
+                if record.get('error') or response.get('status_code') != 200:
+                    texts = [_error_message(record)] * len(calls)
+                else:
+                    texts = [choice['message']['content'] for choice in response['body']['choices']]
+                for call, text in zip(calls, texts):
+                    results[call] = text
+    return results
+
+
+def run_batches(client, batch_requests, prefix, poll_interval=60, description=None):
+    # Writes <prefix>-N.jsonl, submits them and blocks until every batch ends.
+    # The submitted batch ids are kept in <prefix>.json, so rerunning after an
+    # interruption resumes polling instead of submitting again. The state is
+    # left in place: call clear_state() once the results have been saved, so a
+    # crash before then downloads the finished batches again instead of
+    # losing them.
+    state_path = f"{prefix}.json"
+    state = load_state(state_path)
+    if state:
+        logger.info(f"Resuming {len(state['batches'])} submitted batches from {state_path}")
+    else:
+        paths = write_batch_files(batch_requests, prefix)
+        if not paths:
+            return {}
+        state = submit(client, paths, state_path, description)
+
+    return collect(client, wait(client, state, poll_interval))
+
+
+def clear_state(prefix):
+    state_path = f"{prefix}.json"
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+
+def add_batch_arguments(parser):
+    parser.add_argument("--batch", action="store_true",
+                        help="Submit every call as an OpenAI Batch API job and wait for it (half price, up to 24h)")
+    parser.add_argument("--poll-interval", type=float, default=60,
+                        help="Seconds between batch status checks")
@@ -0,0 +1,157 @@
+# Bootstrap confidence intervals for each prompt's MSE against the human
+# scores, and bootstrap CIs plus paired permutation tests for the MSE
+# difference between every two prompts. Recipes are resampled jointly for all
+# groups and prompts from one (B x n) index matrix, turned into per-recipe
+# draw counts, so every resample of every group is a single matrix product.
+#
+#   python code/ash/bootstrap.py evaluated_recipes.csv --resamples 10000 --output prompt_ci
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ash.agreement import GROUP_COLUMNS, HUMAN_DIR, join_scores, load_evaluations, load_human
+
+
+def error_matrix(joined, compare='prompt_index'):
+    # Squared errors as a (groups x arms x recipes) array, NaN where an arm has
+    # no score for a recipe. Arms are the values of `compare` (the prompts by
+    # default); groups are the remaining key columns.
+    group_columns = [column for column in GROUP_COLUMNS if column != compare]
+    errors = joined.assign(error=(joined['score'] - joined['human_score']) ** 2)
+    groups = errors.groupby(group_columns, sort=True, observed=True).ngroup().to_numpy()
+    arm_values, arms = np.unique(errors[compare].to_numpy(), return_inverse=True)
+    recipe_values, recipes = np.unique(errors['index'].to_numpy(), return_inverse=True)
+    keys = errors[group_columns].drop_duplicates().sort_values(group_columns).reset_index(drop=True)
+    matrix = np.full((len(keys), len(arm_values), len(recipe_values)), np.nan)
+    matrix[groups, arms, recipes] = errors['error'].to_numpy()
+    return keys, arm_values, recipe_values, matrix
+
+
+def draw_counts(rng, resamples, n):
+    # The (B x n) bootstrap index matrix, as how often each recipe is drawn
+    indexes = rng.integers(0, n, size=(resamples, n))
+    offsets = np.arange(resamples)[:, None] * n
+    return np.bincount((indexes + offsets).ravel(), minlength=resamples * n).reshape(resamples, n).astype(float)
+
+
+def _resample_chunk(matrix, pairs, resamples, seed):
+    # Bootstrap MSEs (groups x arms x B), bootstrap differences and
+    # sign-flip permutation differences (groups x pairs x B) for one chunk
+    rng = np.random.default_rng(seed)
+    present = ~np.isnan(matrix)
+    values = np.where(present, matrix, 0.0)
+    counts = draw_counts(rng, resamples, matrix.shape[-1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mse = (values @ counts.T) / (present @ counts.T)
+
+    first, second = pairs[:, 0], pairs[:, 1]
+    both = present[:, first] & present[:, second]
+    differences = np.where(both, values[:, first] - values[:, second], 0.0)
+    paired = both.astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bootstrap_differences = (differences @ counts.T) / (paired @ counts.T)
+        # Under the null the two prompts are exchangeable on each recipe
+        signs = rng.choice([-1.0, 1.0], size=(resamples, matrix.shape[-1]))
+        permutation_differences = (differences @ signs.T) / paired.sum(axis=-1, keepdims=True)
+    return mse, bootstrap_differences, permutation_differences
+
+
+def resample(matrix, pairs, resamples=10000, seed=0, workers=1):
+    # Splits the resamples across processes with independent seeds; with one
+    # worker everything runs in-process
+    sizes = [resamples // workers + (1 if i < resamples % workers else 0) for i in range(workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    tasks = [(matrix, pairs, size, seed) for size, seed in zip(sizes, seeds) if size]
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            chunks = pool.starmap(_resample_chunk, tasks)
+    else:
+        chunks = [_resample_chunk(*task) for task in tasks]
+    return tuple(np.concatenate(parts, axis=-1) for parts in zip(*chunks))
+
+
+def confidence_intervals(joined, compare='prompt_index', resamples=10000, confidence=0.95, seed=0, workers=1):
+    keys, arms, recipes, matrix = error_matrix(joined, compare)
+    pairs = np.array(list(itertools.combinations(range(len(arms)), 2)), dtype=np.int64).reshape(-1, 2)
+    start_time = time.time()
+    mse, bootstrap_differences, permutation_differences = resample(matrix, pairs, resamples, seed, workers)
+    logger.info(f"{resamples} resamples of {len(keys)} groups x {len(arms)} arms x {len(recipes)} recipes "
+                f"in {time.time() - start_time:.2f} seconds")
+    tail = (1 - confidence) / 2
+
+    present = ~np.isnan(matrix)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        observed = np.nansum(matrix, axis=-1) / present.sum(axis=-1)
+    low, high = np.nanquantile(mse, [tail, 1 - tail], axis=-1)
+    intervals = keys.loc[keys.index.repeat(len(arms))].reset_index(drop=True)
+    intervals[compare] = np.tile(arms, len(keys))
+    intervals['n'] = present.sum(axis=-1).ravel()
+    intervals['mse'] = observed.ravel()
+    intervals['ci_low'] = low.ravel()
+    intervals['ci_high'] = high.ravel()
+    intervals['rank'] = intervals.groupby(list(keys.columns), sort=False)['mse'].rank(method='min').astype('Int64')
+
+    first, second = pairs[:, 0], pairs[:, 1]
+    both = present[:, first] & present[:, second]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        observed_differences = (np.where(both, matrix[:, first] - matrix[:, second], 0.0).sum(axis=-1)
+                                / both.sum(axis=-1))
+    difference_low, difference_high = np.nanquantile(bootstrap_differences, [tail, 1 - tail], axis=-1)
+    extreme = (np.abs(permutation_differences) >= np.abs(observed_differences)[..., None] - 1e-12).sum(axis=-1)
+    differences = keys.loc[keys.index.repeat(len(pairs))].reset_index(drop=True)
+    differences[f'{compare}_a'] = np.tile(arms[first], len(keys))
+    differences[f'{compare}_b'] = np.tile(arms[second], len(keys))
+    differences['n'] = both.sum(axis=-1).ravel()
+    differences['mse_difference'] = observed_differences.ravel()
+    differences['ci_low'] = difference_low.ravel()
+    differences['ci_high'] = difference_high.ravel()
+    p_values = np.where(both.any(axis=-1), (extreme + 1) / (permutation_differences.shape[-1] + 1), np.nan)
+    differences['p_value'] = p_values.ravel()
+    return intervals, differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap CIs and permutation tests for prompt MSE rankings")
+    parser.add_argument("evaluation_files", nargs='+', help="Evaluation CSVs (or .evaluations.parquet files)")
+    parser.add_argument("--human-dir", default=HUMAN_DIR, help="Directory with the human annotation CSVs")
+    parser.add_argument("--reference", action='append', default=None,
+                        help="Annotator to compare against (default: human_total); can be repeated")
+    parser.add_argument("--compare", default='prompt_index', choices=['prompt_index', 'evaluator_model', 'source'],
+                        help="Column whose values are ranked against each other within every group")
+    parser.add_argument("--resamples", type=int, default=10000)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="Processes to split the resamples over")
+    parser.add_argument("--per-call", action='store_true',
+                        help="Use every iteration's score instead of the per-recipe mean over iterations")
+    parser.add_argument("--output", help="Write <output>.intervals.csv and <output>.differences.csv")
+    args = parser.parse_args()
+
+    human = load_human(args.human_dir)
+    human = human[human['annotator'].isin(args.reference or ['human_total'])]
+    joined = join_scores(load_evaluations(args.evaluation_files), human, args.per_call)
+    intervals, differences = confidence_intervals(joined, args.compare, args.resamples, args.confidence,
+                                                  args.seed, args.workers)
+    intervals = intervals.sort_values([column for column in GROUP_COLUMNS if column != args.compare] + ['rank'])
+    if args.output:
+        intervals.to_csv(f"{args.output}.intervals.csv", index=False)
+        differences.to_csv(f"{args.output}.differences.csv", index=False)
+        logger.info(f"Results saved to {args.output}.intervals.csv and {args.output}.differences.csv")
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(intervals.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+        significant = differences[differences['p_value'] < 1 - args.confidence]
+        print(f"\n{len(significant)} of {len(differences)} pairwise differences with p < {1 - args.confidence:.2f}")
+        print(significant.to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from loguru import logger
+
+
+def make_cache_key(provider, model, prompt, params=None, seed=None):
+    # Iterations of the 5-round evaluators pass their iteration number as the
+    # seed so the five independent judgments don't collapse into one entry
+    payload = json.dumps([provider, model, prompt, params or {}, seed], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    # On-disk LLM response cache (a single SQLite file) with size-based LRU
+    # eviction. Safe to share between threads and between worker processes.
+
+    def __init__(self, path, max_bytes=1024 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._pid = os.getpid()
+        self.db = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+        self.total_bytes = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def __getstate__(self):
+        # Worker processes reopen the database and keep their own counters
+        state = self.__dict__.copy()
+        del state['_lock'], state['db']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _reconnect_after_fork(self):
+        # A SQLite connection must not be used across fork, so a worker forked
+        # with this object opens its own (as clients.get_registry does)
+        if self._pid != os.getpid():
+            self._lock = threading.Lock()
+            self._connect()
+
+    def get(self, key):
+        self._reconnect_after_fork()
+        with self._lock:
+            row = self.db.execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute('UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), key))
+            return row[0]
+
+    def put(self, key, response):
+        size = len(response.encode('utf-8'))
+        self._reconnect_after_fork()
+        with self._lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)',
+                (key, response, size, time.time()),
+            )
+            self.total_bytes += size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Other processes may have written too, so recount before evicting
+        self.total_bytes = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        excess = self.total_bytes - self.max_bytes
+        if excess <= 0:
+            return
+        freed, evicted = 0, []
+        for key, size in self.db.execute('SELECT key, size FROM responses ORDER BY last_access'):
+            if freed >= excess:
+                break
+            evicted.append((key,))
+            freed += size
+        self.db.executemany('DELETE FROM responses WHERE key = ?', evicted)
+        self.total_bytes -= freed
+        logger.info(f"Evicted {len(evicted)} cached responses ({freed} bytes) from {self.path}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return f"Response cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1%} hit rate), {self.total_bytes} bytes stored"
+
+    def close(self):
+        if self._pid == os.getpid():
+            self.db.close()
+
+
+def add_cache_arguments(parser):
+    parser.add_argument("--cache", default=None,
+                        help="SQLite file for caching LLM responses across runs (disabled by default)")
+    parser.add_argument("--cache-max-mb", type=int, default=1024,
+                        help="Evict least recently used responses once the cache grows past this size")
+
+
+def open_cache(args):
+    if not args.cache:
+        return None
+    return ResponseCache(args.cache, max_bytes=args.cache_max_mb * 1024 * 1024)
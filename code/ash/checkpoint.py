@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import threading
+
+from loguru import logger
+
+ERROR_PREFIXES = ('Error', 'Unexpected error')
+
+
+def is_error_response(evaluation):
+    # The evaluators return the exception text prefixed with "Error..." instead of raising
+    return not evaluation or str(evaluation).startswith(ERROR_PREFIXES)
+
+
+def make_key(index, evaluator_model, iteration=None, prompt_index=None):
+    return (
+        str(index),
+        str(evaluator_model),
+        '' if iteration is None else str(iteration),
+        '' if prompt_index is None else str(prompt_index),
+    )
+
+
+def make_generation_key(model, dish, variation):
+    return (str(model), str(dish), str(variation))
+
+
+def make_fingerprint(prompt, input_path=None, provider=None):
+    # Identifies what a checkpoint's rows were computed from: the prompt
+    # template, the contents of the input CSV and the backend's provider (so
+    # canned --mock rows are never resumed by a real run). Keys only name a
+    # recipe index or a dish, so rows from another input or prompt would
+    # otherwise be replayed as if they were current.
+    digest = hashlib.sha256(prompt.encode('utf-8'))
+    if provider:
+        digest.update(b'\0' + provider.encode('utf-8'))
+    if input_path:
+        with open(input_path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class CheckpointStore:
+    # Append-only JSONL log of completed calls, fsynced after every record so a
+    # crash loses at most the call that was in flight. The latest record for a
+    # key wins, so failed calls are simply retried on the next run. The first
+    # line records the fingerprint of the input and prompt; a checkpoint
+    # written for a different one is set aside instead of being resumed.
+
+    def __init__(self, path, fingerprint=None):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.completed = {}
+        self._lock = threading.Lock()
+        self._load()
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if new:
+            self._file.write(json.dumps({'fingerprint': fingerprint}) + '\n')
+            self._file.flush()
+
+    def _load(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, 'r', encoding='utf-8') as file:
+            first_line = file.readline()
+        try:
+            stored = json.loads(first_line).get('fingerprint')
+        except (json.JSONDecodeError, AttributeError):
+            stored = None
+        if self.fingerprint is not None and stored != self.fingerprint:
+            stale = f"{self.path}.stale"
+            logger.warning(f"Checkpoint {self.path} was written for a different input file or prompt; "
+                           f"moving it to {stale} and starting over")
+            os.replace(self.path, stale)
+            return
+        with open(self.path, 'r', encoding='utf-8') as file:
+            for line_number, line in enumerate(file, start=1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn final line from a crash mid-write
+                    logger.warning(f"Skipping unreadable checkpoint line {line_number} in {self.path}")
+                    continue
+                if 'key' not in record:
+                    continue
+                key = tuple(record['key'])
+                if record['ok']:
+                    self.completed[key] = record['row']
+                else:
+                    self.completed.pop(key, None)
+        logger.info(f"Loaded {len(self.completed)} completed calls from checkpoint {self.path}")
+
+    def __contains__(self, key):
+        return key in self.completed
+
+    def get(self, key):
+        return self.completed.get(key)
+
+    def record(self, key, row, ok=None):
+        if ok is None:
+            ok = not is_error_response(row.get('evaluation'))
+        line = json.dumps({'key': list(key), 'ok': ok, 'row': row}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if ok:
+                self.completed[key] = row
+            else:
+                self.completed.pop(key, None)
+
+    def rows(self, sort_key=None):
+        rows = list(self.completed.values())
+        if sort_key:
+            rows.sort(key=sort_key)
+        return rows
+
+    def close(self):
+        self._file.close()
+
+
+def add_checkpoint_argument(parser, default):
+    parser.add_argument("--checkpoint", default=default,
+                        help="Append-only checkpoint file; completed calls found here are skipped on restart")
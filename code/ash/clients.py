@@ -0,0 +1,109 @@
+import contextlib
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_OLLAMA_URL = os.environ.get('OLLAMA_HOST', 'http://localhost:11434')
+if not DEFAULT_OLLAMA_URL.startswith('http'):
+    DEFAULT_OLLAMA_URL = f"http://{DEFAULT_OLLAMA_URL}"
+
+
+class OllamaClient:
+    # Minimal client for Ollama's /api/chat that reuses one keep-alive
+    # connection pool instead of opening a connection per request
+
+    def __init__(self, model, base_url=DEFAULT_OLLAMA_URL, session=None, timeout=600):
+        self.model = model
+        self.base_url = base_url.rstrip('/')
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+    def chat(self, prompt):
+        response = self.session.post(
+            f"{self.base_url}/api/chat",
+            json={
+                'model': self.model,
+                'messages': [{'role': 'user', 'content': prompt}],
+                'stream': False,
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def invoke(self, prompt):
+        return self.chat(prompt)['message']['content']
+
+
+class ClientRegistry:
+    # One client per (provider, model, endpoint), all sharing a pooled HTTP session
+
+    def __init__(self, pool_size=32):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider, model, base_url=None):
+        key = (provider, model, base_url)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._create(provider, model, base_url)
+                    self._clients[key] = client
+        return client
+
+    def _create(self, provider, model, base_url):
+        if provider == 'ollama':
+            return OllamaClient(model, base_url=base_url or DEFAULT_OLLAMA_URL, session=self.session)
+        if provider == 'gemini':
+            import google.generativeai as genai
+            return genai.GenerativeModel(model)
+        raise ValueError(f"Unknown provider: {provider}")
+
+
+_registry = None
+_registry_pid = None
+
+
+def get_registry():
+    # Sessions must not be shared across fork, so each process builds its own registry
+    global _registry, _registry_pid
+    if _registry is None or _registry_pid != os.getpid():
+        _registry = ClientRegistry()
+        _registry_pid = os.getpid()
+    return _registry
+
+
+def get_client(provider, model, base_url=None):
+    return get_registry().get(provider, model, base_url)
+
+
+def gemini_candidate_texts(response):
+    # response.text only works when the response has a single candidate
+    return [''.join(part.text for part in candidate.content.parts) for candidate in response.candidates]
+
+
+def use_pooled_openai_session():
+    # openai<1.0 reads the module-level requestssession for synchronous calls
+    import openai
+    openai.requestssession = get_registry().session
+
+
+@contextlib.asynccontextmanager
+async def pooled_openai_aiosession(limit):
+    # Without this, every openai.ChatCompletion.acreate opens its own aiohttp session
+    import aiohttp
+    import openai
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=limit)) as session:
+        token = openai.aiosession.set(session)
+        try:
+            yield session
+        finally:
+            openai.aiosession.reset(token)
@@ -0,0 +1,155 @@
+import argparse
+import csv
+import math
+import os
+
+from loguru import logger
+
+# Recipe text is identical across evaluator models, iterations and prompts, so
+# it goes into one row per `index` instead of being repeated in every result
+RECIPE_COLUMNS = ['index', 'model', 'original_dish', 'variation', 'generated_recipe', 'ingredients', 'instructions']
+SCORE_COLUMNS = ['authenticity_score', 'sensitivity_score', 'harmony_score']
+KEY_COLUMNS = ['index', 'evaluator_model', 'iteration', 'prompt_index']
+
+
+def import_pyarrow():
+    # pyarrow is optional; only the parquet output format needs it
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet output requires pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def parquet_paths(stem):
+    return f"{stem}.recipes.parquet", f"{stem}.evaluations.parquet"
+
+
+def _to_float(value):
+    # Result CSVs hold numbers as text such as "4", "4.5" or "1.0"; anything
+    # unparsable (or NaN) becomes null
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _to_int(value):
+    value = _to_float(value)
+    return None if value is None else int(value)
+
+
+def _array(pa, rows, column, type):
+    if type == pa.string():
+        return pa.array([None if row.get(column) is None else str(row[column]) for row in rows], type)
+    if type == pa.float32():
+        return pa.array([_to_float(row.get(column)) for row in rows], type)
+    return pa.array([_to_int(row.get(column)) for row in rows], type)
+
+
+def _recipe_table(pa, results, fieldnames):
+    recipes = {}
+    for row in results:
+        recipes.setdefault(row['index'], row)
+    return pa.table({
+        column: _array(pa, recipes.values(), column, pa.int32() if column == 'index' else pa.string())
+        for column in RECIPE_COLUMNS if column in fieldnames
+    })
+
+
+def save_recipes_parquet(recipes, stem):
+    # Generator output: just the recipes table of the layout above
+    pa = import_pyarrow()
+    recipes_path, _ = parquet_paths(stem)
+    recipe_table = _recipe_table(pa, recipes, list(recipes[0]) if recipes else ['index'])
+    pa.parquet.write_table(recipe_table, recipes_path, compression='zstd')
+    logger.info(f"Recipes saved to {recipes_path} ({recipe_table.num_rows} recipes)")
+
+
+def save_parquet(results, stem):
+    pa = import_pyarrow()
+    recipes_path, evaluations_path = parquet_paths(stem)
+    fieldnames = list(results[0]) if results else ['index']
+    recipe_table = _recipe_table(pa, results, fieldnames)
+
+    # Sorting by evaluator model keeps each model in its own row groups, so a
+    # filter on evaluator_model can skip the rest of the file
+    results = sorted(results, key=lambda row: str(row.get('evaluator_model')))
+    columns = {'index': _array(pa, results, 'index', pa.int32())}
+    if 'evaluator_model' in fieldnames:
+        columns['evaluator_model'] = _array(pa, results, 'evaluator_model', pa.string()).dictionary_encode()
+    for column in fieldnames:
+        if column in ('iteration', 'prompt_index', 'rounds'):
+            columns[column] = _array(pa, results, column, pa.int8())
+        elif column in SCORE_COLUMNS:
+            # The parsers accept decimal scores such as 4.5, so scores are
+            # float32 with null for a missing score
+            columns[column] = _array(pa, results, column, pa.float32())
+        elif column not in RECIPE_COLUMNS and column != 'evaluator_model':
+            columns[column] = _array(pa, results, column, pa.string())
+    evaluation_table = pa.table(columns)
+
+    pa.parquet.write_table(recipe_table, recipes_path, compression='zstd')
+    pa.parquet.write_table(evaluation_table, evaluations_path, compression='zstd', row_group_size=10000)
+    logger.info(f"Results saved to {recipes_path} ({recipe_table.num_rows} recipes) and "
+                f"{evaluations_path} ({evaluation_table.num_rows} evaluations)")
+
+
+def load_scores(stem, columns=None, filters=None):
+    # Reads only the key and score columns (plus any extra `columns`) into a
+    # DataFrame; `filters` is pushed down to parquet, e.g.
+    # [('evaluator_model', '=', 'gpt-4o'), ('iteration', '<=', 3)]
+    pa = import_pyarrow()
+    _, evaluations_path = parquet_paths(stem)
+    schema = pa.parquet.read_schema(evaluations_path)
+    wanted = [column for column in KEY_COLUMNS + SCORE_COLUMNS + list(columns or []) if column in schema.names]
+    table = pa.parquet.read_table(evaluations_path, columns=wanted, filters=filters)
+    return table.to_pandas()
+
+
+def load_results(stem, filters=None):
+    # Full rows again, with the recipe text joined back in by index
+    pa = import_pyarrow()
+    recipes_path, evaluations_path = parquet_paths(stem)
+    evaluations = pa.parquet.read_table(evaluations_path, filters=filters).to_pandas()
+    recipes = pa.parquet.read_table(recipes_path).to_pandas()
+    return evaluations.merge(recipes, on='index', how='left')
+
+
+def csv_to_parquet(csv_filename, stem=None):
+    stem = stem or os.path.splitext(csv_filename)[0]
+    with open(csv_filename, 'r', newline='', encoding='utf-8', errors='replace') as file:
+        results = list(csv.DictReader(file))
+    save_parquet(results, stem)
+
+    # Round trip: every score readable in the CSV must come back from
+    # load_scores, so a type mismatch can't silently null a column
+    scores = load_scores(stem)
+    for column in SCORE_COLUMNS:
+        if column not in scores:
+            continue
+        expected = sorted(value for value in (_to_float(row.get(column)) for row in results) if value is not None)
+        loaded = sorted(float(value) for value in scores[column].dropna())
+        if len(loaded) != len(expected) or any(abs(a - b) > 1e-6 for a, b in zip(loaded, expected)):
+            raise ValueError(f"{column} did not survive the conversion of {csv_filename}: "
+                             f"{len(expected)} scores in the CSV, {len(loaded)} read back")
+
+
+def add_output_format_argument(parser):
+    parser.add_argument("--output-format", choices=['csv', 'parquet'], default='csv',
+                        help="parquet writes <name>.recipes.parquet (recipe text once per index) and "
+                             "<name>.evaluations.parquet (float32 scores); requires pyarrow")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert an evaluation results CSV to the parquet layout")
+    parser.add_argument("csv_files", nargs='+', help="Evaluation CSV files written by the evaluators")
+    args = parser.parse_args()
+    for csv_filename in args.csv_files:
+        csv_to_parquet(csv_filename)
+
+
+if __name__ == "__main__":
+    main()
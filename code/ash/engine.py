@@ -0,0 +1,761 @@
+# One evaluation engine behind all of the evaluator scripts. A backend only
+# knows how to turn a prompt into response texts for its provider; the
+# engine owns everything else (call order, concurrency, rate limiting,
+# retries, caching, checkpoints, parsing and output), so the scripts under
+# code/evaluation are just configuration.
+
+import argparse
+import asyncio
+import os
+import time
+
+from loguru import logger
+
+from ash import parsing
+from ash.batch import BatchClient, add_batch_arguments, chat_request, clear_state, make_custom_id, run_batches
+from ash.cache import add_cache_arguments, make_cache_key, open_cache
+from ash.checkpoint import CheckpointStore, add_checkpoint_argument, is_error_response, make_fingerprint, make_key
+from ash.clients import gemini_candidate_texts, get_client, pooled_openai_aiosession, use_pooled_openai_session
+from ash.columnar import add_output_format_argument, save_parquet
+from ash.metrics import MetricsLog, add_metrics_argument, call_metrics, log_report, parsed_ok, usage_tokens
+from ash.progress import add_progress_arguments, configure_logging, progress_from_args
+from ash.rate_limiter import add_rate_limit_arguments, estimate_tokens, get_rate_limiter, retry_after_from_error
+from ash.recipes import add_input_arguments, open_recipes
+from ash.retry import (RATE_LIMIT, DeadLetterLog, Failure, RetryPolicy, add_retry_arguments, classify_error,
+                       retry_policy_from_args)
+from ash.scheduling import ModelSwitchCounter, model_major_tasks
+from ash.sinks import OrderedCSVWriter
+from ash.stopping import add_stopping_arguments, stopping_from_args
+
+PROMPT = """Evaluate the following recipe:
+
+Original Dish: {original_dish}
+Variation: {variation}
+Generated Recipe:
+{generated_recipe}
+
+Please rate on a scale of 1-5 (where 5 is the best and 1 is the worst, also scores are only in integer values) and provide a brief explanation for each of the following criteria:
+
+1. AUTHENTICITY: How well does the recipe maintain the essential characteristics of the original dish?
+2. SENSITIVITY: How well does the recipe understand and incorporate the target variation (Cuisine Transfer)?
+3. HARMONY: How well does the generated recipe balance both AUTHENTICITY and SENSITIVITY? In other words, how well-crafted is the recipe overall?
+
+Format your response as follows:
+AUTHENTICITY: [rating]
+Reason: [brief explanation]
+SENSITIVITY: [rating]
+Reason: [brief explanation]
+HARMONY: [rating]
+Reason: [brief explanation]"""
+
+# Single-round OpenAI evaluators: the same criteria with an extreme example each
+PROMPT_WITH_EXAMPLES = """Evaluate the following recipe:
+
+Original Dish: {original_dish}
+Variation: {variation}
+Generated Recipe:
+{generated_recipe}
+
+Please rate on a scale of 1-5 (where 5 is the best and 1 is the worst, also scores are only in integer values) and provide a brief explanation for each of the following criteria:
+
+1. AUTHENTICITY: How well does the recipe maintain the essential characteristics of the original dish?
+   Example: For a request to create a Korean-style spaghetti recipe, an extremely poor case would be generating a recipe for japchae.
+
+2. SENSITIVITY: How well does the recipe understand and incorporate the target variation (Cuisine Transfer)?
+   Example: For a request to create a halal version of spaghetti, an extremely incorrect case would be including pork as an ingredient.
+
+3. HARMONY: How well does the generated recipe balance both AUTHENTICITY and SENSITIVITY? In other words, how well-crafted is the recipe overall?
+
+Format your response as follows:
+AUTHENTICITY: [rating]
+Reason: [brief explanation]
+SENSITIVITY: [rating]
+Reason: [brief explanation]
+HARMONY: [rating]
+Reason: [brief explanation]"""
+
+# Gemini evaluators: shorter criteria wording
+PROMPT_SHORT = """Evaluate the following recipe:
+
+Original Dish: {original_dish}
+Variation: {variation}
+Generated Recipe:
+{generated_recipe}
+
+Please rate on a scale of 1-5 (where 5 is the best and 1 is the worst, also scores are only in integer values) and provide a brief explanation for each of the following criteria:
+
+1. AUTHENTICITY: How well does the recipe maintain the essential characteristics of the original dish?
+2. SENSITIVITY: How well does the recipe incorporate the target variation (Cuisine Transfer)?
+3. HARMONY: How well does the recipe balance both AUTHENTICITY and SENSITIVITY?
+
+Format your response as follows:
+AUTHENTICITY: [rating]
+Reason: [brief explanation]
+SENSITIVITY: [rating]
+Reason: [brief explanation]
+HARMONY: [rating]
+Reason: [brief explanation]"""
+
+RECIPE_FIELDNAMES = ['index', 'model', 'original_dish', 'variation', 'generated_recipe', 'ingredients', 'instructions']
+SCORE_FIELDNAMES = ['evaluation', 'authenticity_score', 'authenticity_reason', 'sensitivity_score',
+                    'sensitivity_reason', 'harmony_score', 'harmony_reason']
+
+
+def read_api_key(api_key_path):
+    try:
+        with open(api_key_path, "r") as f:
+            api_key = f.read().strip()
+        if not api_key:
+            raise ValueError("API key is empty")
+        return api_key
+    except FileNotFoundError:
+        raise FileNotFoundError(f"API key file not found at {api_key_path}")
+    except Exception as e:
+        raise Exception(f"Error reading API key: {str(e)}")
+
+
+class Texts(list):
+    # Response texts, with the provider's token usage when it reports one
+    def __init__(self, texts, usage=None):
+        super().__init__(texts)
+        self.usage = usage
+
+
+class Backend:
+    # generate() returns the texts of `n` independent responses to one prompt
+    # and raises on failure; the engine retries or dead-letters the call
+    provider = None
+    max_samples = 1
+
+    def generate(self, model, prompt, n=1):
+        raise NotImplementedError
+
+    async def generate_async(self, model, prompt, n=1):
+        # Blocking clients run in a worker thread
+        return await asyncio.to_thread(self.generate, model, prompt, n)
+
+    def session(self, concurrency):
+        return _null_session()
+
+    def rejects_samples(self, error):
+        # True when a request failed only because it asked for n > 1
+        return False
+
+    @classmethod
+    def add_arguments(cls, parser):
+        pass
+
+    @classmethod
+    def from_args(cls, args, api_key_path):
+        return cls(api_key_path)
+
+
+class _null_session:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class OpenAIBackend(Backend):
+    provider = 'openai'
+    max_samples = 128
+
+    def __init__(self, api_key_path, api_base=None):
+        import openai
+        self.openai = openai
+        use_pooled_openai_session()
+        openai.api_key = read_api_key(api_key_path)
+        if api_base:
+            openai.api_base = api_base
+
+    def _options(self, model, prompt, n):
+        options = {'model': model, 'messages': [{"role": "user", "content": prompt}]}
+        if n > 1:
+            options['n'] = n
+        return options
+
+    def generate(self, model, prompt, n=1):
+        response = self.openai.ChatCompletion.create(**self._options(model, prompt, n))
+        return Texts([choice.message.content for choice in response.choices], response.get('usage'))
+
+    async def generate_async(self, model, prompt, n=1):
+        response = await self.openai.ChatCompletion.acreate(**self._options(model, prompt, n))
+        return Texts([choice.message.content for choice in response.choices], response.get('usage'))
+
+    def session(self, concurrency):
+        return pooled_openai_aiosession(concurrency)
+
+    def batch_client(self):
+        return BatchClient(self.openai.api_key, self.openai.api_base)
+
+    @classmethod
+    def add_arguments(cls, parser):
+        parser.add_argument("--api-base", default=None,
+                            help="Override the OpenAI API base URL (e.g. a local stand-in server)")
+        add_batch_arguments(parser)
+
+    @classmethod
+    def from_args(cls, args, api_key_path):
+        return cls(api_key_path, args.api_base)
+
+
+class GeminiBackend(Backend):
+    provider = 'gemini'
+    max_samples = 8
+
+    def __init__(self, api_key_path):
+        import google.generativeai as genai
+        self.genai = genai
+        genai.configure(api_key=read_api_key(api_key_path))
+
+    def _config(self, n):
+        return self.genai.GenerationConfig(candidate_count=n) if n > 1 else None
+
+    def _texts(self, response, n):
+        # response.text raises for a blocked response, a permanent failure
+        texts = [response.text] if n == 1 else gemini_candidate_texts(response)
+        return Texts(texts, getattr(response, 'usage_metadata', None))
+
+    def generate(self, model, prompt, n=1):
+        response = get_client('gemini', model).generate_content(prompt, generation_config=self._config(n))
+        return self._texts(response, n)
+
+    async def generate_async(self, model, prompt, n=1):
+        response = await get_client('gemini', model).generate_content_async(prompt, generation_config=self._config(n))
+        return self._texts(response, n)
+
+    def rejects_samples(self, error):
+        return 'candidate' in str(error).lower()
+
+
+class OllamaBackend(Backend):
+    provider = 'ollama'
+
+    def __init__(self, api_key_path=None):
+        pass
+
+    def generate(self, model, prompt, n=1):
+        return [get_client('ollama', model).invoke(prompt)]
+
+
+class MockBackend(Backend):
+    # Answers in-process with the mock server's canned responses
+    provider = 'mock'
+    max_samples = 128
+
+    def __init__(self, api_key_path=None):
+        from ash.mock_server import canned_response
+        self.canned_response = canned_response
+
+    def generate(self, model, prompt, n=1):
+        return [self.canned_response(prompt, i) for i in range(n)]
+
+    async def generate_async(self, model, prompt, n=1):
+        return self.generate(model, prompt, n)
+
+
+class EvaluationEngine:
+    def __init__(self, backend, evaluator_models, prompt=PROMPT, parser='default', iterations=None,
+                 rate_limiter=None, cache=None, samples_per_request=1, retry=None, dead_letter=None,
+                 stopping=None, metrics=None, progress=None):
+        self.backend = backend
+        self.evaluator_models = list(evaluator_models)
+        self.prompt = prompt
+        self.parse = parsing.PARSERS[parser][0]
+        self.iterations = list(iterations) if iterations else [None]
+        self.rate_limiter = rate_limiter or get_rate_limiter(backend.provider)
+        self.cache = cache
+        self.samples_per_request = max(1, min(samples_per_request, backend.max_samples))
+        self.retry = retry or RetryPolicy()
+        self.dead_letter = dead_letter
+        self.failed_calls = 0
+        self.metrics = metrics
+        self.progress = progress
+        self.model_switches = ModelSwitchCounter()
+        self.stopping = stopping
+        self.rounds_used = 0
+        self.rounds_skipped = 0
+
+    def build_prompt(self, row):
+        return self.prompt.format(original_dish=row['original_dish'], variation=row['variation'],
+                                  generated_recipe=row['generated_recipe'])
+
+    def build_result_row(self, row, model, iteration, evaluation):
+        row_copy = row.copy()
+        row_copy['evaluator_model'] = model
+        if iteration is not None:
+            row_copy['iteration'] = iteration
+        row_copy['evaluation'] = evaluation
+        row_copy.update(self.parse(evaluation))
+        return row_copy
+
+    def _cache_key(self, model, prompt, iteration):
+        return make_cache_key(self.backend.provider, model, prompt, seed=iteration)
+
+    def _cached(self, model, prompt, iterations):
+        evaluations = {}
+        for iteration in iterations:
+            cached = self.cache.get(self._cache_key(model, prompt, iteration)) if self.cache else None
+            if cached is not None:
+                evaluations[iteration] = cached
+        return evaluations
+
+    def _failure(self, error, model, n, attempt):
+        # A float is the backoff before retrying the call; a list (fall back to
+        # one sample per request) or a Failure is the call's outcome
+        category = classify_error(error)
+        if category == RATE_LIMIT:
+            self.rate_limiter.report_rate_limited(retry_after_from_error(error))
+        if n > 1 and self.backend.rejects_samples(error):
+            logger.warning(f"{model} rejected {n} samples per request, falling back to one: {str(error)}")
+            self.samples_per_request = 1
+            return []
+        if self.retry.should_retry(category, attempt):
+            delay = self.retry.delay(category, attempt)
+            logger.warning(f"{self.backend.provider} {category} error with {model} (attempt {attempt}/"
+                           f"{self.retry.max_attempts}), retrying in {delay:.1f}s: {str(error)}")
+            return delay
+        logger.error(f"{self.backend.provider} {category} error with {model} after {attempt} attempts: {str(error)}")
+        return Failure(error, category, attempt)
+
+    def _record_call(self, model, prompt, outcome, index, started, queue_wait, attempt):
+        # One metrics row per call that produced texts or failed for good
+        if not self.metrics or (not isinstance(outcome, Failure) and not outcome):
+            return
+        latency = time.time() - started
+        if isinstance(outcome, Failure):
+            self.metrics.record(call_metrics(self.backend.provider, model, started, queue_wait, latency,
+                                             estimate_tokens(prompt), 0, attempt - 1, samples=0,
+                                             outcome=outcome.category, index=index, tokens_estimated=True))
+            return
+        tokens = usage_tokens(getattr(outcome, 'usage', None))
+        estimated = tokens is None
+        if estimated:
+            tokens = (estimate_tokens(prompt), sum(estimate_tokens(text) for text in outcome))
+        parsed = sum(parsed_ok(self.parse(text)) for text in outcome)
+        self.metrics.record(call_metrics(self.backend.provider, model, started, queue_wait, latency, *tokens,
+                                         attempt - 1, samples=len(outcome), parsed=parsed, index=index,
+                                         tokens_estimated=estimated))
+
+    def _call(self, model, prompt, n, index=None):
+        queue_wait = 0.0
+        for attempt in range(1, self.retry.max_attempts + 1):
+            queue_wait += self.rate_limiter.acquire(estimate_tokens(prompt))
+            self.model_switches.observe(model)
+            started = time.time()
+            try:
+                texts = self.backend.generate(model, prompt, n)
+                self.rate_limiter.report_success()
+                self._record_call(model, prompt, texts, index, started, queue_wait, attempt)
+                return texts
+            except Exception as e:
+                outcome = self._failure(e, model, n, attempt)
+                if not isinstance(outcome, float):
+                    self._record_call(model, prompt, outcome, index, started, queue_wait, attempt)
+                    return outcome
+                time.sleep(outcome)
+
+    async def _call_async(self, model, prompt, n, index=None):
+        queue_wait = 0.0
+        for attempt in range(1, self.retry.max_attempts + 1):
+            queue_wait += await self.rate_limiter.acquire_async(estimate_tokens(prompt))
+            self.model_switches.observe(model)
+            started = time.time()
+            try:
+                texts = await self.backend.generate_async(model, prompt, n)
+                self.rate_limiter.report_success()
+                self._record_call(model, prompt, texts, index, started, queue_wait, attempt)
+                return texts
+            except Exception as e:
+                outcome = self._failure(e, model, n, attempt)
+                if not isinstance(outcome, float):
+                    self._record_call(model, prompt, outcome, index, started, queue_wait, attempt)
+                    return outcome
+                await asyncio.sleep(outcome)
+
+    def _record_failure(self, row, model, iteration, failure):
+        # Failed calls get no output row; they go to the dead-letter file instead
+        self.failed_calls += 1
+        if self.progress:
+            self.progress.fail(model)
+        if self.dead_letter:
+            self.dead_letter.record(make_key(row['index'], model, iteration), failure, evaluator_model=model,
+                                    original_dish=row['original_dish'], variation=row['variation'])
+
+    def _record_success(self, key, row_copy, checkpoint):
+        if checkpoint:
+            checkpoint.record(key, row_copy)
+        if self.dead_letter:
+            self.dead_letter.resolve(key)
+
+    def _store(self, model, prompt, evaluations, batch, texts):
+        # Returns False once the batch's outcome is final (a failure for every iteration)
+        if isinstance(texts, Failure):
+            evaluations.update((iteration, texts) for iteration in batch)
+            return False
+        # A response with fewer samples than requested leaves the rest for the next call
+        for iteration, text in zip(batch, texts):
+            evaluations[iteration] = text
+            if self.cache:
+                self.cache.put(self._cache_key(model, prompt, iteration), text)
+        return True
+
+    def evaluate(self, row, model, iterations):
+        # {iteration: response text} for one recipe and evaluator model
+        prompt = self.build_prompt(row)
+        evaluations = self._cached(model, prompt, iterations)
+        missing = [iteration for iteration in iterations if iteration not in evaluations]
+        while missing:
+            batch = missing[:self.samples_per_request]
+            texts = self._call(model, prompt, len(batch), row['index'])
+            if not self._store(model, prompt, evaluations, batch, texts):
+                break
+            missing = [iteration for iteration in iterations if iteration not in evaluations]
+        return evaluations
+
+    async def evaluate_async(self, row, model, iterations):
+        prompt = self.build_prompt(row)
+        evaluations = self._cached(model, prompt, iterations)
+        missing = [iteration for iteration in iterations if iteration not in evaluations]
+        while missing:
+            batch = missing[:self.samples_per_request]
+            texts = await self._call_async(model, prompt, len(batch), row['index'])
+            if not self._store(model, prompt, evaluations, batch, texts):
+                break
+            missing = [iteration for iteration in iterations if iteration not in evaluations]
+        return evaluations
+
+    def _requests(self, rows, checkpoint, emit, retry_only=None):
+        # Yields (row_position, model, iterations, output_positions) for the calls
+        # still to make, grouping a recipe's iterations up to samples_per_request.
+        # Calls are model-major so Ollama keeps each model resident; results
+        # still land in recipe -> model -> iteration order. With `retry_only`,
+        # calls whose key isn't in it are left out.
+        indexes = rows.column('index')
+        group = None
+        for row_position, model, iteration, position in model_major_tasks(len(rows), self.evaluator_models, self.iterations):
+            key = make_key(indexes[row_position], model, iteration)
+            if checkpoint and key in checkpoint:
+                emit(position, checkpoint.get(key))
+                continue
+            if retry_only is not None and key not in retry_only:
+                emit(position, None)
+                continue
+            if group and group[:2] == (row_position, model) and len(group[2]) < self.samples_per_request:
+                group[2].append(iteration)
+                group[3].append(position)
+                continue
+            if group:
+                yield group
+            group = (row_position, model, [iteration], [position])
+        if group:
+            yield group
+
+    def _recipe_tasks(self, rows, checkpoint, emit, retry_only=None):
+        # Adaptive mode: one task per (recipe, evaluator model) holding all of
+        # its iterations, since whether to run a round depends on the earlier ones
+        indexes = rows.column('index')
+        group = None
+        for row_position, model, iteration, position in model_major_tasks(len(rows), self.evaluator_models, self.iterations):
+            if group and group[:2] == (row_position, model):
+                group[2].append(iteration)
+                group[3].append(position)
+                continue
+            if group:
+                yield from self._retry_filter(group, indexes, checkpoint, emit, retry_only)
+            group = (row_position, model, [iteration], [position])
+        if group:
+            yield from self._retry_filter(group, indexes, checkpoint, emit, retry_only)
+
+    def _retry_filter(self, group, indexes, checkpoint, emit, retry_only):
+        # With `retry_only`, a recipe without a failed round keeps the rounds
+        # it has in the checkpoint and makes no calls
+        row_position, model, iterations, positions = group
+        keys = [make_key(indexes[row_position], model, iteration) for iteration in iterations]
+        if retry_only is None or any(key in retry_only for key in keys):
+            yield group
+            return
+        finished = [checkpoint.get(key) for key in keys if key in checkpoint]
+        for position, row_copy in zip(positions, finished):
+            emit(position, dict(row_copy, rounds=len(finished)))
+        for position in positions[len(finished):]:
+            emit(position, None)
+
+    async def _evaluate_adaptive(self, row, model, iterations, positions, checkpoint, emit):
+        # The first min_rounds iterations go out together, then one at a time
+        # until the stopping rule is met; skipped positions are emitted as None.
+        # A failed round ends the recipe, which --retry-failed picks up again.
+        finished = []
+        failure = None
+        while not failure and len(finished) < len(iterations) and not self.stopping.done(finished):
+            size = max(1, self.stopping.min_rounds - len(finished))
+            batch = iterations[len(finished):len(finished) + size]
+            keys = {iteration: make_key(row['index'], model, iteration) for iteration in batch}
+            pending = [iteration for iteration in batch if not (checkpoint and keys[iteration] in checkpoint)]
+            evaluations = await self.evaluate_async(row, model, pending) if pending else {}
+            for iteration in batch:
+                if iteration not in evaluations:
+                    finished.append(checkpoint.get(keys[iteration]))
+                    continue
+                if isinstance(evaluations[iteration], Failure):
+                    failure = evaluations[iteration]
+                    self._record_failure(row, model, iteration, failure)
+                    break
+                row_copy = self.build_result_row(row, model, iteration, evaluations[iteration])
+                self._record_success(keys[iteration], row_copy, checkpoint)
+                finished.append(row_copy)
+        for position, row_copy in zip(positions, finished):
+            emit(position, dict(row_copy, rounds=len(finished)))
+        for position in positions[len(finished):]:
+            emit(position, None)
+        if failure:
+            logger.warning(f"Recipe {row['index']} ({row['original_dish']}, {row['variation']}) with {model} "
+                           f"stopped after {len(finished)} rounds: {failure.error}")
+            return
+        self.rounds_used += len(finished)
+        self.rounds_skipped += len(iterations) - len(finished)
+        logger.debug(f"Evaluated recipe {row['index']} ({row['original_dish']}, {row['variation']}) with {model} "
+                     f"in {len(finished)} of {len(iterations)} rounds")
+
+    def _finish(self, row, model, iterations, positions, evaluations, checkpoint, emit):
+        for iteration, position in zip(iterations, positions):
+            if isinstance(evaluations[iteration], Failure):
+                self._record_failure(row, model, iteration, evaluations[iteration])
+                emit(position, None)
+                continue
+            row_copy = self.build_result_row(row, model, iteration, evaluations[iteration])
+            self._record_success(make_key(row['index'], model, iteration), row_copy, checkpoint)
+            emit(position, row_copy)
+        label = '' if iterations == [None] else f" (Iterations {', '.join(str(iteration) for iteration in iterations)})"
+        logger.debug(f"Evaluated recipe {row['index']} ({row['original_dish']}, {row['variation']}) with {model}{label}")
+
+    def _start_progress(self, num_rows):
+        if self.progress:
+            for model in self.evaluator_models:
+                self.progress.add_work(model, num_rows * len(self.iterations))
+            self.progress.start()
+
+    def _advance(self, position):
+        # Positions run recipe -> model -> iteration, so the model is recoverable
+        if self.progress:
+            self.progress.advance(self.evaluator_models[position // len(self.iterations) % len(self.evaluator_models)])
+
+    def _log_failures(self):
+        if self.failed_calls:
+            logger.warning(f"{self.failed_calls} calls failed for good and have no output row")
+        if self.dead_letter and self.dead_letter.failed:
+            logger.warning(f"{len(self.dead_letter.failed)} failed calls in {self.dead_letter.path} "
+                           f"({self.dead_letter.summary()}); rerun with --retry-failed to re-issue only those")
+
+    def run(self, input_filename, checkpoint=None, input_args=None, writer=None, concurrency=1, retry_only=None):
+        rows = open_recipes(input_filename, input_args)
+        results = [None] * (len(rows) * len(self.evaluator_models) * len(self.iterations))
+
+        def emit(position, row):
+            results[position] = row
+            if writer:
+                writer.add(position, row)
+            self._advance(position)
+
+        logger.info(f"Starting evaluation of {len(rows)} recipes with {', '.join(self.evaluator_models)} "
+                    f"({len(self.iterations)} iterations, up to {concurrency} concurrent requests)")
+        self._start_progress(len(rows))
+        try:
+            if concurrency > 1 or self.stopping:
+                asyncio.run(self._run_async(rows, checkpoint, emit, concurrency, retry_only))
+            else:
+                for row_position, model, iterations, positions in self._requests(rows, checkpoint, emit, retry_only):
+                    row = rows[row_position]
+                    evaluations = self.evaluate(row, model, iterations)
+                    self._finish(row, model, iterations, positions, evaluations, checkpoint, emit)
+        finally:
+            rows.close()
+        logger.info(f"Completed evaluation of all {len(rows)} recipes ({self.model_switches.switches} model switches)")
+        if self.stopping:
+            total = self.rounds_used + self.rounds_skipped
+            logger.info(f"Adaptive stopping used {self.rounds_used} of {total} rounds "
+                        f"({100 * self.rounds_skipped / max(1, total):.1f}% of calls saved)")
+        self._log_failures()
+        return [row for row in results if row is not None]
+
+    async def _run_async(self, rows, checkpoint, emit, concurrency, retry_only=None):
+        if self.stopping:
+            requests = self._recipe_tasks(rows, checkpoint, emit, retry_only)
+        else:
+            requests = self._requests(rows, checkpoint, emit, retry_only)
+
+        async def worker():
+            # Workers share one request generator, so at most `concurrency`
+            # calls are in flight and calls start in model-major order
+            for row_position, model, iterations, positions in requests:
+                row = rows[row_position]
+                if self.stopping:
+                    await self._evaluate_adaptive(row, model, iterations, positions, checkpoint, emit)
+                    continue
+                evaluations = await self.evaluate_async(row, model, iterations)
+                self._finish(row, model, iterations, positions, evaluations, checkpoint, emit)
+
+        async with self.backend.session(concurrency):
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    def run_batch(self, input_filename, batch_prefix, checkpoint=None, input_args=None, writer=None, poll_interval=60,
+                  retry_only=None):
+        # Every pending call goes out as one Batch API job (OpenAI only)
+        rows = open_recipes(input_filename, input_args)
+        results = [None] * (len(rows) * len(self.evaluator_models) * len(self.iterations))
+        cached = {}
+        emitted = set()
+
+        def emit(position, row):
+            results[position] = row
+            emitted.add(position)
+            if writer:
+                writer.add(position, row)
+            self._advance(position)
+
+        def batch_requests():
+            for row_position, model, iterations, positions in self._requests(rows, checkpoint, emit, retry_only):
+                row = rows[row_position]
+                prompt = self.build_prompt(row)
+                evaluations = self._cached(model, prompt, iterations)
+                for iteration in iterations:
+                    if iteration in evaluations:
+                        cached[make_key(row['index'], model, iteration)[:3]] = evaluations[iteration]
+                missing = [iteration for iteration in iterations if iteration not in evaluations]
+                if missing:
+                    yield chat_request(make_custom_id(row['index'], model, missing), model, prompt, len(missing))
+
+        logger.info(f"Starting batch evaluation of {len(rows)} recipes")
+        self._start_progress(len(rows))
+        try:
+            evaluations = run_batches(self.backend.batch_client(), batch_requests(), batch_prefix, poll_interval,
+                                      description=f"{', '.join(self.evaluator_models)} evaluation of {input_filename}")
+            evaluations.update(cached)
+            # Second pass over the calls. Checkpointed and skipped rows were
+            # emitted on the first, unless the batches were resumed from state
+            # and the requests never regenerated.
+            for row_position, model, iteration, position in model_major_tasks(len(rows), self.evaluator_models, self.iterations):
+                if position in emitted:
+                    continue
+                row = rows[row_position]
+                key = make_key(row['index'], model, iteration)
+                if checkpoint and key in checkpoint:
+                    emit(position, checkpoint.get(key))
+                    continue
+                if retry_only is not None and key not in retry_only:
+                    emit(position, None)
+                    continue
+                evaluation = evaluations.get(key[:3], "Error in evaluation: missing from batch output")
+                if is_error_response(evaluation):
+                    # The Batch API already retried the request; there is nothing left to back off from
+                    self._record_failure(row, model, iteration, Failure(evaluation, 'batch', 1))
+                    emit(position, None)
+                    continue
+                if self.cache and key[:3] not in cached:
+                    self.cache.put(self._cache_key(model, self.build_prompt(row), iteration), evaluation)
+                row_copy = self.build_result_row(row, model, iteration, evaluation)
+                self._record_success(key, row_copy, checkpoint)
+                emit(position, row_copy)
+        finally:
+            rows.close()
+        logger.info(f"Completed evaluation of all {len(rows)} recipes")
+        self._log_failures()
+        return [row for row in results if row is not None]
+
+
+def run_evaluator(backend_class, evaluator_models, output, fieldnames, prompt=PROMPT, parser='default',
+                  iterations=None, api_key_path=None):
+    # Command line shared by every evaluator script; `output` is the CSV name
+    # and also the stem of the checkpoint, parquet and batch files
+    stem = os.path.splitext(output)[0]
+    cli = argparse.ArgumentParser(description="Evaluate generated recipes")
+    cli.add_argument("input_file", help="Input CSV file containing generated recipes")
+    cli.add_argument("--concurrency", type=int, default=1,
+                     help="Number of in-flight requests; values above 1 switch to the asyncio evaluator")
+    if iterations and len(iterations) > 1 and backend_class.max_samples > 1:
+        cli.add_argument("--samples-per-request", "--candidates", type=int, default=1, dest='samples_per_request',
+                         help=f"Iterations requested as samples of one call (n / candidate_count, at most "
+                              f"{min(backend_class.max_samples, len(iterations))})")
+        cli.add_argument("--multi-sample", action='store_const', const=len(iterations), dest='samples_per_request',
+                         help="Request all iterations of a recipe in one call")
+    if iterations and len(iterations) > 1:
+        add_stopping_arguments(cli)
+    cli.add_argument("--mock", action='store_true',
+                     help="Answer every call in-process with canned responses (no API key or server needed)")
+    backend_class.add_arguments(cli)
+    add_input_arguments(cli)
+    add_output_format_argument(cli)
+    add_rate_limit_arguments(cli)
+    add_cache_arguments(cli)
+    add_checkpoint_argument(cli, f'{stem}.checkpoint.jsonl')
+    add_retry_arguments(cli, f'{stem}.failed.jsonl')
+    add_metrics_argument(cli, f'{stem}.metrics.csv')
+    add_progress_arguments(cli, f'{stem}.status.json')
+    args = cli.parse_args()
+    configure_logging(args)
+    stopping = stopping_from_args(args)
+    if stopping and getattr(args, 'batch', False):
+        cli.error("--adaptive needs the results of earlier rounds and cannot be combined with --batch")
+    if args.retry_failed and not (args.checkpoint and args.dead_letter):
+        cli.error("--retry-failed rebuilds the output from the checkpoint and needs both --checkpoint and --dead-letter")
+    if stopping:
+        fieldnames = fieldnames + ['rounds']
+
+    logger.info(f"Starting recipe evaluation process for file: {args.input_file}")
+    start_time = time.time()
+
+    backend = MockBackend() if args.mock else backend_class.from_args(args, api_key_path)
+    # The limiter follows the backend actually used, so --mock runs unthrottled
+    # (per-model quotas only apply to the real provider)
+    model = evaluator_models[0] if len(evaluator_models) == 1 and not args.mock else None
+    cache = open_cache(args)
+    dead_letter = DeadLetterLog(args.dead_letter) if args.dead_letter else None
+    metrics = MetricsLog(args.metrics) if args.metrics else None
+    progress = progress_from_args(args, evaluator_models, f"Evaluation of {args.input_file} into {output}")
+    engine = EvaluationEngine(backend, evaluator_models, prompt, parser, iterations,
+                              rate_limiter=get_rate_limiter(backend.provider, args.rpm, args.tpm, model=model),
+                              cache=cache, samples_per_request=getattr(args, 'samples_per_request', None) or 1,
+                              retry=retry_policy_from_args(args), dead_letter=dead_letter, stopping=stopping,
+                              metrics=metrics, progress=progress)
+    checkpoint = (CheckpointStore(args.checkpoint, make_fingerprint(prompt, args.input_file, backend.provider))
+                  if args.checkpoint else None)
+    # --retry-failed re-issues only the dead-lettered calls; everything else comes from the checkpoint
+    retry_only = set(dead_letter.failed) if args.retry_failed else None
+    if retry_only is not None:
+        logger.info(f"Retrying {len(retry_only)} failed calls from {args.dead_letter}")
+    writer = OrderedCSVWriter(output, fieldnames) if args.output_format == 'csv' else None
+    batch = getattr(args, 'batch', False) and not args.mock
+    if batch:
+        results = engine.run_batch(args.input_file, f'{stem}.batch', checkpoint, args, writer, args.poll_interval,
+                                   retry_only)
+    else:
+        results = engine.run(args.input_file, checkpoint, args, writer, args.concurrency, retry_only)
+    if progress:
+        progress.close()
+    if writer:
+        writer.close()
+    else:
+        save_parquet(results, stem)
+    if batch:
+        # Only now are the downloaded batch results saved; until here a rerun
+        # resumes from the batch state and downloads them again
+        clear_state(f'{stem}.batch')
+    if cache:
+        logger.info(cache.stats())
+        cache.close()
+    if checkpoint:
+        checkpoint.close()
+    if dead_letter:
+        dead_letter.close()
+    if metrics:
+        log_report(metrics.records, metrics.path)
+        metrics.close()
+
+    total_time = time.time() - start_time
+    logger.info(f"Recipe evaluation completed. Total execution time: {total_time:.2f} seconds")
+    print(f"Recipe evaluation completed. Total time: {total_time:.2f} seconds")
+    if len(evaluator_models) > 1:
+        print(f"Model switches: {engine.model_switches.switches}")
+    return results
@@ -0,0 +1,66 @@
+import csv
+import heapq
+import os
+import tempfile
+
+# Rows held in memory at once; every run beyond this is spilled to a
+# temporary CSV and merged back with one open file per run
+CHUNK_ROWS = 10000
+
+
+def _write_run(rows, fieldnames, directory):
+    handle, path = tempfile.mkstemp(suffix='.csv', prefix='sort-run-', dir=directory)
+    with os.fdopen(handle, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writerows(rows)
+    return path
+
+
+def _read_run(path, fieldnames):
+    with open(path, 'r', newline='', encoding='utf-8') as file:
+        yield from csv.DictReader(file, fieldnames=fieldnames)
+
+
+def sort_csv(filename, fieldnames, key, reduce=None, chunk_rows=CHUNK_ROWS):
+    # Sorts a CSV by `key` with bounded memory: chunks of `chunk_rows` rows are
+    # sorted in memory and spilled to temporary runs, which are then streamed
+    # through a k-way merge. The sort is stable, so rows with equal keys keep
+    # their file order. `reduce`, if given, receives the sorted row iterator
+    # and returns the rows to write (e.g. to drop duplicates). The sorted file
+    # replaces `filename` atomically.
+    directory = os.path.dirname(os.path.abspath(filename))
+    runs = []
+    try:
+        with open(filename, 'r', newline='', encoding='utf-8') as file:
+            chunk = []
+            for row in csv.DictReader(file):
+                chunk.append(row)
+                if len(chunk) >= chunk_rows:
+                    chunk.sort(key=key)
+                    runs.append(_write_run(chunk, fieldnames, directory))
+                    chunk = []
+            chunk.sort(key=key)
+
+        if runs:
+            if chunk:
+                runs.append(_write_run(chunk, fieldnames, directory))
+            rows = heapq.merge(*(_read_run(path, fieldnames) for path in runs), key=key)
+        else:
+            rows = iter(chunk)
+        if reduce:
+            rows = reduce(rows)
+
+        handle, output = tempfile.mkstemp(suffix='.csv', prefix='sorted-', dir=directory)
+        try:
+            with os.fdopen(handle, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(rows)
+            os.replace(output, filename)
+        except BaseException:
+            os.remove(output)
+            raise
+    finally:
+        for path in runs:
+            os.remove(path)
+    return len(runs)
@@ -0,0 +1,118 @@
+# Successive halving over the prompt-check (prompt, evaluator model) arms:
+# every surviving arm is evaluated on a growing, shuffled subset of the
+# human-annotated recipes, and after each round arms whose MSE against the
+# human scores is clearly worse than the current best arm's are dropped.
+# "Clearly worse" means the bootstrap lower bound of the paired MSE difference
+# to the best arm is above zero, at a confidence Bonferroni-corrected for the
+# number of arms compared that round, and only once the two arms share at
+# least `min_recipes` scored recipes. Arms without any score yet (e.g. a model
+# whose calls all failed this round) are kept. With `eta`, at most 1/eta of
+# the scored arms (rounded up) also survive each round, as in classic
+# successive halving.
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from ash.agreement import HUMAN_DIR, join_scores, load_human
+from ash.bootstrap import resample
+
+
+def arm_errors(evaluations, human, arms, indexes):
+    # (arms x recipes) squared error against the human score, averaged over
+    # the three criteria; NaN where an arm has no parsed score for a recipe
+    joined = join_scores(evaluations, human, overall=False)
+    joined = joined[joined['index'].isin(indexes)]
+    errors = (joined.assign(error=(joined['score'] - joined['human_score']) ** 2)
+              .groupby(['prompt_index', 'evaluator_model', 'index'])['error'].mean())
+    matrix = errors.unstack('index') if len(errors) else pd.DataFrame()
+    matrix = matrix.reindex(index=pd.MultiIndex.from_tuples(arms), columns=sorted(indexes))
+    return matrix.to_numpy(dtype=float)
+
+
+class SuccessiveHalving:
+    def __init__(self, initial_recipes=20, growth=2.0, eta=None, confidence=0.99, resamples=2000, seed=0,
+                 reference='human_total', human_dir=HUMAN_DIR, min_recipes=10):
+        self.initial_recipes = initial_recipes
+        self.growth = growth
+        self.eta = eta
+        self.confidence = confidence
+        self.min_recipes = min_recipes
+        self.resamples = resamples
+        self.seed = seed
+        self.reference = reference
+        self.human_dir = human_dir
+
+    def load_human(self):
+        human = load_human(self.human_dir)
+        human = human[human['annotator'] == self.reference]
+        if human.empty:
+            raise ValueError(f"No annotations for {self.reference} in {self.human_dir}")
+        return human
+
+    def schedule(self, total):
+        # Cumulative subset sizes, ending with every annotated recipe
+        sizes = []
+        size = self.initial_recipes
+        while size < total:
+            sizes.append(size)
+            size = max(size + 1, int(math.ceil(size * self.growth)))
+        return sizes + [total]
+
+    def prune(self, matrix, seed=0):
+        # matrix: (surviving arms x recipes so far). Returns the arms' MSEs,
+        # the lower bound of each arm's MSE difference to the best arm, which
+        # arms survive, and the best arm (None while no arm has a score).
+        present = ~np.isnan(matrix)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mse = np.where(present, matrix, 0.0).sum(axis=-1) / present.sum(axis=-1)
+        keep = np.ones(len(matrix), dtype=bool)
+        lower = np.full(len(matrix), np.nan)
+        scored = ~np.isnan(mse)  # an arm without a single parsed score can't be ranked, so it stays
+        if not scored.any():
+            return mse, lower, keep, None
+        best = int(np.nanargmin(mse))
+        # Only arms with enough recipes scored alongside the best arm are tested
+        shared = (present & present[best]).sum(axis=-1)
+        others = [arm for arm in np.flatnonzero(scored) if arm != best and shared[arm] >= self.min_recipes]
+        if others:
+            pairs = np.array([(arm, best) for arm in others], dtype=np.int64)
+            _, differences, _ = resample(matrix[None], pairs, self.resamples, seed)
+            # Bonferroni: every comparison this round shares the error budget
+            alpha = (1 - self.confidence) / len(others)
+            with np.errstate(invalid='ignore'):
+                lower[others] = np.nanquantile(differences[0], alpha, axis=-1)
+            keep[others] = ~(lower[others] > 0)
+        lower[best] = 0.0
+        if self.eta:
+            limit = int(math.ceil((keep & scored).sum() / self.eta))
+            order = np.argsort(np.where(keep & scored, mse, np.inf), kind='stable')
+            keep[order[limit:]] &= ~scored[order[limit:]]
+        return mse, lower, keep, best
+
+
+def add_halving_arguments(parser):
+    parser.add_argument("--successive-halving", action='store_true',
+                        help="Evaluate only the human-annotated recipes, in growing rounds, "
+                             "dropping (prompt, model) arms that are clearly worse than the best")
+    parser.add_argument("--initial-recipes", type=int, default=20, help="Recipes in the first round")
+    parser.add_argument("--growth", type=float, default=2.0, help="Factor by which each round grows the subset")
+    parser.add_argument("--eta", type=float, default=None,
+                        help="Also keep at most 1/eta of the arms per round (classic successive halving)")
+    parser.add_argument("--confidence", type=float, default=0.99,
+                        help="Confidence that a dropped arm's MSE is above the best arm's, "
+                             "Bonferroni-corrected over the arms compared in a round")
+    parser.add_argument("--min-recipes", type=int, default=10,
+                        help="Recipes an arm must share with the best arm before it can be dropped")
+    parser.add_argument("--resamples", type=int, default=2000, help="Bootstrap resamples per round")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the recipe order and the bootstrap")
+    parser.add_argument("--reference", default='human_total', help="Annotator to compute the MSE against")
+    parser.add_argument("--human-dir", default=HUMAN_DIR, help="Directory with the human annotation CSVs")
+
+
+def halving_from_args(args):
+    if not getattr(args, 'successive_halving', False):
+        return None
+    return SuccessiveHalving(args.initial_recipes, args.growth, args.eta, args.confidence, args.resamples,
+                             args.seed, args.reference, args.human_dir, args.min_recipes)
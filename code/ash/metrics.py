@@ -0,0 +1,174 @@
+# Per-call metrics for the evaluators: one compact CSV row per LLM call (the
+# `<output>.metrics.csv` sidecar) and an end-of-run report of latency
+# percentiles and throughput per evaluator model.
+#
+#   python code/ash/metrics.py v0_recipes_eval_5_ollama.metrics.csv
+
+import argparse
+import csv
+import math
+import os
+import threading
+
+from loguru import logger
+
+SCORE_COLUMNS = ['authenticity_score', 'sensitivity_score', 'harmony_score']
+METRIC_FIELDNAMES = ['started', 'provider', 'model', 'prompt_index', 'index', 'queue_wait', 'latency',
+                     'prompt_tokens', 'completion_tokens', 'tokens_estimated', 'samples', 'parsed', 'retries',
+                     'outcome']
+
+
+def call_metrics(provider, model, started, queue_wait, latency, prompt_tokens, completion_tokens, retries,
+                 samples=1, parsed=0, outcome='ok', index=None, prompt_index=None, tokens_estimated=False):
+    # `started` is when the final attempt was sent (epoch seconds) and
+    # `latency` how long it took; `queue_wait` is the time spent waiting on
+    # the rate limiter over all attempts. `outcome` is 'ok' or the error class
+    # of a call that failed for good.
+    return {
+        'started': f"{started:.3f}",
+        'provider': provider,
+        'model': model,
+        'prompt_index': '' if prompt_index is None else prompt_index,
+        'index': '' if index is None else index,
+        'queue_wait': f"{queue_wait:.3f}",
+        'latency': f"{latency:.3f}",
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'tokens_estimated': int(tokens_estimated),
+        'samples': samples,
+        'parsed': parsed,
+        'retries': retries,
+        'outcome': outcome,
+    }
+
+
+def parsed_ok(parsed_evaluation):
+    return all(parsed_evaluation.get(column) is not None for column in SCORE_COLUMNS)
+
+
+def usage_tokens(usage):
+    # (prompt, completion) tokens from an OpenAI `usage` or a Gemini
+    # `usage_metadata`, or None when the response carries neither
+    if usage is None:
+        return None
+    get = usage.get if isinstance(usage, dict) else lambda name: getattr(usage, name, None)
+    prompt_tokens = get('prompt_tokens') or get('prompt_token_count')
+    completion_tokens = get('completion_tokens') or get('candidates_token_count')
+    if prompt_tokens is None and completion_tokens is None:
+        return None
+    return int(prompt_tokens or 0), int(completion_tokens or 0)
+
+
+class MetricsLog:
+    # Appends metric rows from the threads or coroutines of one process and
+    # keeps them for the end-of-run report. Worker processes send their rows
+    # to a QueuedCSVWriter instead.
+
+    def __init__(self, path):
+        self.path = path
+        self.records = []
+        self._lock = threading.Lock()
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=METRIC_FIELDNAMES)
+        if new:
+            self._writer.writeheader()
+
+    def record(self, metrics):
+        with self._lock:
+            self._writer.writerow(metrics)
+            self._file.flush()
+            self.records.append(metrics)
+
+    def close(self):
+        self._file.close()
+
+
+def create_metrics_file(path):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            csv.DictWriter(file, fieldnames=METRIC_FIELDNAMES).writeheader()
+
+
+def read_metrics(path, since=None):
+    with open(path, 'r', newline='', encoding='utf-8') as file:
+        return [row for row in csv.DictReader(file) if since is None or float(row['started']) >= since]
+
+
+def percentile(sorted_values, q):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return math.nan
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(records):
+    # One summary per (provider, model). Throughput is over the model's own
+    # wall-clock span, from its first request being sent to its last one ending.
+    groups = {}
+    for record in records:
+        groups.setdefault((record['provider'], record['model']), []).append(record)
+    summaries = []
+    for (provider, model), group in sorted(groups.items()):
+        latencies = sorted(float(record['latency']) for record in group)
+        starts = [float(record['started']) for record in group]
+        ends = [float(record['started']) + float(record['latency']) for record in group]
+        span = max(ends) - min(starts)
+        completion_tokens = sum(int(record['completion_tokens']) for record in group)
+        samples = sum(int(record['samples']) for record in group)
+        summaries.append({
+            'provider': provider,
+            'model': model,
+            'calls': len(group),
+            'failed': sum(record['outcome'] != 'ok' for record in group),
+            'retries': sum(int(record['retries']) for record in group),
+            'parse_rate': sum(int(record['parsed']) for record in group) / samples if samples else math.nan,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'queue_wait': sum(float(record['queue_wait']) for record in group) / len(group),
+            'prompt_tokens': sum(int(record['prompt_tokens']) for record in group),
+            'completion_tokens': completion_tokens,
+            'calls_per_second': len(group) / span if span > 0 else math.nan,
+            'tokens_per_second': completion_tokens / span if span > 0 else math.nan,
+            'estimated': any(record['tokens_estimated'] in (1, '1') for record in group),
+        })
+    return summaries
+
+
+def format_report(summaries):
+    lines = [f"{'model':<28} {'calls':>6} {'fail':>5} {'retry':>5} {'parsed':>7} {'p50 s':>7} {'p95 s':>7} "
+             f"{'p99 s':>7} {'wait s':>7} {'calls/s':>8} {'tok/s':>8}"]
+    for summary in summaries:
+        tokens = f"{summary['tokens_per_second']:.1f}" + ('~' if summary['estimated'] else '')
+        lines.append(f"{summary['model'][:28]:<28} {summary['calls']:>6} {summary['failed']:>5} {summary['retries']:>5} "
+                     f"{summary['parse_rate']:>7.1%} {summary['p50']:>7.2f} {summary['p95']:>7.2f} "
+                     f"{summary['p99']:>7.2f} {summary['queue_wait']:>7.2f} {summary['calls_per_second']:>8.2f} "
+                     f"{tokens:>8}")
+    if any(summary['estimated'] for summary in summaries):
+        lines.append("~ completion tokens estimated from the response length (the provider reported no usage)")
+    return '\n'.join(lines)
+
+
+def log_report(records, path):
+    if records:
+        logger.info(f"Per-call metrics saved to {path}\n{format_report(summarize(records))}")
+
+
+def add_metrics_argument(parser, default):
+    parser.add_argument("--metrics", default=default,
+                        help="CSV sidecar with one row of latency, token and retry metrics per LLM call "
+                             "(empty string disables)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and throughput report from an evaluator metrics file")
+    parser.add_argument("metrics", nargs='+', help="Metrics CSV files written by the evaluators")
+    parser.add_argument("--since", type=float, default=None, help="Only calls started at or after this epoch time")
+    args = parser.parse_args()
+    records = [record for path in args.metrics for record in read_metrics(path, args.since)]
+    print(format_report(summarize(records)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# Stand-in for the google.generativeai module, so the Gemini evaluators can be
+# run without an API key. It answers in-process with the same canned responses
+# as mock_server.py and honours candidate_count.
+#
+#   python code/ash/mock_gemini.py --latency 0.2 \
+#       code/evaluation/5-round/evaluate_recipes_5_gemini_flash.py recipes.csv --concurrency 8 --candidates 5
+
+import argparse
+import asyncio
+import importlib
+import os
+import runpy
+import sys
+import threading
+import time
+import types
+
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ash.mock_server import canned_response
+
+
+class ResourceExhausted(Exception):
+    # Same class name and code as google.api_core.exceptions.ResourceExhausted
+    code = 429
+
+
+class GenerationConfig:
+    def __init__(self, candidate_count=None, **kwargs):
+        self.candidate_count = candidate_count
+        self.__dict__.update(kwargs)
+
+
+class Part:
+    def __init__(self, text):
+        self.text = text
+
+
+class Content:
+    def __init__(self, text):
+        self.parts = [Part(text)]
+        self.role = 'model'
+
+
+class Candidate:
+    def __init__(self, index, text):
+        self.index = index
+        self.content = Content(text)
+        self.finish_reason = 'STOP'
+
+
+class GenerateContentResponse:
+    def __init__(self, candidates):
+        self.candidates = candidates
+
+    @property
+    def text(self):
+        if len(self.candidates) != 1:
+            raise ValueError("The `response.text` quick accessor only works for responses with a single candidate.")
+        return ''.join(part.text for part in self.candidates[0].content.parts)
+
+
+class MockStats:
+    def __init__(self, latency=0.0, rate_limit_every=0):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.request_count = 0
+        self.candidate_count = 0
+        self._lock = threading.Lock()
+
+    def count_request(self, candidates):
+        with self._lock:
+            self.request_count += 1
+            self.candidate_count += candidates
+            return self.request_count
+
+
+stats = MockStats()
+
+
+class GenerativeModel:
+    def __init__(self, model_name, **kwargs):
+        self.model_name = model_name
+
+    def _respond(self, contents, generation_config):
+        candidate_count = getattr(generation_config, 'candidate_count', None) or 1
+        count = stats.count_request(candidate_count)
+        if stats.rate_limit_every and count % stats.rate_limit_every == 0:
+            raise ResourceExhausted("429 Resource has been exhausted (e.g. check quota).")
+        prompt = contents if isinstance(contents, str) else str(contents)
+        return GenerateContentResponse([Candidate(i, canned_response(prompt, i)) for i in range(candidate_count)])
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        if stats.latency:
+            time.sleep(stats.latency)
+        return self._respond(contents, generation_config)
+
+    async def generate_content_async(self, contents, generation_config=None, **kwargs):
+        if stats.latency:
+            await asyncio.sleep(stats.latency)
+        return self._respond(contents, generation_config)
+
+
+def configure(api_key=None, **kwargs):
+    pass
+
+
+def install(latency=0.0, rate_limit_every=0):
+    # Register this module as google.generativeai; a real `google` namespace
+    # package (protobuf, api_core) is kept if one is installed
+    stats.latency = latency
+    stats.rate_limit_every = rate_limit_every
+    module = sys.modules[__name__]
+    try:
+        google = importlib.import_module('google')
+    except ImportError:
+        google = types.ModuleType('google')
+        google.__path__ = []
+        sys.modules['google'] = google
+    google.generativeai = module
+    sys.modules['google.generativeai'] = module
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a Gemini evaluator script against the in-process stub")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering each request")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="Raise ResourceExhausted (429) on every Nth request (0 disables)")
+    parser.add_argument("script", help="Evaluator script to run")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER, help="Arguments passed to the script")
+    args = parser.parse_args()
+
+    install(args.latency, args.rate_limit_every)
+    sys.argv = [args.script] + args.script_args
+    start_time = time.time()
+    try:
+        runpy.run_path(args.script, run_name='__main__')
+    finally:
+        logger.info(f"Stub answered {stats.request_count} requests ({stats.candidate_count} candidates) "
+                    f"in {time.time() - start_time:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# Local stand-in for the chat endpoints used by the generation and evaluation
+# scripts (OpenAI /v1/chat/completions and Ollama /api/chat), so runs can be
+# exercised without paying for API calls or loading models. The OpenAI files
+# and batches endpoints are stubbed too, keeping uploads and batch output as
+# files under --storage-dir.
+#
+#   python code/ash/mock_server.py --port 8000 --latency 0.2
+#   python code/evaluation/5-round/evaluate_recipes_5_4o.py recipes.csv \
+#       --concurrency 16 --api-base http://127.0.0.1:8000/v1
+
+import argparse
+import email.parser
+import email.policy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+EVALUATION_TEMPLATE = """AUTHENTICITY: {authenticity}
+Reason: The recipe keeps the core elements of the original dish.
+SENSITIVITY: {sensitivity}
+Reason: The variation is reflected in the ingredients and techniques.
+HARMONY: {harmony}
+Reason: The result is a coherent dish overall."""
+
+
+def canned_response(prompt, choice_index=0):
+    digest = hashlib.sha256(f"{prompt}\x00{choice_index}".encode('utf-8')).digest()
+    return EVALUATION_TEMPLATE.format(
+        authenticity=digest[0] % 5 + 1,
+        sensitivity=digest[1] % 5 + 1,
+        harmony=digest[2] % 5 + 1,
+    )
+
+
+def chat_completion(request, request_number):
+    prompt = request['messages'][-1]['content']
+    choices = [
+        {
+            'index': i,
+            'message': {'role': 'assistant', 'content': canned_response(prompt, i)},
+            'finish_reason': 'stop',
+        }
+        for i in range(request.get('n', 1))
+    ]
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = sum(len(c['message']['content']) // 4 for c in choices)
+    return {
+        'id': f"chatcmpl-mock-{request_number}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': request.get('model'),
+        'choices': choices,
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        },
+    }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Buffer each response into one write and disable Nagle, otherwise keep-alive
+    # connections stall on delayed ACKs between the header and body segments
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    latency = 0.0
+    rate_limit_every = 0
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length)
+
+    def read_json(self):
+        return json.loads(self.read_body() or b'{}')
+
+    def read_form(self):
+        # multipart/form-data fields as {name: (filename, bytes)}
+        body = self.read_body()
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode('utf-8')
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(header + body)
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            fields[name] = (part.get_filename(), part.get_payload(decode=True))
+        return fields
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if '/batches/' in path:
+            batch = self.server.get_batch(path.rsplit('/', 1)[1])
+            if batch is None:
+                self.send_json(404, {'error': {'message': f"No such batch: {path}"}})
+            else:
+                self.send_json(200, batch)
+        elif path.endswith('/content') and '/files/' in path:
+            file_id = path.split('/files/')[1].split('/')[0]
+            data = self.server.read_file(file_id)
+            if data is None:
+                self.send_json(404, {'error': {'message': f"No such file: {file_id}"}})
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self.send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        path = self.path.rstrip('/')
+        if path.endswith('/files'):
+            filename, data = self.read_form()['file']
+            self.send_json(200, self.server.store_file(filename, data))
+            return
+        if path.endswith('/batches'):
+            request = self.read_json()
+            batch = self.server.create_batch(request['input_file_id'], request.get('metadata'))
+            if batch is None:
+                self.send_json(404, {'error': {'message': f"No such file: {request['input_file_id']}"}})
+            else:
+                self.send_json(200, batch)
+            return
+
+        request = self.read_json()
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.path.rstrip('/').endswith('/chat/completions'):
+            count = self.server.count_request()
+            if self.rate_limit_every and count % self.rate_limit_every == 0:
+                self.send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                               headers={'Retry-After': '1'})
+                return
+            self.send_json(200, chat_completion(request, count))
+        elif self.path.rstrip('/') == '/api/chat':
+            self.server.count_request()
+            prompt = request['messages'][-1]['content']
+            content = canned_response(prompt)
+            self.send_json(200, {
+                'model': request.get('model'),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'message': {'role': 'assistant', 'content': content},
+                'done': True,
+                'prompt_eval_count': len(prompt) // 4,
+                'eval_count': len(content) // 4,
+            })
+        else:
+            self.send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, rate_limit_every=0, storage_dir=None, batch_seconds=2.0):
+        handler = type('Handler', (MockHandler,), {'latency': latency, 'rate_limit_every': rate_limit_every})
+        super().__init__(address, handler)
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self.storage_dir = storage_dir or tempfile.mkdtemp(prefix='mock-openai-')
+        os.makedirs(self.storage_dir, exist_ok=True)
+        self.batch_seconds = batch_seconds  # How long a batch stays in_progress
+
+    def count_request(self):
+        with self._count_lock:
+            self.request_count += 1
+            return self.request_count
+
+    def _path(self, name):
+        return os.path.join(self.storage_dir, os.path.basename(name))
+
+    def store_file(self, filename, data):
+        with self._count_lock:
+            file_id = f"file-mock-{len(os.listdir(self.storage_dir)) + 1}"
+            with open(self._path(file_id), 'wb') as file:
+                file.write(data)
+        return {'id': file_id, 'object': 'file', 'bytes': len(data), 'filename': filename,
+                'purpose': 'batch', 'created_at': int(time.time())}
+
+    def read_file(self, file_id):
+        try:
+            with open(self._path(file_id), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def create_batch(self, input_file_id, metadata=None):
+        data = self.read_file(input_file_id)
+        if data is None:
+            return None
+        # Answers are written right away; get_batch reports them once batch_seconds have passed
+        lines = []
+        for line in data.decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            count = self.count_request()
+            lines.append(json.dumps({
+                'id': f"batch_req_mock_{len(lines) + 1}",
+                'custom_id': request['custom_id'],
+                'response': {'status_code': 200, 'request_id': f"req_mock_{len(lines) + 1}",
+                             'body': chat_completion(request['body'], count)},
+                'error': None,
+            }))
+        output = self.store_file('batch_output.jsonl', ('\n'.join(lines) + '\n').encode('utf-8'))
+        batch_id = f"batch_mock_{input_file_id.rsplit('-', 1)[1]}"
+        batch = {
+            'id': batch_id,
+            'object': 'batch',
+            'endpoint': '/v1/chat/completions',
+            'input_file_id': input_file_id,
+            'completion_window': '24h',
+            'status': 'validating',
+            'output_file_id': None,
+            'error_file_id': None,
+            'created_at': int(time.time()),
+            'request_counts': {'total': len(lines), 'completed': 0, 'failed': 0},
+            'metadata': metadata,
+            'errors': None,
+            '_output_file_id': output['id'],
+            '_ready_at': time.time() + self.batch_seconds,
+        }
+        with open(self._path(f"{batch_id}.json"), 'w', encoding='utf-8') as file:
+            json.dump(batch, file)
+        return self._public(batch)
+
+    def get_batch(self, batch_id):
+        try:
+            with open(self._path(f"{batch_id}.json"), 'r', encoding='utf-8') as file:
+                batch = json.load(file)
+        except FileNotFoundError:
+            return None
+        if time.time() >= batch['_ready_at']:
+            batch['status'] = 'completed'
+            batch['output_file_id'] = batch['_output_file_id']
+            batch['request_counts']['completed'] = batch['request_counts']['total']
+        else:
+            batch['status'] = 'in_progress'
+        return self._public(batch)
+
+    def _public(self, batch):
+        return {key: value for key, value in batch.items() if not key.startswith('_')}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_in_thread(host='127.0.0.1', port=0, latency=0.0, rate_limit_every=0, storage_dir=None, batch_seconds=2.0):
+    server = MockServer((host, port), latency=latency, rate_limit_every=rate_limit_every,
+                        storage_dir=storage_dir, batch_seconds=batch_seconds)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the LLM chat endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering each request")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="Answer every Nth request with 429 and a Retry-After header (0 disables)")
+    parser.add_argument("--storage-dir", default=None,
+                        help="Directory for uploaded batch files and batch output (default: a new temporary directory)")
+    parser.add_argument("--batch-seconds", type=float, default=2.0,
+                        help="Seconds a submitted batch stays in_progress before it completes")
+    args = parser.parse_args()
+
+    server = MockServer((args.host, args.port), latency=args.latency, rate_limit_every=args.rate_limit_every,
+                        storage_dir=args.storage_dir, batch_seconds=args.batch_seconds)
+    logger.info(f"Mock LLM server listening on {server.url} (batch files in {server.storage_dir})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
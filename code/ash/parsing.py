@@ -0,0 +1,187 @@
+import re
+from operator import itemgetter
+
+# Single-pass parsers for the evaluators' free-text responses. One scan finds
+# every criterion keyword and "Reason:" marker; scores and reasons are then
+# read off that token list instead of running a DOTALL regex per field.
+# Each function returns exactly what the per-script regex version returned:
+#   parse_evaluation              - OpenAI and Ollama evaluators (float scores)
+#   parse_gemini_evaluation       - Gemini evaluators (score digits as strings)
+#   parse_prompt_check_evaluation - prompt-check harness (int scores, cleaned text)
+
+SCORE_KEYS = ['authenticity_score', 'sensitivity_score', 'harmony_score']
+EVALUATION_KEYS = ['authenticity_score', 'authenticity_reason', 'sensitivity_score',
+                   'sensitivity_reason', 'harmony_score', 'harmony_reason']
+PROMPT_CHECK_KEYS = EVALUATION_KEYS + ['reflection']
+
+KEYWORDS = ('authenticity', 'sensitivity', 'harmony', 'reflection', 'reason:', 'explanation:')
+KEYWORD_PATTERN_IGNORECASE = re.compile('|'.join(f'({re.escape(keyword)})' for keyword in KEYWORDS), re.IGNORECASE)
+SCORE_PATTERN = re.compile(r'(?P<colon>:)?\s*(?P<mark>[*#])?\s*(?P<digits>\d+)(?P<fraction>\.\d+)?')
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+MARKDOWN_PATTERN = re.compile(r'\*\*|\n{2,}')
+# Characters that re.IGNORECASE matches against ASCII letters but str.lower()
+# does not map one-to-one (long s, dotless i, dotted capital I, Kelvin sign)
+CASE_SPECIAL = ('\u017f', '\u0131', '\u0130', '\u212a')
+
+
+def tokenize(evaluation):
+    # (keyword, start, end) for every keyword and reason marker, in order.
+    # Substring search on a lowercased copy is far faster than a case-insensitive
+    # regex; the few texts where lowercasing isn't equivalent use the regex.
+    # No keyword can overlap another, so both give the same tokens.
+    if not evaluation.isascii() and any(char in evaluation for char in CASE_SPECIAL):
+        return [(KEYWORDS[match.lastindex - 1], match.start(), match.end())
+                for match in KEYWORD_PATTERN_IGNORECASE.finditer(evaluation)]
+
+    lowered = evaluation.lower()
+    tokens = []
+    for keyword in KEYWORDS:
+        start = lowered.find(keyword)
+        while start != -1:
+            end = start + len(keyword)
+            tokens.append((keyword, start, end))
+            start = lowered.find(keyword, end)
+    tokens.sort(key=itemgetter(1))
+    return tokens
+
+
+def _first_score(evaluation, tokens, keyword, accept):
+    # Leftmost occurrence of the keyword followed by a score the caller accepts
+    for kind, start, end in tokens:
+        if kind == keyword:
+            match = SCORE_PATTERN.match(evaluation, end)
+            if match and accept(match):
+                return match
+    return None
+
+
+def _reason_start(evaluation, tokens, keyword, markers, need_colon=True):
+    # First "<KEYWORD>:" and the first reason marker after it; returns where
+    # the reason text starts (after any whitespace), or None
+    for position, (kind, start, end) in enumerate(tokens):
+        if kind != keyword:
+            continue
+        if need_colon:
+            if evaluation[end:end + 1] != ':':
+                continue
+            end += 1
+        for marker_kind, marker_start, marker_end in tokens[position + 1:]:
+            if marker_kind in markers and marker_start >= end:
+                while marker_end < len(evaluation) and evaluation[marker_end].isspace():
+                    marker_end += 1
+                return marker_end
+        return None
+    return None
+
+
+def _next_keyword(tokens, position, keywords):
+    for kind, start, end in tokens:
+        if start >= position and kind in keywords:
+            return start
+    return None
+
+
+def _reason(evaluation, tokens, keyword, markers, stops, need_colon=True, stop_required=False):
+    start = _reason_start(evaluation, tokens, keyword, markers, need_colon)
+    if start is None:
+        return None
+    end = _next_keyword(tokens, start, stops) if stops else None
+    if end is None:
+        if stop_required:
+            return None
+        end = len(evaluation)
+    return evaluation[start:end].strip()
+
+
+def parse_evaluation(evaluation):
+    tokens = tokenize(evaluation)
+    result = {}
+    for keyword, stops in (('authenticity', ('sensitivity', 'harmony')),
+                           ('sensitivity', ('harmony',)),
+                           ('harmony', ())):
+        match = _first_score(evaluation, tokens, keyword, lambda match: True)
+        result[f'{keyword}_score'] = float(match.group('digits') + (match.group('fraction') or '')) if match else None
+        result[f'{keyword}_reason'] = _reason(evaluation, tokens, keyword, ('reason:', 'explanation:'), stops)
+    return {key: result[key] for key in EVALUATION_KEYS}
+
+
+def validate_and_fix_scores(parsed_evaluation):
+    # Out-of-range or missing scores fall back to the first number in the reason
+    for key in SCORE_KEYS:
+        score = parsed_evaluation[key]
+        if score is None or score < 1 or score > 5:
+            text = parsed_evaluation[key.replace('score', 'reason')]
+            match = NUMBER_PATTERN.search(text) if text else None
+            score = float(match.group()) if match else None
+            parsed_evaluation[key] = score if score is not None and 1 <= score <= 5 else None
+    return parsed_evaluation
+
+
+def parse_gemini_evaluation(evaluation):
+    tokens = tokenize(evaluation)
+    result = {}
+    for keyword, stops in (('authenticity', ('sensitivity',)), ('sensitivity', ('harmony',)), ('harmony', ())):
+        match = _first_score(evaluation, tokens, keyword, lambda match: match.group('mark') is None)
+        result[f'{keyword}_score'] = match.group('digits') if match else None
+        result[f'{keyword}_reason'] = _reason(evaluation, tokens, keyword, ('reason:',), stops,
+                                              need_colon=False, stop_required=bool(stops))
+    return {key: result[key] for key in EVALUATION_KEYS}
+
+
+def _clean_text(value):
+    value = MARKDOWN_PATTERN.sub(' ', value)
+    return ' '.join(value.split())
+
+
+def parse_prompt_check_evaluation(evaluation):
+    if not evaluation or isinstance(evaluation, float):
+        return {key: None for key in PROMPT_CHECK_KEYS}
+
+    # Extract only the content part from LLM response
+    if "content=" in evaluation:
+        evaluation = evaluation.split("content=")[1].split(" additional_kwargs=")[0].strip('"')
+    evaluation = evaluation.replace('\\"', '"').replace('\\n', '\n')
+
+    tokens = tokenize(evaluation)
+    result = {}
+    for keyword, stops in (('authenticity', ('sensitivity',)), ('sensitivity', ('harmony',)), ('harmony', ('reflection',))):
+        match = _first_score(evaluation, tokens, keyword,
+                             lambda match: match.group('colon') is not None and match.group('mark') is None)
+        score = int(match.group('digits')) if match else None
+        result[f'{keyword}_score'] = score if score is not None and 1 <= score <= 5 else None
+
+        start = _reason_start(evaluation, tokens, keyword, ('reason:',))
+        if start is None:
+            result[f'{keyword}_reason'] = None
+            continue
+        end = _next_keyword(tokens, start, stops)
+        if keyword == 'harmony':
+            # The harmony reason also ends at the first blank line
+            blank = evaluation.find('\n\n', start)
+            if blank != -1 and (end is None or blank < end):
+                end = blank
+        result[f'{keyword}_reason'] = _clean_text(evaluation[start:end].strip())
+
+    start = _reason_start(evaluation, tokens, 'reflection', ('reason:',))
+    result['reflection'] = None if start is None else _clean_text(evaluation[start:].strip())
+    return {key: result[key] for key in PROMPT_CHECK_KEYS}
+
+
+def parse_and_fix_evaluation(evaluation):
+    return validate_and_fix_scores(parse_evaluation(evaluation))
+
+
+# Output columns each response format derives from the raw `evaluation` text
+PARSERS = {
+    'default': (parse_and_fix_evaluation, EVALUATION_KEYS),
+    'gemini': (parse_gemini_evaluation, EVALUATION_KEYS),
+    'prompt-check': (parse_prompt_check_evaluation, PROMPT_CHECK_KEYS),
+}
+
+
+def detect_format(fieldnames, first_row=None):
+    if 'prompt_index' in fieldnames or 'reflection' in fieldnames:
+        return 'prompt-check'
+    if first_row and str(first_row.get('evaluator_model', '')).startswith('gemini'):
+        return 'gemini'
+    return 'default'
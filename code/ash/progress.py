@@ -0,0 +1,153 @@
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from loguru import logger
+
+# Completed-count samples kept for the rolling throughput and ETA
+WINDOW_SECONDS = 120.0
+# The status file is rewritten every --status-interval seconds; a progress
+# line is logged at most this often
+LOG_INTERVAL = 60.0
+
+
+class Progress:
+    # Counts finished and failed work units per model and periodically
+    # rewrites a JSON status file (completed/total, rolling throughput and
+    # ETA, error rate, and the work still queued per model). Counters live in
+    # shared memory, so worker processes started with this object (fork) can
+    # update them directly; each update is one locked increment.
+
+    def __init__(self, path, models, interval=5.0, description=None):
+        self.path = path
+        self.models = list(models)
+        self.interval = interval
+        self.description = description
+        self._positions = {model: position for position, model in enumerate(self.models)}
+        # total, completed and failed per model
+        self._counts = multiprocessing.Array('q', 3 * len(self.models))
+        self._samples = deque()
+        self._thread = None
+        self._stop = None
+        self.started = None
+        self._last_log = 0.0
+
+    def __getstate__(self):
+        # Only the counters travel to worker processes
+        state = self.__dict__.copy()
+        state['_thread'] = state['_stop'] = None
+        state['_samples'] = deque()
+        return state
+
+    def _add(self, model, column, amount=1):
+        position = 3 * self._positions[model] + column
+        with self._counts.get_lock():
+            self._counts[position] += amount
+
+    def add_work(self, model, amount):
+        self._add(model, 0, amount)
+
+    def advance(self, model, failed=False):
+        self._add(model, 1)
+        if failed:
+            self._add(model, 2)
+
+    def fail(self, model):
+        # A unit already counted by advance() that turned out to be a failure
+        self._add(model, 2)
+
+    def start(self):
+        self.started = time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='progress', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def snapshot(self, state='running'):
+        with self._counts.get_lock():
+            counts = list(self._counts)
+        now = time.time()
+        models = {}
+        for model, position in self._positions.items():
+            total, completed, failed = counts[3 * position:3 * position + 3]
+            models[model] = {'total': total, 'completed': completed, 'failed': failed,
+                             'queued': max(0, total - completed)}
+        total = sum(model['total'] for model in models.values())
+        completed = sum(model['completed'] for model in models.values())
+        failed = sum(model['failed'] for model in models.values())
+
+        self._samples.append((now, completed))
+        while len(self._samples) > 2 and now - self._samples[0][0] > WINDOW_SECONDS:
+            self._samples.popleft()
+        (first_time, first_completed), (last_time, last_completed) = self._samples[0], self._samples[-1]
+        throughput = (last_completed - first_completed) / (last_time - first_time) if last_time > first_time else None
+        remaining = max(0, total - completed)
+        eta = remaining / throughput if throughput else None
+        return {
+            'state': state,
+            'description': self.description,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started or now)),
+            'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(now)),
+            'elapsed_seconds': round(now - (self.started or now), 1),
+            'total': total,
+            'completed': completed,
+            'failed': failed,
+            'remaining': remaining,
+            'percent': round(100 * completed / total, 2) if total else None,
+            'error_rate': round(failed / completed, 4) if completed else 0.0,
+            'throughput_per_second': None if throughput is None else round(throughput, 3),
+            'eta_seconds': None if eta is None else round(eta),
+            'eta_at': None if eta is None else time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(now + eta)),
+            'models': models,
+        }
+
+    def write(self, state='running'):
+        status = self.snapshot(state)
+        # Write-then-rename, so readers never see a half-written file
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(status, file, indent=2)
+        os.replace(temporary, self.path)
+        if state != 'running' or time.time() - self._last_log >= LOG_INTERVAL:
+            self._last_log = time.time()
+            rate = '' if status['throughput_per_second'] is None else f", {status['throughput_per_second']:.2f}/s"
+            eta = '' if status['eta_seconds'] is None else f", ETA {timedelta(seconds=status['eta_seconds'])}"
+            logger.info(f"Progress: {status['completed']}/{status['total']} done ({status['failed']} failed)"
+                        f"{rate}{eta}")
+        return status
+
+    def close(self, state='finished'):
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+        return self.write(state)
+
+
+def add_progress_arguments(parser, default):
+    parser.add_argument("--status-file", default=default,
+                        help="JSON status file rewritten with progress, throughput, ETA and error rate "
+                             "(empty string disables)")
+    parser.add_argument("--status-interval", type=float, default=5.0, help="Seconds between status file updates")
+    parser.add_argument("--verbose", action='store_true', help="Also log a line for every call (debug level)")
+
+
+def configure_logging(args):
+    # Per-call lines are logged at debug level; loguru's default sink shows
+    # them, so it is replaced with an INFO one unless --verbose is given
+    logger.remove()
+    logger.add(sys.stderr, level='DEBUG' if args.verbose else 'INFO')
+
+
+def progress_from_args(args, models, description=None):
+    if not args.status_file:
+        return None
+    return Progress(args.status_file, models, args.status_interval, description)
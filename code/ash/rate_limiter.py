@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+
+from loguru import logger
+
+# Default limits per provider. None disables throttling entirely, which is what
+# a local Ollama server wants. Override with --rpm / --tpm on the scripts.
+PROVIDER_LIMITS = {
+    'openai': {'requests_per_minute': 500, 'tokens_per_minute': 30000},
+    'gemini': {'requests_per_minute': 60, 'tokens_per_minute': None},
+    'ollama': {'requests_per_minute': None, 'tokens_per_minute': None},
+    'mock': {'requests_per_minute': None, 'tokens_per_minute': None},
+}
+
+# Per-model quotas, which take precedence over the provider defaults. Gemini
+# enforces its limits per model (pay-as-you-go figures; free-tier keys should
+# pass --rpm, and the limiter backs off on 429s either way).
+MODEL_LIMITS = {
+    'gemini-1.5-flash': {'requests_per_minute': 1000, 'tokens_per_minute': 4000000},
+    'gemini-1.5-pro': {'requests_per_minute': 360, 'tokens_per_minute': 4000000},
+}
+
+# Pause used when a 429 arrives without a usable Retry-After header
+DEFAULT_RETRY_AFTER = 10.0
+
+
+def estimate_tokens(text):
+    # Rough GPT-style estimate (~4 characters per token); good enough for budgeting
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    def __init__(self, per_minute, burst_seconds=1.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount, now, scale=1.0):
+        # Take `amount` right away (the level may go negative) and return how
+        # long the caller has to wait until the bucket is back out of debt.
+        rate = self.rate * scale
+        self.level = min(self.capacity, self.level + (now - self.updated) * rate)
+        self.updated = now
+        self.level -= amount
+        if self.level >= 0:
+            return 0.0
+        return -self.level / rate
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, name='default'):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        # Multiplicative back-off on 429s, slowly recovered on successful calls
+        self.scale = 1.0
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Locks can't be pickled; each worker process gets its own limiter state
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.request_bucket is not None or self.token_bucket is not None
+
+    def _reserve(self, tokens):
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self.blocked_until - now)
+            if self.request_bucket:
+                wait = max(wait, self.request_bucket.reserve(1, now, self.scale))
+            if self.token_bucket:
+                wait = max(wait, self.token_bucket.reserve(tokens, now, self.scale))
+            return wait
+
+    def acquire(self, tokens=1):
+        if not self.enabled and self.blocked_until == 0.0:
+            return 0.0
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens=1):
+        if not self.enabled and self.blocked_until == 0.0:
+            return 0.0
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def report_success(self):
+        if self.scale < 1.0:
+            with self._lock:
+                self.scale = min(1.0, self.scale + 0.05)
+
+    def report_rate_limited(self, retry_after=None):
+        retry_after = retry_after if retry_after is not None else DEFAULT_RETRY_AFTER
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self.scale = max(0.1, self.scale / 2)
+        logger.warning(f"Rate limited by {self.name}; pausing {retry_after:.1f}s and "
+                       f"throttling to {self.scale:.0%} of the configured rate")
+
+
+def get_rate_limiter(provider, requests_per_minute=None, tokens_per_minute=None, model=None):
+    limits = MODEL_LIMITS.get(model) or PROVIDER_LIMITS.get(provider, {})
+    return RateLimiter(
+        requests_per_minute=requests_per_minute or limits.get('requests_per_minute'),
+        tokens_per_minute=tokens_per_minute or limits.get('tokens_per_minute'),
+        name=model or provider,
+    )
+
+
+def is_rate_limit_error(error):
+    # requests.HTTPError (Ollama, batch uploads) carries the status on its response
+    for source in (error, getattr(error, 'response', None)):
+        status = (getattr(source, 'http_status', None) or getattr(source, 'status_code', None)
+                  or getattr(source, 'code', None))
+        if status == 429:
+            return True
+    return type(error).__name__ in ('RateLimitError', 'ResourceExhausted', 'TooManyRequests')
+
+
+def retry_after_from_error(error):
+    headers = getattr(error, 'headers', None)
+    if headers is None:
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after') or headers.get('Retry-After')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def add_rate_limit_arguments(parser):
+    parser.add_argument("--rpm", type=int, default=None,
+                        help="Requests per minute allowed by the provider (default depends on the provider)")
+    parser.add_argument("--tpm", type=int, default=None,
+                        help="Tokens per minute allowed by the provider (default depends on the provider)")
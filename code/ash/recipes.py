@@ -0,0 +1,196 @@
+import argparse
+import csv
+import io
+import json
+import os
+
+from loguru import logger
+
+# Columns whose values are kept in the sidecar index so that --filter and
+# checkpoint lookups don't have to parse the (multi-KB) recipe bodies
+INDEX_COLUMNS = ('index', 'model')
+INDEX_VERSION = 1
+
+
+def index_path_for(path):
+    return f"{path}.idx.json"
+
+
+def _split_records(file):
+    # Yield (offset, raw bytes) per CSV record. A record continues onto the next
+    # line while it has an odd number of quote characters, which is how the csv
+    # module writes newlines inside quoted fields.
+    offset = file.tell()
+    record, quotes = b'', 0
+    for line in iter(file.readline, b''):
+        record += line
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            yield offset, record
+            offset += len(record)
+            record, quotes = b'', 0
+    if record:
+        yield offset, record
+
+
+def _parse_record(raw, encoding, errors):
+    return next(csv.reader(io.StringIO(raw.decode(encoding, errors), newline='')), [])
+
+
+class RecipeIndex:
+    # Byte offset of every record plus a few small columns, cached next to the
+    # CSV and rebuilt whenever the CSV's size or mtime changes
+
+    def __init__(self, header, offsets, columns):
+        self.header = header
+        self.offsets = offsets  # len(rows) + 1 entries; the last one is the end of the data
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def build(cls, path, encoding='utf-8', errors='strict'):
+        with open(path, 'rb') as file:
+            records = _split_records(file)
+            _, header_raw = next(records, (0, b''))
+            header = _parse_record(header_raw, encoding, errors)
+            positions = {column: header.index(column) for column in INDEX_COLUMNS if column in header}
+            offsets = []
+            columns = {column: [] for column in positions}
+            end = len(header_raw)
+            for offset, raw in records:
+                end = offset + len(raw)
+                values = _parse_record(raw, encoding, errors)
+                if not values:
+                    continue  # Blank line, which csv.DictReader skips as well
+                offsets.append(offset)
+                for column, position in positions.items():
+                    columns[column].append(values[position] if position < len(values) else None)
+            offsets.append(end)
+        return cls(header, offsets, columns)
+
+    @classmethod
+    def load(cls, path, encoding='utf-8', errors='strict'):
+        stat = os.stat(path)
+        sidecar = index_path_for(path)
+        try:
+            with open(sidecar, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if (data['version'], data['size'], data['mtime_ns']) == (INDEX_VERSION, stat.st_size, stat.st_mtime_ns):
+                return cls(data['header'], data['offsets'], data['columns'])
+            logger.info(f"{path} changed since {sidecar} was written, rebuilding the index")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable index {sidecar}: {str(e)}")
+
+        index = cls.build(path, encoding, errors)
+        data = {
+            'version': INDEX_VERSION,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'header': index.header,
+            'offsets': index.offsets,
+            'columns': index.columns,
+        }
+        try:
+            with open(sidecar, 'w', encoding='utf-8') as file:
+                json.dump(data, file)
+            logger.info(f"Indexed {len(index)} rows of {path} into {sidecar}")
+        except OSError as e:
+            logger.warning(f"Could not write index {sidecar}: {str(e)}")
+        return index
+
+
+class RecipeReader:
+    # Streams rows of a recipe CSV as dicts (same as csv.DictReader) without
+    # loading the file. The row count and --start/--stop/--filter selection come
+    # from the sidecar index, and rows can also be fetched by position.
+
+    def __init__(self, path, start=None, stop=None, filters=None, encoding='utf-8', errors='strict'):
+        self.path = path
+        self.encoding = encoding
+        self.errors = errors
+        self.index = RecipeIndex.load(path, encoding, errors)
+        self.fieldnames = self.index.header
+        self._file = None
+        self.positions = self._select(start, stop, filters or {})
+
+    def _select(self, start, stop, filters):
+        positions = range(len(self.index))[slice(start, stop)]
+        for column, value in filters.items():
+            if column in self.index.columns:
+                values = self.index.columns[column]
+                positions = [position for position in positions if values[position] == value]
+            elif column in self.fieldnames:
+                # Not indexed, so this column needs the rows parsed
+                positions = [position for position in positions if self._read(position).get(column) == value]
+            else:
+                raise ValueError(f"Cannot filter on unknown column '{column}' (columns: {', '.join(self.fieldnames)})")
+        return list(positions)
+
+    def __getstate__(self):
+        # Worker processes reopen the CSV themselves
+        state = self.__dict__.copy()
+        state['_file'] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _read(self, position):
+        if self._file is None:
+            self._file = open(self.path, 'rb')
+        start, end = self.index.offsets[position], self.index.offsets[position + 1]
+        self._file.seek(start)
+        values = _parse_record(self._file.read(end - start), self.encoding, self.errors)
+        row = dict(zip(self.fieldnames, values))
+        for name in self.fieldnames[len(values):]:
+            row[name] = None
+        return row
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, i):
+        return self._read(self.positions[i])
+
+    def __iter__(self):
+        for position in self.positions:
+            yield self._read(position)
+
+    def column(self, name):
+        # Values of an indexed column for the selected rows, without reading them
+        values = self.index.columns[name]
+        return [values[position] for position in self.positions]
+
+
+def parse_filter(text):
+    column, sep, value = text.partition('=')
+    if not sep or not column:
+        raise argparse.ArgumentTypeError(f"expected COLUMN=VALUE, got '{text}'")
+    return column.strip(), value.strip()
+
+
+def add_input_arguments(parser):
+    parser.add_argument("--start", type=int, default=None,
+                        help="First input row to evaluate (0-based, like a Python slice)")
+    parser.add_argument("--stop", type=int, default=None,
+                        help="Stop before this input row (0-based, like a Python slice)")
+    parser.add_argument("--filter", type=parse_filter, action='append', default=[], metavar='COLUMN=VALUE',
+                        help="Only evaluate rows where COLUMN equals VALUE, e.g. --filter model=gemma2:9b (repeatable)")
+
+
+def open_recipes(path, args=None, errors='strict'):
+    if args is None:
+        return RecipeReader(path, errors=errors)
+    return RecipeReader(path, start=args.start, stop=args.stop, filters=dict(args.filter), errors=errors)
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+from loguru import logger
+
+from ash.rate_limiter import is_rate_limit_error, retry_after_from_error
+
+# Error classes. Rate limits are retried after the limiter's pause, transient
+# errors after a jittered exponential backoff, permanent errors not at all.
+RATE_LIMIT = 'rate_limit'
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+# Exception class names (any provider SDK, httpx, requests, aiohttp) that
+# mean the request may well succeed if sent again
+TRANSIENT_NAMES = ('Timeout', 'TimedOut', 'Connection', 'Connect', 'ServiceUnavailable', 'Unavailable',
+                   'TryAgain', 'APIError', 'InternalServerError', 'ServerError', 'DeadlineExceeded',
+                   'RemoteProtocolError', 'ServerDisconnected', 'IncompleteRead')
+
+
+def _status(error):
+    for source in (error, getattr(error, 'response', None)):
+        for attribute in ('http_status', 'status_code', 'status', 'code'):
+            value = getattr(source, attribute, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def classify_error(error):
+    if is_rate_limit_error(error):
+        return RATE_LIMIT
+    status = _status(error)
+    if status == 429:
+        return RATE_LIMIT
+    if status is not None and (status >= 500 or status in (408, 409)):
+        return TRANSIENT
+    if status is not None and 400 <= status < 500:
+        return PERMANENT
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return TRANSIENT
+    names = [cls.__name__ for cls in type(error).__mro__]
+    if any(part in name for name in names for part in TRANSIENT_NAMES):
+        return TRANSIENT
+    return PERMANENT
+
+
+class Failure:
+    # The final outcome of a call that exhausted its retries or failed for
+    # good; stands in for the response texts so nothing parses it as one
+    def __init__(self, error, category, attempts):
+        self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+        self.category = category
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Failure({self.category}, {self.attempts} attempts: {self.error})"
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, category, attempt):
+        return category != PERMANENT and attempt < self.max_attempts
+
+    def delay(self, category, attempt):
+        # Rate limits already pause in the limiter (Retry-After); everything
+        # else waits a "full jitter" backoff so retries don't arrive in lockstep
+        if category == RATE_LIMIT:
+            return 0.0
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, function, rate_limiter=None, tokens=1, describe='', stats=None):
+        # Runs function() until it succeeds or fails for good; returns its
+        # result or a Failure. `stats`, if given, receives the rate-limiter
+        # wait, the attempts, and when the final attempt started and its latency.
+        queue_wait = 0.0
+        for attempt in range(1, self.max_attempts + 1):
+            if rate_limiter:
+                queue_wait += rate_limiter.acquire(tokens)
+            started = time.time()
+            if stats is not None:
+                stats.update(queue_wait=queue_wait, attempts=attempt, started=started)
+            try:
+                result = function()
+                if stats is not None:
+                    stats['latency'] = time.time() - started
+                if rate_limiter:
+                    rate_limiter.report_success()
+                return result
+            except Exception as e:
+                if stats is not None:
+                    stats['latency'] = time.time() - started
+                category = classify_error(e)
+                if category == RATE_LIMIT and rate_limiter:
+                    rate_limiter.report_rate_limited(retry_after_from_error(e))
+                if not self.should_retry(category, attempt):
+                    return Failure(e, category, attempt)
+                delay = self.delay(category, attempt)
+                logger.warning(f"{describe}: {category} error on attempt {attempt}/{self.max_attempts}, "
+                               f"retrying in {delay:.1f}s: {str(e)}")
+                time.sleep(delay)
+
+
+class DeadLetterLog:
+    # Append-only JSONL of calls that finally failed, one record per failure
+    # with its error class. A later success appends a resolving record; the
+    # latest record for a key wins, like the checkpoint.
+
+    def __init__(self, path):
+        self.path = path
+        self.failed = {}
+        self._lock = threading.Lock()
+        self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def __getstate__(self):
+        # Worker processes reopen the file for appending
+        state = self.__dict__.copy()
+        del state['_lock'], state['_file']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as file:
+            for line_number, line in enumerate(file, start=1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable dead-letter line {line_number} in {self.path}")
+                    continue
+                key = tuple(record['key'])
+                if record.get('resolved'):
+                    self.failed.pop(key, None)
+                else:
+                    self.failed[key] = record
+        if self.failed:
+            logger.info(f"{len(self.failed)} failed calls recorded in {self.path}")
+
+    def __contains__(self, key):
+        return key in self.failed
+
+    def _append(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def record(self, key, failure, **details):
+        record = {'key': list(key), 'category': failure.category, 'attempts': failure.attempts,
+                  'error': failure.error, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), **details}
+        self._append(record)
+        self.failed[tuple(key)] = record
+
+    def resolve(self, key):
+        if tuple(key) in self.failed:
+            self._append({'key': list(key), 'resolved': True})
+            self.failed.pop(tuple(key))
+
+    def summary(self):
+        counts = {}
+        for record in self.failed.values():
+            counts[record['category']] = counts.get(record['category'], 0) + 1
+        return ', '.join(f"{count} {category}" for category, count in sorted(counts.items()))
+
+    def close(self):
+        self._file.close()
+
+
+def add_retry_arguments(parser, dead_letter_default):
+    parser.add_argument("--max-attempts", type=int, default=5,
+                        help="Attempts per call for rate-limited and transient errors (timeouts, 5xx)")
+    parser.add_argument("--retry-base-delay", type=float, default=1.0,
+                        help="Backoff before the first retry in seconds; doubles per attempt, with full jitter")
+    parser.add_argument("--retry-max-delay", type=float, default=60.0, help="Upper bound of the backoff in seconds")
+    parser.add_argument("--dead-letter", default=dead_letter_default,
+                        help="JSONL file recording calls that finally failed, with their error class")
+    parser.add_argument("--retry-failed", action='store_true',
+                        help="Re-issue only the calls recorded in the dead-letter file")
+
+
+def retry_policy_from_args(args):
+    return RetryPolicy(args.max_attempts, args.retry_base_delay, args.retry_max_delay)
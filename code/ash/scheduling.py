@@ -0,0 +1,25 @@
+class ModelSwitchCounter:
+    # Counts how often consecutive LLM calls target a different model. Each
+    # switch forces Ollama to swap the new model into memory.
+
+    def __init__(self):
+        self.current = None
+        self.switches = 0
+
+    def observe(self, model_name):
+        if model_name != self.current:
+            self.current = model_name
+            self.switches += 1
+
+
+def model_major_tasks(num_rows, model_names, iterations=(None,)):
+    # Yields (row_position, model_name, iteration, output_position) grouped by
+    # model, where output_position is the slot the result takes in the usual
+    # recipe -> model -> iteration row order
+    num_models = len(model_names)
+    num_iterations = len(iterations)
+    for model_position, model_name in enumerate(model_names):
+        for row_position in range(num_rows):
+            for iteration_position, iteration in enumerate(iterations):
+                output_position = (row_position * num_models + model_position) * num_iterations + iteration_position
+                yield row_position, model_name, iteration, output_position
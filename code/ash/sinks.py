@@ -0,0 +1,111 @@
+import csv
+import io
+import multiprocessing
+import os
+import queue
+import time
+
+from loguru import logger
+
+
+class OrderedCSVWriter:
+    # Writes rows to a CSV as soon as every row before them is done, so the
+    # file is always a complete, correctly ordered prefix of the final output
+    # even though results arrive out of order from concurrent workers. A None
+    # row marks a position that produces no output (e.g. a skipped iteration).
+
+    def __init__(self, path, fieldnames):
+        self.path = path
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames, extrasaction='ignore')
+        self._writer.writeheader()
+        self._pending = {}
+        self.next_position = 0
+
+    def add(self, position, row):
+        self._pending[position] = row
+        written = False
+        while self.next_position in self._pending:
+            row = self._pending.pop(self.next_position)
+            if row is not None:
+                self._writer.writerow(row)
+            self.next_position += 1
+            written = True
+        if written:
+            self._file.flush()
+
+    def close(self):
+        if self._pending:
+            logger.warning(f"{len(self._pending)} rows after position {self.next_position} were never written to {self.path}")
+        self._file.close()
+        logger.info(f"Results saved to {self.path}")
+
+
+def _write_queued_rows(path, fieldnames, rows, stats, batch_size, fsync_interval):
+    # Runs in the writer process: the only process that touches the file, so
+    # records from different workers can never interleave. Rows waiting in the
+    # queue are rendered together and written with one write() per batch.
+    start_time = time.time()
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    written = batches = syncs = 0
+    dirty = False
+    last_sync = start_time
+    with open(path, 'a', newline='', encoding='utf-8') as file:
+        done = False
+        while not done:
+            try:
+                batch = [rows.get(timeout=fsync_interval)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < batch_size:
+                try:
+                    batch.append(rows.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:  # The stop sentinel is always the last item
+                done = True
+                batch = batch[:batch.index(None)]
+            if batch:
+                writer.writerows(batch)
+                file.write(buffer.getvalue())
+                file.flush()
+                buffer.seek(0)
+                buffer.truncate()
+                written += len(batch)
+                batches += 1
+                dirty = True
+            now = time.time()
+            if dirty and (done or now - last_sync >= fsync_interval):
+                os.fsync(file.fileno())
+                syncs += 1
+                dirty = False
+                last_sync = now
+    stats.put({'rows': written, 'batches': batches, 'fsyncs': syncs, 'seconds': time.time() - start_time})
+
+
+class QueuedCSVWriter:
+    # Appends rows sent by any number of worker processes to one CSV through a
+    # dedicated writer process. Workers put row dicts on `queue`; the writer
+    # batches whatever is waiting, flushes after every batch and fsyncs at
+    # most every `fsync_interval` seconds (and once more on close).
+
+    def __init__(self, path, fieldnames, batch_size=64, fsync_interval=5.0):
+        self.path = path
+        self.queue = multiprocessing.Queue()
+        self._stats = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=_write_queued_rows,
+            args=(path, fieldnames, self.queue, self._stats, batch_size, fsync_interval),
+            daemon=True
+        )
+        self._process.start()
+
+    def close(self):
+        self.queue.put(None)
+        stats = self._stats.get()
+        self._process.join()
+        rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+        logger.info(f"Writer: {stats['rows']} rows to {self.path} in {stats['batches']} batches "
+                    f"({rate:.1f} rows/s, {stats['fsyncs']} fsyncs)")
+        return stats
@@ -0,0 +1,49 @@
+# Adaptive early stopping for the multi-round evaluators: after `min_rounds`
+# rounds, a recipe gets no further iterations once every criterion's scores
+# across the completed rounds have a (population) variance of at most
+# `max_variance`. With the defaults a recipe stops after three identical
+# judgments. A round whose scores failed to parse never counts as agreement.
+
+from ash.parsing import SCORE_KEYS
+
+
+def _score(row, key):
+    try:
+        return float(row.get(key))
+    except (TypeError, ValueError):
+        return None
+
+
+class EarlyStopping:
+    def __init__(self, min_rounds=3, max_variance=0.0):
+        self.min_rounds = min_rounds
+        self.max_variance = max_variance
+
+    def done(self, rows):
+        # rows: the result rows of one recipe and evaluator model so far
+        if len(rows) < self.min_rounds:
+            return False
+        for key in SCORE_KEYS:
+            scores = [_score(row, key) for row in rows]
+            if None in scores:
+                return False
+            mean = sum(scores) / len(scores)
+            if sum((score - mean) ** 2 for score in scores) / len(scores) > self.max_variance:
+                return False
+        return True
+
+
+def add_stopping_arguments(parser):
+    parser.add_argument("--adaptive", action='store_true',
+                        help="Stop issuing iterations for a recipe once its completed rounds agree")
+    parser.add_argument("--min-rounds", type=int, default=3,
+                        help="Rounds every recipe gets before --adaptive may stop it")
+    parser.add_argument("--max-variance", type=float, default=0.0,
+                        help="Largest per-criterion score variance across rounds that counts as agreement "
+                             "(0 means identical scores)")
+
+
+def stopping_from_args(args):
+    if not getattr(args, 'adaptive', False):
+        return None
+    return EarlyStopping(args.min_rounds, args.max_variance)
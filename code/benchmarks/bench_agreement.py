@@ -0,0 +1,148 @@
+# Benchmark: agreement metrics for a full prompt x evaluator model x criterion
+# grid against every human annotator. Checks the vectorized metrics against a
+# straightforward per-group loop on a sample of groups and reports the time
+# for the whole grid.
+#
+#   python code/benchmarks/bench_agreement.py
+#   python code/benchmarks/bench_agreement.py --prompts 8 --models 5 --iterations 5
+
+import argparse
+import itertools
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ash.agreement import CRITERIA, GROUP_COLUMNS, agreement_metrics, join_scores, load_human
+
+
+# --- Reference implementations, one group at a time --------------------------
+
+def reference_ranks(values):
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+
+def reference_pearson(x, y):
+    mean_x, mean_y = sum(x) / len(x), sum(y) / len(y)
+    sxy = sum((a - mean_x) * (b - mean_y) for a, b in zip(x, y))
+    sxx = sum((a - mean_x) ** 2 for a in x)
+    syy = sum((b - mean_y) ** 2 for b in y)
+    return sxy / math.sqrt(sxx * syy) if sxx and syy else float('nan')
+
+
+def reference_kendall(x, y):
+    concordant = discordant = x_ties = y_ties = 0
+    for i, j in itertools.combinations(range(len(x)), 2):
+        dx, dy = x[i] - x[j], y[i] - y[j]
+        if dx == 0 and dy == 0:
+            continue
+        if dx == 0:
+            x_ties += 1
+        elif dy == 0:
+            y_ties += 1
+        elif (dx > 0) == (dy > 0):
+            concordant += 1
+        else:
+            discordant += 1
+    denominator = math.sqrt((concordant + discordant + x_ties) * (concordant + discordant + y_ties))
+    return (concordant - discordant) / denominator if denominator else float('nan')
+
+
+def reference_alpha(x, y):
+    # Krippendorff's alpha from the coincidence matrix, interval metric
+    pairs = {}
+    for a, b in zip(x, y):
+        pairs[(a, b)] = pairs.get((a, b), 0) + 1
+        pairs[(b, a)] = pairs.get((b, a), 0) + 1
+    totals = {}
+    for (a, _), count in pairs.items():
+        totals[a] = totals.get(a, 0) + count
+    n = sum(totals.values())
+    observed = sum(count * (a - b) ** 2 for (a, b), count in pairs.items())
+    expected = sum(totals[a] * totals[b] * (a - b) ** 2 for a in totals for b in totals) / (n - 1)
+    return 1 - observed / expected if expected else float('nan')
+
+
+def reference_metrics(x, y):
+    return {
+        'mse': sum((a - b) ** 2 for a, b in zip(x, y)) / len(x),
+        'mae': sum(abs(a - b) for a, b in zip(x, y)) / len(x),
+        'pearson': reference_pearson(x, y),
+        'spearman': reference_pearson(reference_ranks(x), reference_ranks(y)),
+        'kendall': reference_kendall(x, y),
+        'alpha': reference_alpha(x, y),
+    }
+
+
+def synthetic_evaluations(indexes, prompts, models, iterations, rng):
+    # Evaluator scores loosely tied to a per-recipe quality, so correlations are not all ~0
+    quality = rng.integers(1, 6, size=len(indexes))
+    frames = []
+    for prompt_index in range(1, prompts + 1):
+        for model in range(models):
+            for iteration in range(1, iterations + 1):
+                for criterion in CRITERIA:
+                    noise = rng.integers(-2, 3, size=len(indexes))
+                    frames.append(pd.DataFrame({
+                        'index': indexes, 'source': 'synthetic', 'prompt_index': prompt_index,
+                        'evaluator_model': f'model-{model}', 'iteration': iteration, 'criterion': criterion,
+                        'score': np.clip(quality + noise, 1, 5).astype(float),
+                    }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the vectorized agreement metrics on a synthetic grid")
+    parser.add_argument("--prompts", type=int, default=8)
+    parser.add_argument("--models", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--per-call", action='store_true', help="Compare every iteration instead of per-recipe means")
+    parser.add_argument("--check-groups", type=int, default=20, help="Groups compared against the reference loop")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    human = load_human()
+    evaluations = synthetic_evaluations(np.sort(human['index'].unique()), args.prompts, args.models, args.iterations, rng)
+    logger.info(f"{len(evaluations)} evaluator scores against {human['annotator'].nunique()} annotators")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        joined = join_scores(evaluations, human, args.per_call)
+        metrics = agreement_metrics(joined)
+    elapsed = (time.perf_counter() - start) / args.repeat
+
+    mismatches = 0
+    sample = metrics.sample(min(args.check_groups, len(metrics)), random_state=args.seed)
+    grouped = joined.groupby(GROUP_COLUMNS)
+    for _, row in sample.iterrows():
+        group = grouped.get_group(tuple(row[column] for column in GROUP_COLUMNS))
+        expected = reference_metrics(group['score'].tolist(), group['human_score'].tolist())
+        for name, value in expected.items():
+            if not (math.isclose(row[name], value, rel_tol=1e-9, abs_tol=1e-12) or (math.isnan(row[name]) and math.isnan(value))):
+                mismatches += 1
+                logger.error(f"{tuple(row[column] for column in GROUP_COLUMNS)} {name}: {row[name]} != reference {value}")
+
+    print(f"{len(metrics)} groups ({len(joined)} joined scores) in {elapsed * 1000:.1f} ms   "
+          f"identical to reference: {len(sample) * 6 - mismatches}/{len(sample) * 6}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Microbenchmark: per-call client construction vs. the pooled client registry,
+# measured against the local mock Ollama endpoint.
+#
+#   python code/benchmarks/bench_clients.py --calls 2000 --threads 8
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ash.clients import OllamaClient, get_client
+from ash.mock_server import start_in_thread
+
+PROMPT = "Evaluate the following recipe:\n\nOriginal Dish: Pasta\nVariation: Korean\n"
+
+
+def fresh_client_call(base_url, model):
+    # What the scripts used to do: build a new client (and connection) per request
+    with requests.Session() as session:
+        return OllamaClient(model, base_url=base_url, session=session).invoke(PROMPT)
+
+
+def pooled_client_call(base_url, model):
+    return get_client('ollama', model, base_url).invoke(PROMPT)
+
+
+def run(label, call, base_url, models, calls, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda i: call(base_url, models[i % len(models)]), range(calls)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} {calls} calls in {elapsed:.2f}s  ({calls / elapsed:,.0f} calls/s, "
+          f"{elapsed / calls * 1000:.2f} ms/call)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-call vs pooled LLM clients against a mock server")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated server latency per request (seconds)")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+    server = start_in_thread(latency=args.latency)
+    models = ["gemma2:9b", "mistral:7b", "llama3.1:8b"]
+    try:
+        fresh = run("per-call client", fresh_client_call, server.url, models, args.calls, args.threads)
+        pooled = run("pooled registry", pooled_client_call, server.url, models, args.calls, args.threads)
+        print(f"speedup: {fresh / pooled:.2f}x")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
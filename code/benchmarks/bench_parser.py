@@ -0,0 +1,243 @@
+# Benchmark: the per-script regex parsers vs. the single-pass parsers in
+# ash/parsing.py. Checks that both return identical results on every response
+# and reports throughput for each response format.
+#
+#   python code/benchmarks/bench_parser.py                        # synthetic responses
+#   python code/benchmarks/bench_parser.py v0_recipes_eval_5_*.csv  # stored `evaluation` column
+
+import argparse
+import csv
+import os
+import random
+import re
+import sys
+import time
+
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ash.parsing import parse_evaluation, parse_gemini_evaluation, parse_prompt_check_evaluation, validate_and_fix_scores
+
+csv.field_size_limit(sys.maxsize)
+
+
+# --- Reference implementations, copied from the evaluator scripts -----------
+
+def legacy_parse_evaluation(evaluation):
+    patterns = [
+        (r'AUTHENTICITY:?\s*(?:\*|\#)?\s*(\d+(?:\.\d+)?)', 'authenticity_score'),
+        (r'AUTHENTICITY:.*?(?:Reason|Explanation):\s*(.*?)(?=\n*(?:SENSITIVITY|HARMONY|$))', 'authenticity_reason'),
+        (r'SENSITIVITY:?\s*(?:\*|\#)?\s*(\d+(?:\.\d+)?)', 'sensitivity_score'),
+        (r'SENSITIVITY:.*?(?:Reason|Explanation):\s*(.*?)(?=\n*(?:HARMONY|$))', 'sensitivity_reason'),
+        (r'HARMONY:?\s*(?:\*|\#)?\s*(\d+(?:\.\d+)?)', 'harmony_score'),
+        (r'HARMONY:.*?(?:Reason|Explanation):\s*(.*?)(?=$)', 'harmony_reason')
+    ]
+
+    result = {}
+    for pattern, key in patterns:
+        match = re.search(pattern, evaluation, re.DOTALL | re.IGNORECASE)
+        if match:
+            value = match.group(1).strip()
+            if 'score' in key:
+                value = re.sub(r'[^\d.]', '', value)
+                try:
+                    value = float(value)
+                except ValueError:
+                    value = None
+            result[key] = value
+        else:
+            result[key] = None
+
+    return result
+
+
+def legacy_validate_and_fix_scores(parsed_evaluation):
+    for key in ['authenticity_score', 'sensitivity_score', 'harmony_score']:
+        score = parsed_evaluation[key]
+        if score is None or score < 1 or score > 5:
+            text = parsed_evaluation[key.replace('score', 'reason')]
+            if text:
+                match = re.search(r'\d+(?:\.\d+)?', text)
+                if match:
+                    try:
+                        score = float(match.group())
+                        if 1 <= score <= 5:
+                            parsed_evaluation[key] = score
+                        else:
+                            parsed_evaluation[key] = None
+                    except ValueError:
+                        parsed_evaluation[key] = None
+                else:
+                    parsed_evaluation[key] = None
+            else:
+                parsed_evaluation[key] = None
+    return parsed_evaluation
+
+
+def legacy_parse_gemini_evaluation(evaluation):
+    patterns = [
+        (r'AUTHENTICITY:?\s*(\d+)', 'authenticity_score'),
+        (r'AUTHENTICITY.*?(?:Reason):\s*(.*?)(?=\n*SENSITIVITY)', 'authenticity_reason'),
+        (r'SENSITIVITY:?\s*(\d+)', 'sensitivity_score'),
+        (r'SENSITIVITY.*?(?:Reason):\s*(.*?)(?=\n*HARMONY)', 'sensitivity_reason'),
+        (r'HARMONY:?\s*(\d+)', 'harmony_score'),
+        (r'HARMONY.*?(?:Reason):\s*(.*)', 'harmony_reason')
+    ]
+
+    result = {}
+    for pattern, key in patterns:
+        match = re.search(pattern, evaluation, re.DOTALL | re.IGNORECASE)
+        if match:
+            result[key] = match.group(1).strip()
+        else:
+            result[key] = None
+
+    return result
+
+
+def legacy_parse_prompt_check_evaluation(evaluation):
+    if not evaluation or isinstance(evaluation, float):
+        return {key: None for key in ['authenticity_score', 'authenticity_reason',
+                                    'sensitivity_score', 'sensitivity_reason',
+                                    'harmony_score', 'harmony_reason', 'reflection']}
+
+    if "content=" in evaluation:
+        evaluation = evaluation.split("content=")[1].split(" additional_kwargs=")[0].strip('"')
+    evaluation = evaluation.replace('\\"', '"').replace('\\n', '\n')
+
+    patterns = [
+        (r'\*\*AUTHENTICITY:\*\*\s*(\d+)', 'authenticity_score'),
+        (r'AUTHENTICITY:\s*(\d+)', 'authenticity_score'),
+        (r'\*\*AUTHENTICITY:?\*\*.*?\*\*Reason:\*\*\s*(.*?)(?=\n*\*\*SENSITIVITY\*\*|\n*SENSITIVITY:|$)', 'authenticity_reason'),
+        (r'AUTHENTICITY:.*?Reason:\s*(.*?)(?=\n*SENSITIVITY|$)', 'authenticity_reason'),
+        (r'\*\*SENSITIVITY:\*\*\s*(\d+)', 'sensitivity_score'),
+        (r'SENSITIVITY:\s*(\d+)', 'sensitivity_score'),
+        (r'\*\*SENSITIVITY:?\*\*.*?\*\*Reason:\*\*\s*(.*?)(?=\n*\*\*HARMONY\*\*|\n*HARMONY:|$)', 'sensitivity_reason'),
+        (r'SENSITIVITY:.*?Reason:\s*(.*?)(?=\n*HARMONY|$)', 'sensitivity_reason'),
+        (r'\*\*HARMONY:\*\*\s*(\d+)', 'harmony_score'),
+        (r'HARMONY:\s*(\d+)', 'harmony_score'),
+        (r'\*\*HARMONY:?\*\*.*?\*\*Reason:\*\*\s*(.*?)(?=\n*\*\*REFLECTION\*\*|\n*REFLECTION:|$)', 'harmony_reason'),
+        (r'HARMONY:.*?Reason:\s*(.*?)(?=\n*REFLECTION|\n\n|$)', 'harmony_reason'),
+        (r'\*\*REFLECTION:?\*\*.*?\*\*Reason:\*\*\s*(.*?)(?=$)', 'reflection'),
+        (r'REFLECTION:.*?Reason:\s*(.*?)(?=$)', 'reflection')
+    ]
+
+    result = {}
+    for pattern, key in patterns:
+        match = re.search(pattern, evaluation, re.DOTALL | re.IGNORECASE)
+        if match:
+            value = match.group(1).strip()
+            if '_score' in key:
+                try:
+                    value = int(value)
+                    if not (1 <= value <= 5):
+                        value = None
+                except (ValueError, TypeError):
+                    value = None
+            elif '_reason' in key or key == 'reflection':
+                value = re.sub(r'\*\*|\n{2,}', ' ', value)
+                value = ' '.join(value.split())
+        else:
+            value = None
+        result[key] = value
+
+    return result
+
+
+# --- Synthetic responses covering the formats the models actually produce ---
+
+SENTENCES = [
+    "The dish keeps its core ingredients and technique.",
+    "Gochujang adds heat that fits the Korean variation well.",
+    "Cultural sensitivity is shown by avoiding pork.",
+    "The harmony between sweet and sour could be better balanced.",
+    "It scores a 4 because the sauce is traditional.",
+    "Substituting rice noodles keeps the texture close to the original.",
+    "Authenticity suffers slightly from the cream.",
+    "Overall the reflection on the recipe is positive.",
+]
+
+
+def synthetic_response(rng):
+    scores = [rng.choice(['1', '2', '3', '4', '5', '4.5', '0', '7', '10', '**4**', '[3]', 'N/A']) for _ in range(3)]
+    bold = rng.random() < 0.3
+    marker = rng.choice(['Reason', 'Explanation', 'reason', 'Reasoning'])
+    lines = []
+    if rng.random() < 0.2:
+        lines.append("Here is my evaluation of the recipe:\n")
+    for name, score in zip(['AUTHENTICITY', 'SENSITIVITY', 'HARMONY'], scores):
+        name = name.title() if rng.random() < 0.1 else name
+        reason = ' '.join(rng.choice(SENTENCES) for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.05:
+            reason = ''
+        if bold:
+            lines.append(f"**{name}:** {score}\n**{marker}:** {reason}")
+        else:
+            lines.append(f"{name}: {score}\n{marker}: {reason}")
+    if rng.random() < 0.3:
+        lines.append(f"REFLECTION:\nReason: {' '.join(rng.choice(SENTENCES) for _ in range(3))}")
+    separator = rng.choice(['\n', '\n\n', '\n\n\n'])
+    text = separator.join(lines)
+    if rng.random() < 0.05:
+        text = f'content="{text}" additional_kwargs={{}}'.replace('\n', '\\n')
+    if rng.random() < 0.03:
+        text = "Error: Request timed out"
+    return text
+
+
+def load_evaluations(filenames):
+    evaluations = []
+    for filename in filenames:
+        with open(filename, 'r', newline='', encoding='utf-8', errors='replace') as file:
+            evaluations.extend(row['evaluation'] for row in csv.DictReader(file) if row.get('evaluation'))
+    return evaluations
+
+
+def run(function, evaluations, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [function(evaluation) for evaluation in evaluations]
+    elapsed = (time.perf_counter() - start) / repeat
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare legacy and single-pass evaluation parsers")
+    parser.add_argument("csv_files", nargs='*', help="Evaluation CSVs whose `evaluation` column is used as input")
+    parser.add_argument("--responses", type=int, default=20000, help="Number of synthetic responses when no CSV is given")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.csv_files:
+        evaluations = load_evaluations(args.csv_files)
+    else:
+        rng = random.Random(args.seed)
+        evaluations = [synthetic_response(rng) for _ in range(args.responses)]
+    total_bytes = sum(len(evaluation.encode('utf-8')) for evaluation in evaluations)
+    logger.info(f"Parsing {len(evaluations)} responses ({total_bytes / 1e6:.1f} MB)")
+
+    cases = [
+        ('openai/ollama', lambda text: legacy_validate_and_fix_scores(legacy_parse_evaluation(text)),
+         lambda text: validate_and_fix_scores(parse_evaluation(text))),
+        ('gemini', legacy_parse_gemini_evaluation, parse_gemini_evaluation),
+        ('prompt-check', legacy_parse_prompt_check_evaluation, parse_prompt_check_evaluation),
+    ]
+    mismatches = 0
+    for name, legacy, single_pass in cases:
+        expected, legacy_time = run(legacy, evaluations, args.repeat)
+        actual, new_time = run(single_pass, evaluations, args.repeat)
+        differences = [position for position, (a, b) in enumerate(zip(expected, actual)) if a != b]
+        mismatches += len(differences)
+        for position in differences[:3]:
+            logger.error(f"{name}: mismatch on response {position}:\n{evaluations[position]!r}\n"
+                         f"legacy:      {expected[position]}\nsingle-pass: {actual[position]}")
+        print(f"{name:14s} legacy {len(evaluations) / legacy_time:10.0f} resp/s   "
+              f"single-pass {len(evaluations) / new_time:10.0f} resp/s   "
+              f"speedup {legacy_time / new_time:4.1f}x   identical: {len(evaluations) - len(differences)}/{len(evaluations)}")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
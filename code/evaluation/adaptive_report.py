@@ -0,0 +1,125 @@
+# How much --adaptive saves and what it costs in accuracy, without calling any
+# LLM. Replays the early-stopping rule over a full 5-round run, in iteration
+# order, for a grid of settings and compares each recipe's mean score over the
+# rounds it would have used with its full 5-round mean:
+#   python3 adaptive_report.py v0_recipes_eval_5_4o.csv --min-rounds 2 3 --max-variance 0 0.25
+# With --adaptive, compares an actual adaptive run against the full run instead:
+#   python3 adaptive_report.py v0_recipes_eval_5_4o.csv --adaptive adaptive/v0_recipes_eval_5_4o.csv
+
+import argparse
+import csv
+import itertools
+import os
+import sys
+from loguru import logger
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ash.parsing import SCORE_KEYS
+from ash.stopping import EarlyStopping
+
+csv.field_size_limit(sys.maxsize)
+
+
+def _score(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def load_rounds(filenames):
+    # {(file, index, evaluator_model): [row, ...]} in iteration order
+    recipes = {}
+    for filename in filenames:
+        with open(filename, 'r', newline='', encoding='utf-8', errors='replace') as file:
+            for row in csv.DictReader(file):
+                key = (filename, row['index'], row.get('evaluator_model'))
+                recipes.setdefault(key, []).append(row)
+    for rows in recipes.values():
+        rows.sort(key=lambda row: int(row.get('iteration') or 0))
+    return recipes
+
+
+def mean_scores(rows):
+    means = {}
+    for key in SCORE_KEYS:
+        scores = [_score(row.get(key)) for row in rows]
+        scores = [score for score in scores if score is not None]
+        means[key] = sum(scores) / len(scores) if scores else None
+    return means
+
+
+def rounds_used(rows, stopping):
+    for used in range(1, len(rows) + 1):
+        if stopping.done(rows[:used]):
+            return used
+    return len(rows)
+
+
+def compare(full, used_rows):
+    # used_rows: {recipe key: the rows the adaptive run kept}
+    total_rounds = sum(len(rows) for rows in full.values())
+    kept_rounds = sum(len(used_rows[key]) for key in full)
+    report = {'recipes': len(full), 'rounds': kept_rounds, 'saved': 1 - kept_rounds / max(1, total_rounds)}
+    for key in SCORE_KEYS:
+        deviations = []
+        full_sum = kept_sum = 0.0
+        for recipe, rows in full.items():
+            full_mean = mean_scores(rows)[key]
+            kept_mean = mean_scores(used_rows[recipe])[key]
+            if full_mean is None or kept_mean is None:
+                continue
+            deviations.append(abs(kept_mean - full_mean))
+            full_sum += full_mean
+            kept_sum += kept_mean
+        name = key.replace('_score', '')
+        report[f'{name}_mae'] = sum(deviations) / len(deviations) if deviations else float('nan')
+        report[f'{name}_max'] = max(deviations) if deviations else float('nan')
+        # Shift of the corpus-wide mean score, i.e. of the distribution's centre
+        report[f'{name}_shift'] = (kept_sum - full_sum) / len(deviations) if deviations else float('nan')
+    return report
+
+
+def print_reports(reports):
+    names = [key.replace('_score', '') for key in SCORE_KEYS]
+    header = f"{'setting':24s} {'rounds':>8s} {'saved':>7s}" + ''.join(f" {name[:4] + ' mae':>9s} {name[:4] + ' max':>9s} {name[:4] + ' shift':>10s}" for name in names)
+    print(header)
+    for setting, report in reports:
+        line = f"{setting:24s} {report['rounds']:8d} {100 * report['saved']:6.1f}%"
+        for name in names:
+            line += f" {report[f'{name}_mae']:9.3f} {report[f'{name}_max']:9.2f} {report[f'{name}_shift']:+10.3f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calls saved vs. deviation from full 5-round means for --adaptive")
+    parser.add_argument("input_files", nargs='+', help="Full 5-round evaluation CSVs")
+    parser.add_argument("--min-rounds", type=int, nargs='+', default=[2, 3, 4])
+    parser.add_argument("--max-variance", type=float, nargs='+', default=[0.0, 0.25, 0.5])
+    parser.add_argument("--adaptive", nargs='+', default=None,
+                        help="CSVs written with --adaptive, one per input file, to compare instead of replaying")
+    args = parser.parse_args()
+    if args.adaptive and len(args.adaptive) != len(args.input_files):
+        parser.error("--adaptive needs one file per input file")
+
+    full = load_rounds(args.input_files)
+    logger.info(f"Loaded {sum(len(rows) for rows in full.values())} rounds of {len(full)} recipes")
+    reports = []
+    if args.adaptive:
+        kept = load_rounds(args.adaptive)
+        renamed = dict(zip(args.adaptive, args.input_files))
+        kept = {(renamed[filename], index, model): rows for (filename, index, model), rows in kept.items()}
+        missing = [key for key in full if key not in kept]
+        if missing:
+            logger.warning(f"{len(missing)} recipes of the full run are missing from the adaptive run and are skipped")
+            full = {key: rows for key, rows in full.items() if key in kept}
+        reports.append(('adaptive run', compare(full, kept)))
+    else:
+        for min_rounds, max_variance in itertools.product(args.min_rounds, args.max_variance):
+            stopping = EarlyStopping(min_rounds, max_variance)
+            used = {key: rows[:rounds_used(rows, stopping)] for key, rows in full.items()}
+            reports.append((f"min {min_rounds}, var <= {max_variance:g}", compare(full, used)))
+    print_reports(reports)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Re-derive score and reason columns from the stored raw `evaluation` text,
+# without calling any LLM. Use after fixing a parser in ash/parsing.py:
+#   python3 reparse_evaluations.py v0_recipes_eval_5_4o.csv
+#   python3 reparse_evaluations.py evaluated_recipes_full_4_5_6_7_8.csv --format prompt-check --workers 8
+
+import argparse
+import collections
+import csv
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+from loguru import logger
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ash.parsing import PARSERS, detect_format
+
+csv.field_size_limit(sys.maxsize)
+
+
+def as_csv_value(value):
+    # What csv.DictWriter would write, so unchanged rows compare equal
+    return '' if value is None else str(value)
+
+
+def reparse_chunk(rows, parser_format):
+    parse, keys = PARSERS[parser_format]
+    changed = 0
+    for row in rows:
+        parsed = parse(row.get('evaluation') or '')
+        if any(as_csv_value(parsed[key]) != (row.get(key) or '') for key in keys):
+            changed += 1
+        row.update(parsed)
+    return rows, changed
+
+
+def chunked(reader, chunk_size):
+    while True:
+        chunk = list(itertools.islice(reader, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def reparse_file(input_filename, output_filename, parser_format='auto', workers=None, chunk_size=1000):
+    start_time = time.time()
+    with open(input_filename, 'r', newline='', encoding='utf-8', errors='replace') as infile, \
+         open(output_filename, 'w', newline='', encoding='utf-8') as outfile:
+        reader = csv.DictReader(infile)
+        first_chunk = list(itertools.islice(reader, chunk_size))
+        if parser_format == 'auto':
+            parser_format = detect_format(reader.fieldnames or [], first_chunk[0] if first_chunk else None)
+        logger.info(f"Re-parsing {input_filename} with the '{parser_format}' parser on {workers or os.cpu_count()} processes")
+
+        fieldnames = list(reader.fieldnames or [])
+        for key in PARSERS[parser_format][1]:
+            if key not in fieldnames:
+                fieldnames.append(key)
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+        writer.writeheader()
+
+        total_rows = total_changed = 0
+        chunks = itertools.chain([first_chunk] if first_chunk else [], chunked(reader, chunk_size))
+        # Pool.imap would read every chunk up front, so at most two chunks per
+        # worker are submitted at a time and results are written in input
+        # order as they arrive; memory stays bounded by the window, not the file
+        window = 2 * (workers or os.cpu_count() or 1)
+        pending = collections.deque()
+        with multiprocessing.Pool(workers) as pool:
+            for chunk in itertools.chain(chunks, [None]):
+                if chunk is not None:
+                    pending.append(pool.apply_async(reparse_chunk, (chunk, parser_format)))
+                while pending and (len(pending) >= window or chunk is None):
+                    rows, changed = pending.popleft().get()
+                    writer.writerows(rows)
+                    total_rows += len(rows)
+                    total_changed += changed
+
+    elapsed = time.time() - start_time
+    logger.info(f"Re-parsed {total_rows} rows in {elapsed:.2f} seconds: {total_changed} rows changed, "
+                f"saved to {output_filename}")
+    return total_rows, total_changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-derive scores and reasons from stored evaluation text (no LLM calls)")
+    parser.add_argument("input_files", nargs='+', help="Evaluation CSVs written by the evaluators or the prompt-check script")
+    parser.add_argument("--output", default=None,
+                        help="Output CSV (only with a single input; default <input>_reparsed.csv)")
+    parser.add_argument("--format", choices=['auto'] + list(PARSERS), default='auto',
+                        help="Response format; auto picks prompt-check or gemini from the columns and evaluator_model")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all CPU cores)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per task sent to a worker")
+    args = parser.parse_args()
+    if args.output and len(args.input_files) > 1:
+        parser.error("--output can only be used with a single input file")
+
+    for input_filename in args.input_files:
+        output_filename = args.output or f"{os.path.splitext(input_filename)[0]}_reparsed.csv"
+        reparse_file(input_filename, output_filename, args.format, args.workers, args.chunk_size)
+
+if __name__ == "__main__":
+    main()
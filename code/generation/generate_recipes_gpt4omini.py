@@ -1,10 +1,19 @@
 import openai
 import os
-import csv
+import asyncio
 import time
 import re
 import argparse
 from loguru import logger
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ash.rate_limiter import add_rate_limit_arguments, estimate_tokens, get_rate_limiter, is_rate_limit_error, retry_after_from_error
+from ash.clients import pooled_openai_aiosession, use_pooled_openai_session
+from ash.cache import add_cache_arguments, make_cache_key, open_cache
+from ash.checkpoint import CheckpointStore, add_checkpoint_argument, is_error_response, make_fingerprint, make_generation_key
+from ash.columnar import add_output_format_argument, save_recipes_parquet
+from ash.sinks import OrderedCSVWriter
+from ash.progress import add_progress_arguments, configure_logging, progress_from_args
 
 class RecipeGenerator:
     model_name = "gpt-4o-mini"
@@ -27,8 +36,17 @@ class RecipeGenerator:
         'Aztec', 'Medieval', 'Byzantine', 'Ottoman'
     ]
 
-    def __init__(self):
-        self.index = 1
+    fieldnames = ['index', 'model', 'original_dish', 'variation', 'generated_recipe', 'ingredients', 'instructions']
+    # In v0_recipes.csv gpt-4o-mini follows the five Ollama models (5 x 800 recipes)
+    first_index = 4001
+    params = {'temperature': 0.7, 'max_tokens': 1000}
+
+    def __init__(self, rate_limiter=None, cache=None, first_index=None, progress=None):
+        self.first_index = first_index or self.first_index
+        self.rate_limiter = rate_limiter or get_rate_limiter('openai')
+        self.cache = cache
+        self.progress = progress
+        use_pooled_openai_session()
         api_key_path = os.path.join(os.path.dirname(__file__), '../API_KEY', 'API_KEY_openai.txt')
         try:
             with open(api_key_path, 'r') as f:
@@ -37,8 +55,8 @@ class RecipeGenerator:
             logger.error(f"Error reading API key from {api_key_path}: {str(e)}")
             raise e
 
-    def generate_recipe(self, dish, variation):
-        prompt = f"""Can you apply the elements of {variation} cuisine to this dish and make it into a recipe?
+    def build_prompt(self, dish, variation):
+        return f"""Can you apply the elements of {variation} cuisine to this dish and make it into a recipe?
 Dish: {dish}
 The response should be in the following form for ingredients and instructions each. For example:
 ingredients: 
@@ -52,22 +70,59 @@ instructions:
 ...
 """
 
+    def _prepare(self, dish, variation):
+        # The prompt, its cache key and the cached recipe (None on a miss)
+        prompt = self.build_prompt(dish, variation)
+        cache_key = make_cache_key('openai', self.model_name, prompt, self.params)
+        cached = self.cache.get(cache_key) if self.cache else None
+        return prompt, cache_key, cached
+
+    def _request(self, prompt):
+        return dict(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that creates recipes."},
+                {"role": "user", "content": prompt}
+            ],
+            **self.params,
+        )
+
+    def _finish(self, dish, variation, cache_key, result_text):
+        self.rate_limiter.report_success()
+        logger.debug(f"Generated recipe for '{dish}' with variation: '{variation}'")
+        if self.cache:
+            self.cache.put(cache_key, result_text)
+        return result_text
+
+    def _failed(self, dish, variation, error):
+        if is_rate_limit_error(error):
+            self.rate_limiter.report_rate_limited(retry_after_from_error(error))
+        logger.error(f"Error generating recipe for '{dish}' with variation '{variation}': {str(error)}")
+        return f"Error: {str(error)}"
+
+    def generate_recipe(self, dish, variation):
+        prompt, cache_key, cached = self._prepare(dish, variation)
+        if cached is not None:
+            return cached
+        self.rate_limiter.acquire(estimate_tokens(prompt))
         try:
-            response = openai.ChatCompletion.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that creates recipes."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000,
-            )
+            response = openai.ChatCompletion.create(**self._request(prompt))
             result_text = response['choices'][0]['message']['content']
-            logger.info(f"Generated recipe for '{dish}' with variation: '{variation}'")
-            return result_text
         except Exception as e:
-            logger.error(f"Error generating recipe for '{dish}' with variation '{variation}': {str(e)}")
-            return f"Error: {str(e)}"
+            return self._failed(dish, variation, e)
+        return self._finish(dish, variation, cache_key, result_text)
+
+    async def generate_recipe_async(self, dish, variation):
+        prompt, cache_key, cached = self._prepare(dish, variation)
+        if cached is not None:
+            return cached
+        await self.rate_limiter.acquire_async(estimate_tokens(prompt))
+        try:
+            response = await openai.ChatCompletion.acreate(**self._request(prompt))
+            result_text = response['choices'][0]['message']['content']
+        except Exception as e:
+            return self._failed(dish, variation, e)
+        return self._finish(dish, variation, cache_key, result_text)
 
     def extract_ingredients_instructions(self, result):
         ingredients_match = re.search(r'ingredients:\s*{(.*?)}', result, re.IGNORECASE | re.DOTALL)
@@ -84,44 +139,127 @@ instructions:
 
         return ingredients, instructions
 
-    def generate_recipes(self):
-        results = []
+    def tasks(self):
+        # (index, dish, variation) in the original serial order, so a recipe's
+        # index doesn't depend on concurrency or on restarts
+        index = self.first_index
         for dish in self.dishes:
             for variation in self.variations:
+                yield index, dish, variation
+                index += 1
+
+    def build_row(self, index, dish, variation, generated_recipe):
+        ingredients, instructions = self.extract_ingredients_instructions(generated_recipe)
+        return {
+            'index': index,
+            'model': self.model_name,
+            'original_dish': dish,
+            'variation': variation,
+            'generated_recipe': generated_recipe,
+            'ingredients': ingredients,
+            'instructions': instructions
+        }
+
+    def start_progress(self):
+        if self.progress:
+            self.progress.add_work(self.model_name, sum(1 for _ in self.tasks()))
+            self.progress.start()
+
+    def generate_recipes(self, checkpoint=None, writer=None):
+        self.start_progress()
+        results = []
+        for position, (index, dish, variation) in enumerate(self.tasks()):
+            key = make_generation_key(self.model_name, dish, variation)
+            if checkpoint and key in checkpoint:
+                row = checkpoint.get(key)
+            else:
                 generated_recipe = self.generate_recipe(dish, variation)
-                ingredients, instructions = self.extract_ingredients_instructions(generated_recipe)
-
-                results.append({
-                    'index': self.index,
-                    'model': self.model_name,
-                    'original_dish': dish,
-                    'variation': variation,
-                    'generated_recipe': generated_recipe,
-                    'ingredients': ingredients,
-                    'instructions': instructions
-                })
-                self.index += 1
-                time.sleep(1)  # To avoid rate limiting
+                row = self.build_row(index, dish, variation, generated_recipe)
+                if checkpoint:
+                    checkpoint.record(key, row, ok=not is_error_response(generated_recipe))
+            if writer:
+                writer.add(position, row)
+            if self.progress:
+                self.progress.advance(self.model_name, failed=is_error_response(row['generated_recipe']))
+            results.append(row)
         return results
 
-    def save_to_csv(self, results, filename='generated_recipes_gpt4omini.csv'):
-        fieldnames = ['index', 'model', 'original_dish', 'variation', 'generated_recipe', 'ingredients', 'instructions']
-        with open(filename, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in results:
-                writer.writerow(row)
-        logger.info(f"Results saved to {filename}")
+    async def generate_recipes_async(self, concurrency, checkpoint=None, writer=None):
+        semaphore = asyncio.Semaphore(concurrency)
+        self.start_progress()
+        logger.info(f"Generating recipes with up to {concurrency} concurrent requests")
+
+        async def generate(position, index, dish, variation):
+            key = make_generation_key(self.model_name, dish, variation)
+            if checkpoint and key in checkpoint:
+                row = checkpoint.get(key)
+            else:
+                async with semaphore:
+                    generated_recipe = await self.generate_recipe_async(dish, variation)
+                row = self.build_row(index, dish, variation, generated_recipe)
+                if checkpoint:
+                    checkpoint.record(key, row, ok=not is_error_response(generated_recipe))
+            if writer:
+                writer.add(position, row)
+            if self.progress:
+                self.progress.advance(self.model_name, failed=is_error_response(row['generated_recipe']))
+            return row
+
+        async with pooled_openai_aiosession(concurrency):
+            return list(await asyncio.gather(*(generate(position, *task) for position, task in enumerate(self.tasks()))))
 
 def main():
     parser = argparse.ArgumentParser(description="Generate recipes with cultural, religious, and historical variations using OpenAI API")
+    parser.add_argument("--output", default="generated_recipes_gpt4omini.csv",
+                        help="Output CSV, written in index order as recipes complete")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Number of in-flight requests; 1 uses the synchronous loop")
+    parser.add_argument("--first-index", type=int, default=RecipeGenerator.first_index,
+                        help="Index of the first recipe (4001 matches v0_recipes.csv and the human annotation files)")
+    parser.add_argument("--api-base", default=None,
+                        help="Override the OpenAI API base URL (e.g. a local stand-in server)")
+    add_output_format_argument(parser)
+    add_rate_limit_arguments(parser)
+    add_cache_arguments(parser)
+    # The checkpoint and status files default to <output>.checkpoint.jsonl and
+    # <output>.status.json, so runs with different outputs never share them
+    add_checkpoint_argument(parser, None)
+    add_progress_arguments(parser, None)
     args = parser.parse_args()
+    stem = os.path.splitext(args.output)[0]
+    if args.checkpoint is None:
+        args.checkpoint = f'{stem}.checkpoint.jsonl'
+    if args.status_file is None:
+        args.status_file = f'{stem}.status.json'
+    configure_logging(args)
+
+    if args.api_base:
+        openai.api_base = args.api_base
 
     start_time = time.time()
 
-    generator = RecipeGenerator()
-    results = generator.generate_recipes()
-    generator.save_to_csv(results)
+    cache = open_cache(args)
+    generator = RecipeGenerator(rate_limiter=get_rate_limiter('openai', args.rpm, args.tpm), cache=cache,
+                                first_index=args.first_index,
+                                progress=progress_from_args(args, [RecipeGenerator.model_name], 'recipe generation'))
+    # Rows are only resumed from a checkpoint written with the same prompt
+    checkpoint = (CheckpointStore(args.checkpoint, make_fingerprint(generator.build_prompt("{dish}", "{variation}")))
+                  if args.checkpoint else None)
+    writer = OrderedCSVWriter(args.output, generator.fieldnames)
+    if args.concurrency > 1:
+        results = asyncio.run(generator.generate_recipes_async(args.concurrency, checkpoint, writer))
+    else:
+        results = generator.generate_recipes(checkpoint, writer)
+    if generator.progress:
+        generator.progress.close()
+    writer.close()
+    if args.output_format == 'parquet':
+        save_recipes_parquet(results, os.path.splitext(args.output)[0])
+    if cache:
+        logger.info(cache.stats())
+        cache.close()
+    if checkpoint:
+        checkpoint.close()
 
     end_time = time.time()
     total_time = end_time - start_time
@@ -1,10 +1,18 @@
-import csv
+import asyncio
 import time
 import argparse
-from langchain_community.chat_models import ChatOllama
 from loguru import logger
 import re
 import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ash.rate_limiter import add_rate_limit_arguments, estimate_tokens, get_rate_limiter
+from ash.clients import get_client
+from ash.cache import add_cache_arguments, make_cache_key, open_cache
+from ash.checkpoint import CheckpointStore, add_checkpoint_argument, is_error_response, make_fingerprint, make_generation_key
+from ash.columnar import add_output_format_argument, save_recipes_parquet
+from ash.sinks import OrderedCSVWriter
+from ash.progress import add_progress_arguments, configure_logging, progress_from_args
 
 class RecipeGenerator:
     # model_names = ["gemma2:2b", "gemma2:9b", "mistral:7b", "llama2:13b", "llama3.1:8b", "gpt-4o-mini"]
@@ -25,12 +33,15 @@ class RecipeGenerator:
         'Aztec', 'Medieval', 'Byzantine', 'Ottoman'
     ]
 
-    def __init__(self):
-        self.index = 1
+    fieldnames = ['index', 'model', 'original_dish', 'variation', 'generated_recipe', 'ingredients', 'instructions']
 
-    def generate_recipe(self, model_name, dish, variation):
-        llm = ChatOllama(model=model_name)
-        prompt = f"""Can you apply the elements of {variation} cuisine to this dish and make it into a recipe?
+    def __init__(self, rate_limiter=None, cache=None, progress=None):
+        self.rate_limiter = rate_limiter or get_rate_limiter('ollama')
+        self.cache = cache
+        self.progress = progress
+
+    def build_prompt(self, dish, variation):
+        return f"""Can you apply the elements of {variation} cuisine to this dish and make it into a recipe?
 Dish: {dish}
 The response should be in the following form for ingredients and instructions each. For example:
 ingredients: 
@@ -43,18 +54,47 @@ instructions:
 2. <<instruction2>>
 ...
 """
-        
+
+    def _prepare(self, model_name, dish, variation):
+        # The prompt, its cache key and the cached recipe (None on a miss)
+        prompt = self.build_prompt(dish, variation)
+        cache_key = make_cache_key('ollama', model_name, prompt)
+        cached = self.cache.get(cache_key) if self.cache else None
+        return prompt, cache_key, cached
+
+    def _finish(self, model_name, dish, variation, cache_key, result_text):
+        result_text = result_text.strip()
+        logger.debug(f"Generated recipe for {dish} with {model_name} and variation: {variation}")
+        if self.cache:
+            self.cache.put(cache_key, result_text)
+        return result_text
+
+    def _failed(self, model_name, dish, error):
+        logger.error(f"Error generating recipe for {dish} with {model_name}: {str(error)}")
+        return f"Error: {str(error)}"
+
+    def generate_recipe(self, model_name, dish, variation):
+        prompt, cache_key, cached = self._prepare(model_name, dish, variation)
+        if cached is not None:
+            return cached
+        self.rate_limiter.acquire(estimate_tokens(prompt))
+        try:
+            result_text = get_client('ollama', model_name).invoke(prompt)
+        except Exception as e:
+            return self._failed(model_name, dish, e)
+        return self._finish(model_name, dish, variation, cache_key, result_text)
+
+    async def generate_recipe_async(self, model_name, dish, variation):
+        prompt, cache_key, cached = self._prepare(model_name, dish, variation)
+        if cached is not None:
+            return cached
+        await self.rate_limiter.acquire_async(estimate_tokens(prompt))
         try:
-            result = llm.invoke(prompt)
-            result_text = result.text if hasattr(result, 'text') else str(result)
-            result_text = re.sub(r'^content=', '', result_text)
-            result_text = re.sub(r'response_metadata.*$', '', result_text, flags=re.DOTALL)
-            result_text = result_text.strip()
-            logger.info(f"Generated recipe for {dish} with {model_name} and variation: {variation}")
-            return result_text
+            # The Ollama client is blocking; its pooled session is safe to share across threads
+            result_text = await asyncio.to_thread(get_client('ollama', model_name).invoke, prompt)
         except Exception as e:
-            logger.error(f"Error generating recipe for {dish} with {model_name}: {str(e)}")
-            return f"Error: {str(e)}"
+            return self._failed(model_name, dish, e)
+        return self._finish(model_name, dish, variation, cache_key, result_text)
 
     def extract_ingredients_instructions(self, result):
         ingredients_match = re.search(r'ingredients:\s*{(.*?)}', result, re.IGNORECASE | re.DOTALL)
@@ -68,45 +108,120 @@ instructions:
         
         return ingredients, instructions
 
-    def generate_recipes(self):
-        results = []
+    def tasks(self):
+        # (index, model, dish, variation) in the original serial order, so a
+        # recipe's index doesn't depend on concurrency or on restarts
+        index = 1
         for model in self.model_names:
             for dish in self.dishes:
                 for variation in self.variations:
-                    generated_recipe = self.generate_recipe(model, dish, variation)
-                    ingredients, instructions = self.extract_ingredients_instructions(generated_recipe)
-                    
-                    results.append({
-                        'index': self.index,
-                        'model': model,
-                        'original_dish': dish,
-                        'variation': variation,
-                        'generated_recipe': generated_recipe,
-                        'ingredients': ingredients,
-                        'instructions': instructions
-                    })
-                    self.index += 1
-                    time.sleep(1)  # To avoid rate limiting
+                    yield index, model, dish, variation
+                    index += 1
+
+    def build_row(self, index, model, dish, variation, generated_recipe):
+        ingredients, instructions = self.extract_ingredients_instructions(generated_recipe)
+        return {
+            'index': index,
+            'model': model,
+            'original_dish': dish,
+            'variation': variation,
+            'generated_recipe': generated_recipe,
+            'ingredients': ingredients,
+            'instructions': instructions
+        }
+
+    def start_progress(self):
+        if self.progress:
+            for _, model, _, _ in self.tasks():
+                self.progress.add_work(model, 1)
+            self.progress.start()
+
+    def generate_recipes(self, checkpoint=None, writer=None):
+        self.start_progress()
+        results = []
+        for position, (index, model, dish, variation) in enumerate(self.tasks()):
+            key = make_generation_key(model, dish, variation)
+            if checkpoint and key in checkpoint:
+                row = checkpoint.get(key)
+            else:
+                generated_recipe = self.generate_recipe(model, dish, variation)
+                row = self.build_row(index, model, dish, variation, generated_recipe)
+                if checkpoint:
+                    checkpoint.record(key, row, ok=not is_error_response(generated_recipe))
+            if writer:
+                writer.add(position, row)
+            if self.progress:
+                self.progress.advance(model, failed=is_error_response(row['generated_recipe']))
+            results.append(row)
         return results
 
-    def save_to_csv(self, results, filename='generated_recipes.csv'):
-        fieldnames = ['index', 'model', 'original_dish', 'variation', 'generated_recipe', 'ingredients', 'instructions']
-        with open(filename, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in results:
-                writer.writerow(row)
-        logger.info(f"Results saved to {filename}")
+    async def generate_recipes_async(self, concurrency, checkpoint=None, writer=None):
+        semaphore = asyncio.Semaphore(concurrency)
+        self.start_progress()
+        logger.info(f"Generating recipes with up to {concurrency} concurrent requests")
+
+        async def generate(position, index, model, dish, variation):
+            key = make_generation_key(model, dish, variation)
+            if checkpoint and key in checkpoint:
+                row = checkpoint.get(key)
+            else:
+                async with semaphore:
+                    generated_recipe = await self.generate_recipe_async(model, dish, variation)
+                row = self.build_row(index, model, dish, variation, generated_recipe)
+                if checkpoint:
+                    checkpoint.record(key, row, ok=not is_error_response(generated_recipe))
+            if writer:
+                writer.add(position, row)
+            if self.progress:
+                self.progress.advance(model, failed=is_error_response(row['generated_recipe']))
+            return row
+
+        # Tasks are queued model by model, so Ollama rarely has to swap models
+        return list(await asyncio.gather(*(generate(position, *task) for position, task in enumerate(self.tasks()))))
 
 def main():
     parser = argparse.ArgumentParser(description="Generate recipes with cultural and religious variations")
+    parser.add_argument("--output", default="generated_recipes.csv", help="Output CSV, written in index order as recipes complete")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Number of in-flight requests; match the server's OLLAMA_NUM_PARALLEL")
+    add_output_format_argument(parser)
+    add_rate_limit_arguments(parser)
+    add_cache_arguments(parser)
+    # The checkpoint and status files default to <output>.checkpoint.jsonl and
+    # <output>.status.json, so runs with different outputs never share them
+    add_checkpoint_argument(parser, None)
+    add_progress_arguments(parser, None)
     args = parser.parse_args()
+    stem = os.path.splitext(args.output)[0]
+    if args.checkpoint is None:
+        args.checkpoint = f'{stem}.checkpoint.jsonl'
+    if args.status_file is None:
+        args.status_file = f'{stem}.status.json'
+    configure_logging(args)
 
     start_time = time.time()
 
-    generator = RecipeGenerator()
-    results = generator.generate_recipes()
-    generator.save_to_csv(results)
+    cache = open_cache(args)
+    generator = RecipeGenerator(rate_limiter=get_rate_limiter('ollama', args.rpm, args.tpm), cache=cache,
+                                progress=progress_from_args(args, RecipeGenerator.model_names, 'recipe generation'))
+    # Rows are only resumed from a checkpoint written with the same prompt
+    checkpoint = (CheckpointStore(args.checkpoint, make_fingerprint(generator.build_prompt("{dish}", "{variation}")))
+                  if args.checkpoint else None)
+    writer = OrderedCSVWriter(args.output, generator.fieldnames)
+    if args.concurrency > 1:
+        results = asyncio.run(generator.generate_recipes_async(args.concurrency, checkpoint, writer))
+    else:
+        results = generator.generate_recipes(checkpoint, writer)
+    if generator.progress:
+        generator.progress.close()
+    writer.close()
+    if args.output_format == 'parquet':
+        save_recipes_parquet(results, os.path.splitext(args.output)[0])
+    if cache:
+        logger.info(cache.stats())
+        cache.close()
+    if checkpoint:
+        checkpoint.close()
 
     end_time = time.time()
     total_time = end_time - start_time
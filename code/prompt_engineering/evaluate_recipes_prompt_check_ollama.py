@@ -1,16 +1,31 @@
+import argparse
 import csv
 import time
 import random
 import os
 import logging
-import concurrent.futures
-import torch
+import itertools
 import multiprocessing
-from functools import partial
 from datetime import timedelta
-from langchain_ollama import ChatOllama
 from loguru import logger
-import re
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ash.rate_limiter import estimate_tokens, get_rate_limiter
+from ash.clients import DEFAULT_OLLAMA_URL, get_client
+from ash.cache import add_cache_arguments, make_cache_key, open_cache
+from ash.checkpoint import is_error_response, make_key
+from ash.scheduling import ModelSwitchCounter
+from ash.recipes import add_input_arguments, open_recipes
+from ash import parsing
+from ash.columnar import add_output_format_argument, csv_to_parquet
+from ash.sinks import QueuedCSVWriter
+from ash.external_sort import sort_csv
+from ash.retry import DeadLetterLog, Failure, RetryPolicy, add_retry_arguments, retry_policy_from_args
+from ash.progress import Progress, add_progress_arguments, configure_logging
+from ash.metrics import (METRIC_FIELDNAMES, add_metrics_argument, call_metrics, create_metrics_file, log_report,
+                         parsed_ok, read_metrics)
+from ash.agreement import load_evaluations
+from ash.halving import add_halving_arguments, arm_errors, halving_from_args
 
 # Set up logging
 logging.basicConfig(level=logging.INFO,
@@ -233,8 +248,17 @@ Summarize with scores and detailed reasoning:
 AUTHENTICITY: [rating]\nReason: [reason]\nSENSITIVITY: [rating]\nReason: [reason]\nHARMONY: [rating]\nReason: [reason]\nREFLECTION: [reflection]"""
     }
 
-    def __init__(self, output_filename='evaluated_recipes.csv'):
+    def __init__(self, output_filename='evaluated_recipes.csv', rate_limiter=None, cache=None, retry=None,
+                 dead_letter=None, metrics_filename=None, progress=None):
         self.output_filename = output_filename
+        self.rate_limiter = rate_limiter or get_rate_limiter('ollama')
+        self.cache = cache
+        self.retry = retry or RetryPolicy()
+        # Only the main process writes the dead-letter file; workers report failures in their stats
+        self.dead_letter = dead_letter
+        self.metrics_filename = metrics_filename
+        # Shared-memory counters, updated directly by the worker processes
+        self.progress = progress
         self.fieldnames = [
             'index', 'model', 'original_dish', 'variation', 'generated_recipe',
             'prompt_index', 'evaluator_model', 'evaluation', 'authenticity_score', 'authenticity_reason',
@@ -245,14 +269,9 @@ AUTHENTICITY: [rating]\nReason: [reason]\nSENSITIVITY: [rating]\nReason: [reason
                 writer = csv.DictWriter(file, fieldnames=self.fieldnames)
                 writer.writeheader()
 
-        # Get available GPU count
-        self.num_gpus = torch.cuda.device_count()
-        logger.info(f"Found {self.num_gpus} GPUs")
-
-    def evaluate_recipe(self, model_name, original_dish, variation, generated_recipe, prompt_index, gpu_id):
-        # Configure Ollama to use specific GPU
-        os.environ["CUDA_VISIBLE_DEVICES"] = str(gpu_id)
-        llm = ChatOllama(model=model_name)
+    def evaluate_recipe(self, model_name, original_dish, variation, generated_recipe, prompt_index, worker_id, endpoint=None,
+                        stats=None):
+        llm = get_client('ollama', model_name, endpoint)
         
         prompt = self.prompts[prompt_index].format(
             original_dish=original_dish, 
@@ -260,171 +279,112 @@ AUTHENTICITY: [rating]\nReason: [reason]\nSENSITIVITY: [rating]\nReason: [reason
             generated_recipe=generated_recipe
         )
 
-        try:
-            result = llm.invoke(prompt)
-            result_text = result.content if isinstance(result, dict) else (result.text if hasattr(result, 'text') else str(result))
-            logger.info(f"GPU {gpu_id}: Evaluated recipe for {original_dish} with {model_name}")
+        cache_key = make_cache_key('ollama', model_name, prompt)
+        cached = self.cache.get(cache_key) if self.cache else None
+        if cached is not None:
+            return cached
+        result_text = self.retry.call(lambda: llm.invoke(prompt), self.rate_limiter, estimate_tokens(prompt),
+                                      describe=f"Worker {worker_id}: {original_dish} with {model_name}", stats=stats)
+        if isinstance(result_text, Failure):
+            logger.error(f"Worker {worker_id}: {result_text.category} error evaluating recipe for {original_dish} "
+                         f"with {model_name} after {result_text.attempts} attempts: {result_text.error}")
             return result_text
-        except Exception as e:
-            logger.error(f"GPU {gpu_id}: Error evaluating recipe for {original_dish} with {model_name}: {str(e)}")
-            return f"Error: {str(e)}"
+        logger.debug(f"Worker {worker_id}: Evaluated recipe for {original_dish} with {model_name}")
+        if self.cache:
+            self.cache.put(cache_key, result_text)
+        return result_text
         
     def sort_results(self, filename):
-        # Read the CSV file
-        with open(filename, 'r', newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            rows = list(reader)
-        
-        # Sort rows by index, prompt_index, and evaluator_model
-        sorted_rows = sorted(rows, key=lambda x: (
-            int(x['index']),
-            int(x['prompt_index']), 
-            self.model_names.index(x['evaluator_model'])
-        ))
-        
-        # Write back to the file
-        with open(filename, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=self.fieldnames)
-            writer.writeheader()
-            writer.writerows(sorted_rows)
-        
-        logger.info(f"Results sorted and saved to {filename}")
+        # Sort by index, prompt_index and evaluator_model with an external
+        # merge sort, so memory stays bounded however large the output grows.
+        # Model ranks are looked up once instead of via list.index per row.
+        model_order = {model_name: position for position, model_name in enumerate(self.model_names)}
+
+        def sort_key(row):
+            return (int(row['index']), int(row['prompt_index']),
+                    model_order.get(row['evaluator_model'], len(model_order)), row['evaluator_model'])
+
+        # Keep one row per (index, prompt_index, evaluator_model): a successful
+        # retry from a resumed run replaces the failed attempt it re-ran.
+        # Duplicates are adjacent after the (stable) sort, in file order.
+        def latest_rows(rows):
+            for _, duplicates in itertools.groupby(rows, key=sort_key):
+                latest = None
+                for row in duplicates:
+                    if latest is None or not is_error_response(row['evaluation']) or is_error_response(latest['evaluation']):
+                        latest = row
+                yield latest
+
+        runs = sort_csv(filename, self.fieldnames, sort_key, reduce=latest_rows)
+        logger.info(f"Results sorted and saved to {filename}" + (f" (merged {runs} runs)" if runs else ""))
 
     def parse_evaluation(self, evaluation):
-        if not evaluation or isinstance(evaluation, float):
-            return {key: None for key in ['authenticity_score', 'authenticity_reason', 
-                                        'sensitivity_score', 'sensitivity_reason', 
-                                        'harmony_score', 'harmony_reason', 'reflection']}
-        
         try:
-            # Extract only the content part from LLM response
-            if "content=" in evaluation:
-                evaluation = evaluation.split("content=")[1].split(" additional_kwargs=")[0].strip('"')
-            
-            # Clean up markdown formatting and escaped quotes
-            evaluation = evaluation.replace('\\"', '"').replace('\\n', '\n')
-            
-            patterns = [
-                # Patterns for AUTHENTICITY
-                (r'\*\*AUTHENTICITY:\*\*\s*(\d+)', 'authenticity_score'),  # Bold format
-                (r'AUTHENTICITY:\s*(\d+)', 'authenticity_score'),          # Plain text
-                (r'\*\*AUTHENTICITY:?\*\*.*?\*\*Reason:\*\*\s*(.*?)(?=\n*\*\*SENSITIVITY\*\*|\n*SENSITIVITY:|$)', 'authenticity_reason'),
-                (r'AUTHENTICITY:.*?Reason:\s*(.*?)(?=\n*SENSITIVITY|$)', 'authenticity_reason'),
-                
-                # Patterns for SENSITIVITY
-                (r'\*\*SENSITIVITY:\*\*\s*(\d+)', 'sensitivity_score'),    # Bold format
-                (r'SENSITIVITY:\s*(\d+)', 'sensitivity_score'),            # Plain text
-                (r'\*\*SENSITIVITY:?\*\*.*?\*\*Reason:\*\*\s*(.*?)(?=\n*\*\*HARMONY\*\*|\n*HARMONY:|$)', 'sensitivity_reason'),
-                (r'SENSITIVITY:.*?Reason:\s*(.*?)(?=\n*HARMONY|$)', 'sensitivity_reason'),
-                
-                # Patterns for HARMONY
-                (r'\*\*HARMONY:\*\*\s*(\d+)', 'harmony_score'),           # Bold format
-                (r'HARMONY:\s*(\d+)', 'harmony_score'),                   # Plain text
-                (r'\*\*HARMONY:?\*\*.*?\*\*Reason:\*\*\s*(.*?)(?=\n*\*\*REFLECTION\*\*|\n*REFLECTION:|$)', 'harmony_reason'),
-                (r'HARMONY:.*?Reason:\s*(.*?)(?=\n*REFLECTION|\n\n|$)', 'harmony_reason'),
-                
-                # Pattern for REFLECTION
-                (r'\*\*REFLECTION:?\*\*.*?\*\*Reason:\*\*\s*(.*?)(?=$)', 'reflection'),
-                (r'REFLECTION:.*?Reason:\s*(.*?)(?=$)', 'reflection')
-            ]
-
-            result = {}
-            for pattern, key in patterns:
-                match = re.search(pattern, evaluation, re.DOTALL | re.IGNORECASE)
-                if match:
-                    value = match.group(1).strip()
-                    # Convert scores to integers
-                    if '_score' in key:
-                        try:
-                            value = int(value)
-                            if not (1 <= value <= 5):
-                                value = None
-                        except (ValueError, TypeError):
-                            value = None
-                    # Clean up text for reasons and reflection
-                    elif '_reason' in key or key == 'reflection':
-                        # Remove markdown formatting, multiple newlines, and extra whitespace
-                        value = re.sub(r'\*\*|\n{2,}', ' ', value)
-                        value = ' '.join(value.split())
-                else:
-                    value = None
-                result[key] = value
-
-            return result
-            
+            return parsing.parse_prompt_check_evaluation(evaluation)
         except Exception as e:
             logger.error(f"Error parsing evaluation: {str(e)}")
             # Return all fields as None if parsing fails
-            return {key: None for key in ['authenticity_score', 'authenticity_reason', 
-                                        'sensitivity_score', 'sensitivity_reason', 
-                                        'harmony_score', 'harmony_reason', 'reflection']}
-
-    # def evaluate_recipes(self, input_filename):
-    #     start_time = time.time()
-    #     with open(input_filename, 'r', newline='', encoding='utf-8', errors='replace') as file:
-    #         reader = csv.DictReader(file)
-    #         for index, row in enumerate(reader, start=1):
-    #             elapsed_time = time.time() - start_time
-    #             elapsed_str = str(timedelta(seconds=int(elapsed_time)))
-    #             logger.info(f"Evaluating recipe {index}: {row['original_dish']} (Elapsed Time: {elapsed_str})")
-    #             for prompt_index, prompt in self.prompts.items():
-    #                 for model_name in self.model_names:
-    #                     evaluation = self.evaluate_recipe(
-    #                         model_name, 
-    #                         row['original_dish'], 
-    #                         row['variation'], 
-    #                         row['generated_recipe'], 
-    #                         prompt_index
-    #                     )
-    #                     parsed_evaluation = self.parse_evaluation(evaluation)
-
-    #                     new_row = {
-    #                         'index': row['index'],
-    #                         'model': row['model'],
-    #                         'original_dish': row['original_dish'],
-    #                         'variation': row['variation'],
-    #                         'generated_recipe': row['generated_recipe'],
-    #                         'prompt_index': prompt_index,
-    #                         'evaluator_model': model_name,
-    #                         'evaluation': evaluation,
-    #                         'authenticity_score': parsed_evaluation['authenticity_score'],
-    #                         'authenticity_reason': parsed_evaluation['authenticity_reason'],
-    #                         'sensitivity_score': parsed_evaluation['sensitivity_score'],
-    #                         'sensitivity_reason': parsed_evaluation['sensitivity_reason'],
-    #                         'harmony_score': parsed_evaluation['harmony_score'],
-    #                         'harmony_reason': parsed_evaluation['harmony_reason'],
-    #                         'reflection': parsed_evaluation.get('reflection', None)
-    #                     }
-
-    #                     self.save_partial_result(new_row)
-    #                     time.sleep(1)  # Rate limit avoidance
-    #     total_time = time.time() - start_time
-    #     total_time_str = str(timedelta(seconds=int(total_time)))
-    #     logger.info(f"Evaluation completed. Total time taken: {total_time_str}")
-
-    def process_batch(self, batch, gpu_id):
-        # Sort batch by index to maintain order
-        sorted_batch = sorted(batch, key=lambda x: (x[0], x[2], self.model_names.index(x[3])))
-        file_lock = multiprocessing.Lock()
+            return {key: None for key in parsing.PROMPT_CHECK_KEYS}
+
+    def process_queue(self, recipes, task_queue, result_queue, metrics_queue, stats_queue, worker_id, endpoint):
+        # Workers pull from one shared queue, so a worker stuck on slow prompts
+        # (e.g. prompt 8's self-reflection) no longer holds back the others.
+        # Results go to the single writer process through result_queue.
+        model_switches = ModelSwitchCounter()
         current_recipe_index = -1
-        
-        for index, row, prompt_index, model_name, total_recipes in sorted_batch:
+        start_time = time.time()
+        busy_time = 0.0
+        completed = 0
+        failures = []
+
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            index, prompt_index, model_name, total_recipes = task
+            task_start = time.time()
+            # Tasks only carry the row position; the recipe body is read here
+            row = recipes[index - 1]
+
             # Log when starting a new recipe
             if index != current_recipe_index:
                 current_recipe_index = index
-                elapsed_time = time.time() - time.time()  # Reset time for new recipe
-                elapsed_str = str(timedelta(seconds=int(elapsed_time)))
-                logger.info(f"GPU {gpu_id}: Processing Recipe {index}/{total_recipes}: {row['original_dish']} (Elapsed Time: {elapsed_str})")
-            
+                elapsed_str = str(timedelta(seconds=int(task_start - start_time)))
+                logger.debug(f"Worker {worker_id}: Processing Recipe {index}/{total_recipes}: {row['original_dish']} (Elapsed Time: {elapsed_str})")
+
+            model_switches.observe(model_name)
+            call_stats = {}
             evaluation = self.evaluate_recipe(
                 model_name,
                 row['original_dish'],
                 row['variation'],
                 row['generated_recipe'],
                 prompt_index,
-                gpu_id
+                worker_id,
+                endpoint,
+                call_stats
             )
-            parsed_evaluation = self.parse_evaluation(evaluation)
+            if self.progress:
+                self.progress.advance(model_name, failed=isinstance(evaluation, Failure))
+            parsed_evaluation = None if isinstance(evaluation, Failure) else self.parse_evaluation(evaluation)
+            if call_stats and metrics_queue is not None:
+                # Cache hits make no call and get no metrics row; Ollama reports
+                # no usage, so tokens are estimated from the text lengths
+                prompt_tokens = estimate_tokens(self.prompts[prompt_index]) + estimate_tokens(row['generated_recipe'])
+                metrics_queue.put(call_metrics(
+                    'ollama', model_name, call_stats['started'], call_stats['queue_wait'], call_stats['latency'],
+                    prompt_tokens, 0 if parsed_evaluation is None else estimate_tokens(evaluation),
+                    call_stats['attempts'] - 1, samples=0 if parsed_evaluation is None else 1,
+                    parsed=int(parsed_evaluation is not None and parsed_ok(parsed_evaluation)),
+                    outcome=evaluation.category if parsed_evaluation is None else 'ok',
+                    index=row['index'], prompt_index=prompt_index, tokens_estimated=True))
+            if isinstance(evaluation, Failure):
+                # No output row; the main process records it in the dead-letter file
+                failures.append((make_key(row['index'], model_name, prompt_index=prompt_index), evaluation,
+                                 {'evaluator_model': model_name, 'prompt_index': prompt_index,
+                                  'original_dish': row['original_dish'], 'variation': row['variation']}))
+                busy_time += time.time() - task_start
+                continue
             
             new_row = {
                 'index': row['index'],
@@ -444,47 +404,119 @@ AUTHENTICITY: [rating]\nReason: [reason]\nSENSITIVITY: [rating]\nReason: [reason
                 'reflection': parsed_evaluation.get('reflection', None)
             }
 
-            with file_lock:
-                self.save_partial_result(new_row)
+            result_queue.put(new_row)
 
             # Log completion of evaluation
-            logger.info(f"GPU {gpu_id}: Completed evaluation of {row['original_dish']} with {model_name} (Prompt {prompt_index})")
-            time.sleep(1)  # Rate limit avoidance
-
-    def evaluate_recipes(self, input_filename):
+            logger.debug(f"Worker {worker_id}: Completed evaluation of {row['original_dish']} with {model_name} (Prompt {prompt_index})")
+            busy_time += time.time() - task_start
+            completed += 1
+
+        if self.cache:
+            logger.info(f"Worker {worker_id}: {self.cache.stats()}")
+        stats_queue.put({
+            'worker_id': worker_id,
+            'endpoint': endpoint,
+            'tasks': completed,
+            'busy_time': busy_time,
+            'model_switches': model_switches.switches,
+            'failures': failures,
+        })
+        recipes.close()
+
+    def run_tasks(self, recipes, tasks, num_workers, endpoints):
+        start_time = time.time()
+        # Queue tasks model-major so workers share whichever model is resident in Ollama
+        model_order = {model_name: position for position, model_name in enumerate(self.model_names)}
+        tasks.sort(key=lambda task: (model_order[task[2]], task[0], task[1]))
+
+        task_queue = multiprocessing.Queue()
+        stats_queue = multiprocessing.Queue()
+        if self.progress:
+            for task in tasks:
+                self.progress.add_work(task[2], 1)
+            if self.progress.started is None:
+                self.progress.start()
+        for task in tasks:
+            task_queue.put(task)
+        for _ in range(num_workers):
+            task_queue.put(None)  # One stop sentinel per worker
+
+        writer = QueuedCSVWriter(self.output_filename, self.fieldnames)
+        metrics_writer = None
+        if self.metrics_filename:
+            create_metrics_file(self.metrics_filename)
+            metrics_writer = QueuedCSVWriter(self.metrics_filename, METRIC_FIELDNAMES)
+        workers = [
+            multiprocessing.Process(
+                target=self.process_queue,
+                args=(recipes, task_queue, writer.queue, metrics_writer.queue if metrics_writer else None,
+                      stats_queue, worker_id, endpoints[worker_id % len(endpoints)])
+            )
+            for worker_id in range(num_workers)
+        ]
+        for worker in workers:
+            worker.start()
+        worker_stats = [stats_queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        writer.close()
+        if metrics_writer:
+            metrics_writer.close()
+        run_time = time.time() - start_time
+
+        for stats in sorted(worker_stats, key=lambda stats: stats['worker_id']):
+            utilization = stats['busy_time'] / run_time if run_time else 0.0
+            logger.info(f"Worker {stats['worker_id']} ({stats['endpoint']}): {stats['tasks']} tasks, "
+                        f"busy {stats['busy_time']:.1f}s of {run_time:.1f}s ({utilization:.0%} utilization), "
+                        f"{stats['model_switches']} model switches, {len(stats['failures'])} failed")
+        self.record_failures([failure for stats in worker_stats for failure in stats['failures']])
+        if self.metrics_filename:
+            log_report(read_metrics(self.metrics_filename, since=start_time), self.metrics_filename)
+
+    def record_failures(self, failures):
+        if failures:
+            logger.warning(f"{len(failures)} calls failed for good and have no output row")
+        if not self.dead_letter:
+            return
+        for key, failure, details in failures:
+            self.dead_letter.record(key, failure, **details)
+        # Calls that succeeded this time leave the dead-letter file
+        completed = self.load_completed_tasks()
+        for key in [key for key in self.dead_letter.failed if key in completed]:
+            self.dead_letter.resolve(key)
+        if self.dead_letter.failed:
+            logger.warning(f"{len(self.dead_letter.failed)} failed calls in {self.dead_letter.path} "
+                           f"({self.dead_letter.summary()}); rerun with --retry-failed to re-issue only those")
+
+    def evaluate_recipes(self, input_filename, num_workers=1, endpoints=None, input_args=None, retry_failed=False):
         start_time = time.time()
+        endpoints = endpoints or [DEFAULT_OLLAMA_URL]
         
-        # Read all recipes
-        with open(input_filename, 'r', newline='', encoding='utf-8', errors='replace') as file:
-            recipes = list(csv.DictReader(file))
+        # Recipes are streamed from the CSV by each worker; only the row count
+        # and the 'index' column (from the sidecar index) are needed here
+        recipes = open_recipes(input_filename, input_args, errors='replace')
+        recipe_ids = recipes.column('index')
         
         total_recipes = len(recipes)
-        logger.info(f"Starting evaluation of {total_recipes} recipes")
-        
-        # Create tasks and distribute across GPUs\
-
+        logger.info(f"Starting evaluation of {total_recipes} recipes with {num_workers} workers on {len(endpoints)} Ollama endpoints")
         
-        tasks = [(index, row, prompt_index, model_name, total_recipes) 
-                for index, row in enumerate(recipes, start=1)
+        tasks = [(index, prompt_index, model_name, total_recipes) 
+                for index in range(1, total_recipes + 1)
                 for prompt_index in self.prompts.keys()
                 for model_name in self.model_names]
 
-        # Distribute tasks across GPUs
-        batches = []
-        batch_size = len(tasks) // self.num_gpus
-        remaining = len(tasks) % self.num_gpus
-        
-        start_idx = 0
-        for i in range(self.num_gpus):
-            current_batch_size = batch_size + (1 if i < remaining else 0)
-            batch = tasks[start_idx:start_idx + current_batch_size]
-            batches.append(batch)
-            start_idx += current_batch_size
-        
-        # Process batches in parallel
-        with multiprocessing.Pool(processes=self.num_gpus) as pool:
-            process_batch_with_gpu = [(batch, gpu_id) for gpu_id, batch in enumerate(batches)]
-            pool.starmap(self.process_batch, process_batch_with_gpu)
+        # Resume: skip tasks whose result is already saved in the output file
+        completed = self.load_completed_tasks()
+        if completed:
+            tasks = [task for task in tasks
+                     if make_key(recipe_ids[task[0] - 1], task[2], prompt_index=task[1]) not in completed]
+            logger.info(f"Resuming: {len(completed)} evaluations already saved, {len(tasks)} remaining")
+        if retry_failed:
+            tasks = [task for task in tasks
+                     if make_key(recipe_ids[task[0] - 1], task[2], prompt_index=task[1]) in self.dead_letter.failed]
+            logger.info(f"Retrying {len(tasks)} failed calls from {self.dead_letter.path}")
+
+        self.run_tasks(recipes, tasks, num_workers, endpoints)
 
         # Sort results after all evaluations are complete
         self.sort_results(self.output_filename)
@@ -493,15 +525,124 @@ AUTHENTICITY: [rating]\nReason: [reason]\nSENSITIVITY: [rating]\nReason: [reason
         total_time_str = str(timedelta(seconds=int(total_time)))
         logger.info(f"Evaluation completed. Total time taken: {total_time_str}")
 
-    def save_partial_result(self, row):
-        with open(self.output_filename, 'a', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=self.fieldnames)
-            writer.writerow(row)
-        logger.info(f"Partial result saved for recipe: {row['original_dish']} ({row['evaluator_model']})")
+    def evaluate_recipes_halving(self, input_filename, halving, num_workers=1, endpoints=None, input_args=None):
+        # Successive halving: only the human-annotated recipes are evaluated,
+        # in growing rounds, and each round drops the arms that are clearly
+        # worse than the best one so far
+        start_time = time.time()
+        endpoints = endpoints or [DEFAULT_OLLAMA_URL]
+        recipes = open_recipes(input_filename, input_args, errors='replace')
+        recipe_ids = recipes.column('index')
+        human = halving.load_human()
+        annotated = set(human['index'])
+        positions = [position for position, recipe_id in enumerate(recipe_ids, start=1) if int(recipe_id) in annotated]
+        if not positions:
+            raise ValueError(f"None of the recipes in {input_filename} have {halving.reference} annotations")
+        random.Random(halving.seed).shuffle(positions)
+        arms = [(prompt_index, model_name) for prompt_index in self.prompts for model_name in self.model_names]
+        logger.info(f"Successive halving over {len(arms)} (prompt, model) arms on {len(positions)} "
+                    f"human-annotated recipes")
+
+        history = []
+        calls = 0
+        completed = self.load_completed_tasks()
+        for round_number, size in enumerate(halving.schedule(len(positions)), start=1):
+            subset = positions[:size]
+            tasks = [(position, prompt_index, model_name, len(recipes))
+                     for position in subset for prompt_index, model_name in arms
+                     if make_key(recipe_ids[position - 1], model_name, prompt_index=prompt_index) not in completed]
+            logger.info(f"Round {round_number}: {len(arms)} arms on {size} recipes, {len(tasks)} calls")
+            self.run_tasks(recipes, tasks, num_workers, endpoints)
+            calls += len(tasks)
+            completed = self.load_completed_tasks()
+
+            indexes = [int(recipe_ids[position - 1]) for position in subset]
+            matrix = arm_errors(load_evaluations([self.output_filename]), human, arms, indexes)
+            mse, lower, keep, best = halving.prune(matrix, halving.seed + round_number)
+            for arm, arm_mse, arm_lower, kept in zip(arms, mse, lower, keep):
+                history.append({'round': round_number, 'recipes': size, 'prompt_index': arm[0],
+                                'evaluator_model': arm[1], 'mse': arm_mse, 'difference_low': arm_lower,
+                                'kept': bool(kept)})
+            if best is not None:
+                logger.info(f"Round {round_number}: best so far is prompt {arms[best][0]} with {arms[best][1]} "
+                            f"(MSE {mse[best]:.3f}); {len(arms) - keep.sum()} arms dropped, {keep.sum()} remain")
+            arms = [arm for arm, kept in zip(arms, keep) if kept]
+            if len(arms) == 1:
+                break
 
-if __name__ == "__main__":
-    input_csv = "../v0_recipes.csv"
-    output_csv = "evaluated_recipes_full_4_5_6_7_8.csv"
+        self.sort_results(self.output_filename)
+        history_filename = f"{os.path.splitext(self.output_filename)[0]}.halving.csv"
+        with open(history_filename, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=list(history[0]))
+            writer.writeheader()
+            writer.writerows(history)
+
+        final = [row for row in history if row['round'] == history[-1]['round'] and row['kept']]
+        for rank, row in enumerate(sorted(final, key=lambda row: row['mse']), start=1):
+            logger.info(f"{rank}. Prompt {row['prompt_index']} with {row['evaluator_model']}: "
+                        f"MSE {row['mse']:.3f} on {row['recipes']} recipes")
+        full_calls = len(positions) * len(self.prompts) * len(self.model_names)
+        total_time_str = str(timedelta(seconds=int(time.time() - start_time)))
+        logger.info(f"Successive halving made {calls} of {full_calls} calls ({1 - calls / full_calls:.0%} saved) "
+                    f"in {total_time_str}; per-round MSEs saved to {history_filename}")
+
+    def load_completed_tasks(self):
+        completed = set()
+        with open(self.output_filename, 'r', newline='', encoding='utf-8', errors='replace') as file:
+            for row in csv.DictReader(file):
+                if not is_error_response(row['evaluation']):
+                    completed.add(make_key(row['index'], row['evaluator_model'], prompt_index=row['prompt_index']))
+        return completed
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate recipes with 8 prompt strategies and multiple evaluator models")
+    parser.add_argument("--input", default="../v0_recipes.csv", help="Input CSV file containing generated recipes")
+    parser.add_argument("--output", default="evaluated_recipes_full_4_5_6_7_8.csv", help="Output CSV file")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes pulling from the shared task queue")
+    parser.add_argument("--endpoints", default=DEFAULT_OLLAMA_URL,
+                        help="Comma-separated Ollama base URLs; workers are assigned round-robin")
+    add_input_arguments(parser)
+    add_output_format_argument(parser)
+    add_cache_arguments(parser)
+    add_halving_arguments(parser)
+    add_retry_arguments(parser, None)
+    add_metrics_argument(parser, None)
+    add_progress_arguments(parser, None)
+    args = parser.parse_args()
+    configure_logging(args)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.retry_failed and args.successive_halving:
+        parser.error("--retry-failed re-issues the failed calls of a full sweep; rerun --successive-halving to resume it")
+    if args.dead_letter is None:
+        args.dead_letter = f"{os.path.splitext(args.output)[0]}.failed.jsonl"
+    if args.metrics is None:
+        args.metrics = f"{os.path.splitext(args.output)[0]}.metrics.csv"
+    if args.status_file is None:
+        args.status_file = f"{os.path.splitext(args.output)[0]}.status.json"
+
+    dead_letter = DeadLetterLog(args.dead_letter) if args.dead_letter else None
+    if args.retry_failed and not dead_letter:
+        parser.error("--retry-failed needs a --dead-letter file")
+    evaluator = RecipeEvaluator(args.output, cache=open_cache(args), retry=retry_policy_from_args(args),
+                                dead_letter=dead_letter, metrics_filename=args.metrics)
+    if args.status_file:
+        evaluator.progress = Progress(args.status_file, evaluator.model_names, args.status_interval,
+                                      f"Prompt check of {args.input} into {args.output}")
+    halving = halving_from_args(args)
+    if halving:
+        evaluator.evaluate_recipes_halving(args.input, halving, args.workers, args.endpoints.split(','), args)
+    else:
+        evaluator.evaluate_recipes(args.input, args.workers, args.endpoints.split(','), args, args.retry_failed)
+    if evaluator.progress:
+        evaluator.progress.close()
+    if dead_letter:
+        dead_letter.close()
+    # Partial results are appended to the CSV as they arrive, so parquet is
+    # written from the final sorted CSV
+    if args.output_format == 'parquet':
+        csv_to_parquet(args.output)
 
-    evaluator = RecipeEvaluator(output_csv)
-    evaluator.evaluate_recipes(input_csv)
+if __name__ == "__main__":
+    main()
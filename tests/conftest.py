@@ -0,0 +1,54 @@
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+
+from ash import clients, mock_server  # noqa: E402
+from ash.engine import RECIPE_FIELDNAMES, SCORE_FIELDNAMES  # noqa: E402
+
+FIELDNAMES = ['index', 'model', 'evaluator_model', 'iteration', 'original_dish', 'variation', 'generated_recipe',
+              'ingredients', 'instructions'] + SCORE_FIELDNAMES
+DISHES = ['Fried Rice', 'Sandwich', 'Pasta', 'Stew', 'Pizza', 'Curry']
+VARIATIONS = ['Japanese', 'Kosher', 'Medieval']
+
+
+def write_recipes(path, count=6, recipe_text='ingredients:\nrice\ninstructions:\n1. cook'):
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=RECIPE_FIELDNAMES)
+        writer.writeheader()
+        for position in range(count):
+            writer.writerow({
+                'index': 101 + position,
+                'model': 'gemma2:9b',
+                'original_dish': DISHES[position % len(DISHES)],
+                'variation': VARIATIONS[position % len(VARIATIONS)],
+                'generated_recipe': f"{recipe_text} ({position})",
+                'ingredients': 'rice',
+                'instructions': 'cook',
+            })
+    return str(path)
+
+
+def read_rows(path):
+    with open(path, 'r', newline='', encoding='utf-8') as file:
+        return list(csv.DictReader(file))
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # The local stand-in for the OpenAI and Ollama endpoints; the Ollama
+    # backend is pointed at it through the client registry's default URL
+    server = mock_server.start_in_thread(storage_dir=str(tmp_path / 'mock-storage'), batch_seconds=0)
+    monkeypatch.setattr(clients, 'DEFAULT_OLLAMA_URL', server.url)
+    monkeypatch.setattr(clients, '_registry', None)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def recipes(tmp_path):
+    return write_recipes(tmp_path / 'recipes.csv')
@@ -0,0 +1,74 @@
+import glob
+import os
+
+import pytest
+
+from ash import batch
+from ash.engine import PROMPT, EvaluationEngine, OllamaBackend
+from ash.mock_server import canned_response
+
+MODELS = ['gpt-4o', 'gpt-4o-mini']
+ITERATIONS = [1, 2, 3]
+
+
+class BatchBackend(OllamaBackend):
+    # Sends its batches to the stand-in server's files and batches endpoints
+    provider = 'openai'
+    max_samples = 8
+
+    def __init__(self, url):
+        self.url = url
+
+    def batch_client(self):
+        return batch.BatchClient('test-key', f"{self.url}/v1")
+
+
+class Slice:
+    # The --start/--stop/--filter arguments of open_recipes
+    def __init__(self, start=None, stop=None):
+        self.start, self.stop, self.filter = start, stop, []
+
+
+def submitted_batches(server):
+    return glob.glob(os.path.join(server.storage_dir, 'batch_mock_*.json'))
+
+
+def test_custom_id_round_trip():
+    custom_id = batch.make_custom_id(42, 'gpt-4o', [1, 2, 3])
+    assert batch.parse_custom_id(custom_id) == [('42', 'gpt-4o', '1'), ('42', 'gpt-4o', '2'), ('42', 'gpt-4o', '3')]
+    assert batch.parse_custom_id(batch.make_custom_id(7, 'gpt-4o', [None])) == [('7', 'gpt-4o', '')]
+
+
+def test_batch_resumes_after_a_crash_between_download_and_merge(server, recipes, tmp_path):
+    prefix = str(tmp_path / 'out.batch')
+    engine = EvaluationEngine(BatchBackend(server.url), MODELS, iterations=ITERATIONS, samples_per_request=3)
+
+    build_result_row = engine.build_result_row
+
+    def crash(*args):
+        raise RuntimeError('killed while merging')
+
+    engine.build_result_row = crash
+    with pytest.raises(RuntimeError):
+        engine.run_batch(recipes, prefix, poll_interval=0.01)
+    # The batch was downloaded but nothing was saved, so its state must survive
+    assert os.path.exists(f"{prefix}.json")
+    assert len(submitted_batches(server)) == 1
+
+    # Resume over a different slice of the input: results are matched by
+    # (index, evaluator model, iteration), not by output position
+    engine.build_result_row = build_result_row
+    results = engine.run_batch(recipes, prefix, input_args=Slice(start=2), poll_interval=0.01)
+    assert len(submitted_batches(server)) == 1
+    assert len(results) == 4 * len(MODELS) * len(ITERATIONS)
+    assert [(row['index'], row['evaluator_model'], row['iteration']) for row in results] == [
+        (str(101 + position), model, iteration)
+        for position in range(2, 6) for model in MODELS for iteration in ITERATIONS]
+    for row in results:
+        samples = [canned_response(PROMPT.format(**row), choice) for choice in range(len(ITERATIONS))]
+        assert row['evaluation'] == samples[row['iteration'] - 1]
+
+    # run_evaluator clears the state once the output is saved
+    assert os.path.exists(f"{prefix}.json")
+    batch.clear_state(prefix)
+    assert not os.path.exists(f"{prefix}.json")
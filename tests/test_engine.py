@@ -0,0 +1,82 @@
+import json
+import os
+
+import pytest
+
+from conftest import FIELDNAMES, read_rows, write_recipes
+
+from ash.checkpoint import CheckpointStore, make_fingerprint
+from ash.engine import PROMPT, EvaluationEngine, OllamaBackend
+from ash.mock_server import canned_response
+from ash.sinks import OrderedCSVWriter
+
+MODELS = ['gemma2:9b', 'llama3.1:8b']
+ITERATIONS = [1, 2, 3]
+
+
+def evaluate(recipes, output, concurrency=1, checkpoint=None):
+    engine = EvaluationEngine(OllamaBackend(), MODELS, iterations=ITERATIONS)
+    writer = OrderedCSVWriter(output, FIELDNAMES)
+    engine.run(recipes, checkpoint, writer=writer, concurrency=concurrency)
+    writer.close()
+    return read_rows(output)
+
+
+@pytest.mark.parametrize('concurrency', [1, 4, 16])
+def test_output_order_does_not_depend_on_concurrency(server, recipes, tmp_path, concurrency):
+    rows = evaluate(recipes, str(tmp_path / f'out-{concurrency}.csv'), concurrency)
+
+    # (index, evaluator model, iteration) order, as the serial evaluators wrote it
+    expected = [(model, str(101 + position), str(iteration))
+                for position in range(6) for model in MODELS for iteration in ITERATIONS]
+    assert [(row['evaluator_model'], row['index'], row['iteration']) for row in rows] == expected
+    assert server.request_count == len(expected)
+    for row in rows:
+        assert row['evaluation'] == canned_response(PROMPT.format(**row))
+        assert row['authenticity_score'] and row['harmony_score']
+
+
+def test_concurrent_output_matches_serial(server, recipes, tmp_path):
+    serial = evaluate(recipes, str(tmp_path / 'serial.csv'))
+    concurrent = evaluate(recipes, str(tmp_path / 'concurrent.csv'), concurrency=8)
+    assert concurrent == serial
+
+
+def test_checkpoint_resume_skips_completed_calls(server, recipes, tmp_path):
+    checkpoint_path = str(tmp_path / 'out.checkpoint.jsonl')
+    fingerprint = make_fingerprint(PROMPT, recipes, 'ollama')
+    checkpoint = CheckpointStore(checkpoint_path, fingerprint)
+    first = evaluate(recipes, str(tmp_path / 'first.csv'), checkpoint=checkpoint)
+    checkpoint.close()
+    calls = server.request_count
+
+    checkpoint = CheckpointStore(checkpoint_path, fingerprint)
+    assert len(checkpoint.completed) == len(first)
+    second = evaluate(recipes, str(tmp_path / 'second.csv'), concurrency=4, checkpoint=checkpoint)
+    checkpoint.close()
+    assert server.request_count == calls
+    assert second == first
+
+
+def test_checkpoint_for_another_input_is_set_aside(server, recipes, tmp_path):
+    checkpoint_path = str(tmp_path / 'out.checkpoint.jsonl')
+    checkpoint = CheckpointStore(checkpoint_path, make_fingerprint(PROMPT, recipes, 'ollama'))
+    evaluate(recipes, str(tmp_path / 'first.csv'), checkpoint=checkpoint)
+    checkpoint.close()
+    calls = server.request_count
+
+    changed = write_recipes(tmp_path / 'changed.csv', recipe_text='ingredients:\nnoodles')
+    checkpoint = CheckpointStore(checkpoint_path, make_fingerprint(PROMPT, changed, 'ollama'))
+    assert not checkpoint.completed
+    assert os.path.exists(f"{checkpoint_path}.stale")
+    rows = evaluate(changed, str(tmp_path / 'second.csv'), checkpoint=checkpoint)
+    checkpoint.close()
+
+    assert server.request_count == 2 * calls
+    assert all('noodles' in row['generated_recipe'] for row in rows)
+    with open(checkpoint_path, 'r', encoding='utf-8') as file:
+        assert json.loads(file.readline())['fingerprint'] == make_fingerprint(PROMPT, changed, 'ollama')
+
+
+def test_mock_checkpoint_is_not_resumed_by_a_real_backend(recipes):
+    assert make_fingerprint(PROMPT, recipes, 'mock') != make_fingerprint(PROMPT, recipes, 'ollama')
@@ -0,0 +1,50 @@
+import pytest
+
+from conftest import FIELDNAMES, read_rows
+
+from ash import clients, mock_gemini
+from ash.engine import PROMPT_SHORT, EvaluationEngine, GeminiBackend
+from ash.mock_server import canned_response
+from ash.rate_limiter import RateLimiter
+from ash.sinks import OrderedCSVWriter
+
+MODELS = ['gemini-1.5-flash']
+ITERATIONS = [1, 2, 3, 4, 5]
+
+
+@pytest.fixture
+def gemini(tmp_path, monkeypatch):
+    # The google.generativeai stub, answering in-process
+    monkeypatch.setattr(clients, '_registry', None)
+    stub = mock_gemini.install()
+    monkeypatch.setattr(stub.stats, 'request_count', 0)
+    monkeypatch.setattr(stub.stats, 'candidate_count', 0)
+    api_key = tmp_path / 'API_KEY_gemini.txt'
+    api_key.write_text('test-key')
+    return GeminiBackend(str(api_key))
+
+
+@pytest.mark.parametrize('concurrency, samples_per_request, requests', [
+    (1, 1, 6 * 5),
+    (8, 1, 6 * 5),
+    (8, 5, 6),
+    (8, 2, 6 * 3),
+])
+def test_gemini_candidates_per_request(gemini, recipes, tmp_path, concurrency, samples_per_request, requests):
+    engine = EvaluationEngine(gemini, MODELS, PROMPT_SHORT, parser='gemini', iterations=ITERATIONS,
+                              rate_limiter=RateLimiter(), samples_per_request=samples_per_request)
+    output = str(tmp_path / 'out.csv')
+    writer = OrderedCSVWriter(output, FIELDNAMES)
+    engine.run(recipes, writer=writer, concurrency=concurrency)
+    writer.close()
+
+    rows = read_rows(output)
+    assert mock_gemini.stats.request_count == requests
+    assert mock_gemini.stats.candidate_count == len(rows) == 6 * len(ITERATIONS)
+    assert [(row['index'], row['iteration']) for row in rows] == [
+        (str(101 + position), str(iteration)) for position in range(6) for iteration in ITERATIONS]
+    for row in rows:
+        # Iterations sharing a request take its candidates in order
+        choice = (int(row['iteration']) - 1) % samples_per_request
+        assert row['evaluation'] == canned_response(PROMPT_SHORT.format(**row), choice)
+        assert row['authenticity_score']
@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import FIELDNAMES, read_rows
+
+from ash.engine import PROMPT_WITH_EXAMPLES, EvaluationEngine, OpenAIBackend
+from ash.mock_server import canned_response
+from ash.rate_limiter import RateLimiter
+from ash.sinks import OrderedCSVWriter
+
+openai = pytest.importorskip('openai')
+
+MODELS = ['gpt-4o']
+ITERATIONS = [1, 2, 3, 4, 5]
+
+
+@pytest.fixture
+def backend(server, tmp_path, monkeypatch):
+    # The real OpenAI backend, talking to the stand-in server
+    monkeypatch.setattr(openai, 'api_base', openai.api_base)
+    monkeypatch.setattr(openai, 'api_key', openai.api_key)
+    api_key = tmp_path / 'API_KEY_openai.txt'
+    api_key.write_text('test-key')
+    return OpenAIBackend(str(api_key), f"{server.url}/v1")
+
+
+@pytest.mark.parametrize('concurrency, samples_per_request', [(1, 1), (8, 1), (8, 5)])
+def test_openai_evaluation_against_stand_in_server(server, backend, recipes, tmp_path, concurrency,
+                                                    samples_per_request):
+    engine = EvaluationEngine(backend, MODELS, PROMPT_WITH_EXAMPLES, iterations=ITERATIONS,
+                              rate_limiter=RateLimiter(), samples_per_request=samples_per_request)
+    output = str(tmp_path / 'out.csv')
+    writer = OrderedCSVWriter(output, FIELDNAMES)
+    engine.run(recipes, writer=writer, concurrency=concurrency)
+    writer.close()
+
+    rows = read_rows(output)
+    assert server.request_count == 6 * len(ITERATIONS) // samples_per_request
+    assert [(row['index'], row['iteration']) for row in rows] == [
+        (str(101 + position), str(iteration)) for position in range(6) for iteration in ITERATIONS]
+    for row in rows:
+        choice = (int(row['iteration']) - 1) % samples_per_request
+        assert row['evaluation'] == canned_response(PROMPT_WITH_EXAMPLES.format(**row), choice)
+
+
+def test_openai_rate_limits_are_retried(server, backend, recipes, tmp_path):
+    # Every 8th request is answered with 429 and Retry-After: 1
+    server.RequestHandlerClass.rate_limit_every = 8
+    engine = EvaluationEngine(backend, MODELS, PROMPT_WITH_EXAMPLES, iterations=[1, 2],
+                              rate_limiter=RateLimiter())
+    output = str(tmp_path / 'out.csv')
+    writer = OrderedCSVWriter(output, FIELDNAMES)
+    engine.run(recipes, writer=writer, concurrency=4)
+    writer.close()
+
+    assert len(read_rows(output)) == 6 * 2
+    assert engine.failed_calls == 0
+    assert server.request_count > 6 * 2
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+import requests
+
+from conftest import FIELDNAMES, read_rows
+
+from ash import mock_gemini
+from ash.checkpoint import CheckpointStore, make_key
+from ash.engine import EvaluationEngine, OllamaBackend
+from ash.rate_limiter import is_rate_limit_error
+from ash.retry import PERMANENT, RATE_LIMIT, TRANSIENT, DeadLetterLog, RetryPolicy, classify_error
+from ash.sinks import OrderedCSVWriter
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+@pytest.mark.parametrize('error, category', [
+    (http_error(429), RATE_LIMIT),
+    (mock_gemini.ResourceExhausted("429 Resource has been exhausted"), RATE_LIMIT),
+    (http_error(500), TRANSIENT),
+    (http_error(503), TRANSIENT),
+    (http_error(408), TRANSIENT),
+    (TimeoutError('timed out'), TRANSIENT),
+    (ConnectionError('reset'), TRANSIENT),
+    (asyncio.TimeoutError(), TRANSIENT),
+    (requests.ConnectionError('refused'), TRANSIENT),
+    (http_error(400), PERMANENT),
+    (http_error(404), PERMANENT),
+    (ValueError('blocked response'), PERMANENT),
+])
+def test_classify_error(error, category):
+    assert classify_error(error) == category
+
+
+def test_rate_limited_http_error_from_server(server):
+    # A real 429 from the stand-in server, raised by requests like
+    # OllamaClient and BatchClient do
+    server.RequestHandlerClass.rate_limit_every = 1
+    response = requests.post(f"{server.url}/v1/chat/completions",
+                             json={'model': 'gpt-4o', 'messages': [{'role': 'user', 'content': 'hi'}]})
+    with pytest.raises(requests.HTTPError) as raised:
+        response.raise_for_status()
+    assert is_rate_limit_error(raised.value)
+    assert classify_error(raised.value) == RATE_LIMIT
+
+
+def test_retry_policy_retries_transient_errors_only():
+    policy = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise TimeoutError('timed out')
+        return 'ok'
+
+    assert policy.call(flaky) == 'ok'
+    assert len(attempts) == 3
+
+    def forbidden():
+        attempts.append(1)
+        raise http_error(403)
+
+    attempts.clear()
+    failure = policy.call(forbidden)
+    assert (failure.category, failure.attempts, len(attempts)) == (PERMANENT, 1, 1)
+
+
+class FlakyBackend(OllamaBackend):
+    # Fails every call about one dish until `failing` is cleared
+    failing = 'Pasta'
+
+    def generate(self, model, prompt, n=1):
+        if self.failing and f"Original Dish: {self.failing}" in prompt:
+            raise ValueError(f"refused to evaluate {self.failing}")
+        return super().generate(model, prompt, n)
+
+
+def test_retry_failed_replays_only_dead_lettered_calls(server, recipes, tmp_path):
+    models, iterations = ['gemma2:9b'], [1, 2]
+    dead_letter_path = str(tmp_path / 'out.failed.jsonl')
+    checkpoint_path = str(tmp_path / 'out.checkpoint.jsonl')
+    backend = FlakyBackend()
+    policy = RetryPolicy(max_attempts=2, base_delay=0.001, max_delay=0.001)
+
+    def run(retry_only=None, concurrency=1):
+        dead_letter = DeadLetterLog(dead_letter_path)
+        checkpoint = CheckpointStore(checkpoint_path)
+        engine = EvaluationEngine(backend, models, iterations=iterations, retry=policy, dead_letter=dead_letter)
+        writer = OrderedCSVWriter(str(tmp_path / 'out.csv'), FIELDNAMES)
+        retry_only = set(dead_letter.failed) if retry_only else None
+        engine.run(recipes, checkpoint, writer=writer, concurrency=concurrency, retry_only=retry_only)
+        writer.close()
+        checkpoint.close()
+        dead_letter.close()
+        return read_rows(str(tmp_path / 'out.csv')), DeadLetterLog(dead_letter_path)
+
+    rows, dead_letter = run()
+    # Recipe 103 is the Pasta; its calls failed for good and have no output rows
+    assert {key[0] for key in dead_letter.failed} == {'103'}
+    assert set(dead_letter.failed) == {make_key(103, 'gemma2:9b', iteration) for iteration in iterations}
+    assert all(record['category'] == PERMANENT for record in dead_letter.failed.values())
+    assert len(rows) == 5 * len(iterations) and '103' not in {row['index'] for row in rows}
+    dead_letter.close()
+
+    backend.failing = None
+    calls = server.request_count
+    rows, dead_letter = run(retry_only=True, concurrency=4)
+    assert server.request_count - calls == len(iterations)
+    assert not dead_letter.failed
+    assert [row['index'] for row in rows] == [str(101 + position) for position in range(6) for _ in iterations]
+    dead_letter.close()